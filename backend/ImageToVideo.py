@@ -1,102 +1,272 @@
+"""
+Batch video renderer for offline backfills
 
-import fal_client
-import base64
-import mimetypes
-from urllib.request import urlretrieve
+Renders one fit-check video per (image, shoe) pair of a manifest with bounded concurrency.
+Every finished pair is appended to a checkpoint file, so a rerun after a crash or with an
+extended manifest only renders what is still missing. Videos go to a folder the storage
+janitor does not manage, so finished pairs are not evicted and re-rendered later.
+
+Usage:
+    python ImageToVideo.py manifest.jsonl --concurrency 8
+    python ImageToVideo.py --from-folder uploads --shoe "White Nike AirForce One"
+
+Manifest formats (relative image paths are resolved against the manifest's folder):
+    .jsonl  one {"image": "...", "shoe": "...", "id": "optional"} object per line
+    .csv    header row with image,shoe and an optional id column
+"""
 import os
-import pathlib
-from glob import glob
+import sys
+import csv
+import json
 import time
+import asyncio
+import hashlib
+import argparse
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
 from config import Config
+from services.storage_service import LocalArtifactStore
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# Single continuous orbit, tuned for catalog backfills; {shoe_name} is filled in per pair
+PROMPT_TEMPLATE = "A cinematic video of a person doing a casual fit check, standing in front of a full-length mirror in a bright, white-walled dressing room (minimal showroom-style background). The camera performs one continuous, smooth 360-degree orbit around them, steadily capturing front, back, left, and right views with no cuts or jumps. The focus is primarily on the footwear – the person is wearing {shoe_name}. The shoes remain identical, consistent, and unchanged in design, shape, orientation, and detail throughout the video (no flipping, no inversion, no mirroring). The camera smoothly zooms in towards the shoes while keeping the feet, legs visible, ensuring the shoes stay attached to the person. The video includes close-up shots and slow pans highlighting the shoes from multiple angles, such as slow zooms on the shoes and low-angle views that emphasize them, while keeping orientation stable and transition smooth. The rest of the outfit above the shoes is secondary and kept softly blurred/out of focus so that the shoes stay the centerpiece of every frame. Lighting is bright, even, and neutral (no dramatic shadows), ensuring the shoes are always clearly visible. The person stands relaxed and neutral, simply turning naturally to show the outfit, with no strong emotions or narrative. Audio: none (no music or sound – the video is silent)."
+
+
+def item_key(image_path: str, shoe: str) -> str:
+    """Checkpoint key of a pair: the image content and shoe, so moved or renamed files still match"""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    digest.update(f":{shoe}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_manifest(path: str) -> List[Dict[str, str]]:
+    """Read (image, shoe) pairs from a .jsonl or .csv manifest"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for number, row in enumerate(rows, 1):
+        if not row.get('image') or not row.get('shoe'):
+            raise ValueError(f"{path}: entry {number} needs both 'image' and 'shoe'")
+        items.append({
+            'id': row.get('id') or None,
+            'image': os.path.join(base_dir, row['image']),
+            'shoe': row['shoe']
+        })
+    return items
+
+
+def folder_manifest(folder: str, shoe: str) -> List[Dict[str, str]]:
+    """
+    Pair every image under a folder with one shoe
+
+    In the sharded upload store every upload also has pre-sized variant JPEGs; only the masters,
+    recognized by their metadata sidecar, are rendered so each photo is billed once.
+    """
+    images = []
+    masters = set()
+    for root, dirs, files in os.walk(folder):
+        # Hidden folders include the store's .incoming scratch space
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if name.endswith(LocalArtifactStore.META_SUFFIX):
+                masters.add(os.path.join(root, name[:-len(LocalArtifactStore.META_SUFFIX)]))
+            elif name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith('.'):
+                images.append(os.path.join(root, name))
+
+    if masters:
+        images = [image for image in images if image in masters]
+    return [{'id': os.path.basename(image) if masters else None, 'image': image, 'shoe': shoe} for image in images]
+
+
+class Checkpoint:
+    """Append-only JSONL record of finished pairs; the last record of a key wins"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    self.records[record['key']] = record
+
+    def completed(self, key: str) -> Optional[Dict[str, Any]]:
+        """The completed record of a key whose video still exists, else None"""
+        record = self.records.get(key)
+        if record and record.get('status') == 'completed' and os.path.exists(record.get('video', '')):
+            return record
+        return None
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self.records[record['key']] = record
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def render_all(video_service, items: List[Dict[str, str]], checkpoint: Checkpoint, concurrency: int) -> Dict[str, Any]:
+    """Render the pending pairs with at most `concurrency` renders in flight"""
+    slots = asyncio.Semaphore(concurrency)
+    durations: List[float] = []
+    failures: Counter = Counter()
+    done = 0
+
+    async def render(item):
+        nonlocal done
+        async with slots:
+            started = time.perf_counter()
+            record = {'key': item['key'], 'id': item['id'], 'image': item['image'], 'shoe': item['shoe']}
+            try:
+                video_path = await video_service.generate_video_for_image(
+                    item['image'], item['shoe'], 'front', prompt=PROMPT_TEMPLATE.format(shoe_name=item['shoe'])
+                )
+                record.update(status='completed', video=video_path)
+            except Exception as e:
+                failures[type(e).__name__] += 1
+                record.update(status='failed', error=f"{type(e).__name__}: {str(e)[:300]}")
+            record['seconds'] = round(time.perf_counter() - started, 3)
+            record['finished_at'] = time.time()
+            checkpoint.append(record)
+
+            done += 1
+            if record['status'] == 'completed':
+                durations.append(record['seconds'])
+                print(f"[{done}/{len(items)}] ✓ {os.path.basename(item['image'])} + {item['shoe']} -> {record['video']} ({record['seconds']}s)")
+            else:
+                print(f"[{done}/{len(items)}] ✗ {os.path.basename(item['image'])} + {item['shoe']}: {record['error']}")
+
+    await asyncio.gather(*(render(item) for item in items))
+    return {'durations': durations, 'failures': failures}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render fit-check videos for a manifest of (image, shoe) pairs")
+    parser.add_argument('manifest', nargs='?', help=".jsonl or .csv manifest of image/shoe pairs")
+    parser.add_argument('--from-folder', metavar='DIR', help="render every image under DIR (needs --shoe)")
+    parser.add_argument('--shoe', help="shoe worn in every video of --from-folder")
+    parser.add_argument('--output-dir', default=Config.BACKFILL_VIDEO_FOLDER,
+                        help="content-addressed video store (default: the backfill folder, which the storage janitor leaves alone)")
+    parser.add_argument('--checkpoint', help="checkpoint file (default: <manifest>.checkpoint.jsonl, "
+                                             "or backfill.checkpoint.jsonl in the cache folder for --from-folder)")
+    parser.add_argument('--concurrency', type=int, default=Config.VIDEO_RENDER_STAGE_CONCURRENCY,
+                        help="renders in flight at once")
+    parser.add_argument('--limit', type=int, help="render at most this many pending pairs")
+    parser.add_argument('--dry-run', action='store_true', help="list pending pairs without rendering")
+    parser.add_argument('--stats-output', help="write the run statistics as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if bool(args.manifest) == bool(args.from_folder):
+        parser.error("pass either a manifest or --from-folder")
+    if args.from_folder and not args.shoe:
+        parser.error("--from-folder needs --shoe")
+
+    items = load_manifest(args.manifest) if args.manifest else folder_manifest(args.from_folder, args.shoe)
+    # Never inside a janitor-managed folder (uploads, generated, videos), which may delete it
+    checkpoint_path = args.checkpoint or (
+        f"{args.manifest}.checkpoint.jsonl" if args.manifest
+        else os.path.join(Config.CACHE_FOLDER, 'backfill.checkpoint.jsonl')
+    )
+    janitor_folders = {os.path.abspath(policy['folder']) for policy in Config.STORAGE_POLICIES.values()}
+    if os.path.abspath(args.output_dir) in janitor_folders:
+        print(f"Warning: the storage janitor evicts videos from {args.output_dir}; "
+              "evicted pairs count as missing and are rendered (and billed) again on the next run")
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    pending = []
+    missing = skipped = 0
+    seen = set()
+    for item in items:
+        if not os.path.isfile(item['image']):
+            print(f"Skipping missing image: {item['image']}")
+            missing += 1
+            continue
+        item['key'] = item_key(item['image'], item['shoe'])
+        if item['key'] in seen or checkpoint.completed(item['key']):
+            skipped += 1
+            continue
+        seen.add(item['key'])
+        pending.append(item)
+    if args.limit is not None:
+        pending = pending[:args.limit]
+
+    print(f"{len(items)} pairs: {skipped} already rendered, {missing} missing images, {len(pending)} to render")
+    print(f"Checkpoint: {checkpoint_path}")
+    if args.dry_run or not pending:
+        for item in pending:
+            print(f"  {item['image']} + {item['shoe']}")
+        return 0
+
+    if not Config.FAL_KEY:
+        print("FAL_KEY is not set; cannot render videos")
+        return 2
+
+    from services.video_service import VideoService
+    video_service = VideoService(video_store=LocalArtifactStore(args.output_dir))
+    # The service's stage limits are sized for the web server; a backfill sets its own
+    video_service.render_stage_slots = asyncio.Semaphore(args.concurrency)
+    video_service.download_stage_slots = asyncio.Semaphore(args.concurrency)
+
+    started = time.perf_counter()
+    outcome = asyncio.run(render_all(video_service, pending, checkpoint, args.concurrency))
+    elapsed = time.perf_counter() - started
+
+    durations = outcome['durations']
+    failed = sum(outcome['failures'].values())
+    stats = {
+        'pairs': len(items),
+        'skipped': skipped,
+        'missing_images': missing,
+        'attempted': len(pending),
+        'completed': len(durations),
+        'failed': failed,
+        'failures_by_error': dict(outcome['failures']),
+        'elapsed_seconds': round(elapsed, 1),
+        'videos_per_minute': round(len(durations) / elapsed * 60, 2) if elapsed else 0.0,
+        'render_seconds_p50': round(percentile(durations, 0.5), 1),
+        'render_seconds_p95': round(percentile(durations, 0.95), 1),
+        'concurrency': args.concurrency
+    }
+
+    print(f"\n{'='*50}")
+    print(f"Rendered {stats['completed']}/{stats['attempted']} in {stats['elapsed_seconds']}s "
+          f"({stats['videos_per_minute']} videos/min, p50 {stats['render_seconds_p50']}s, "
+          f"p95 {stats['render_seconds_p95']}s)")
+    if failed:
+        print(f"Failed: {failed} {stats['failures_by_error']}; rerun to retry them")
+    print(f"{'='*50}")
+
+    if args.stats_output:
+        with open(args.stats_output, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+
+    return 1 if failed else 0
 
-# Configuration
-UPLOAD_FOLDER = "backend/uploads"
-OUTPUT_FOLDER = "backend/generated_videos"
-SHOE_NAME = "White Nike AirForce One"
-
-# Create output directory if it doesn't exist
-pathlib.Path(OUTPUT_FOLDER).mkdir(parents=True, exist_ok=True)
-
-# Configure FAL client with API key from environment
-if Config.FAL_KEY:
-    fal_client.api_key = Config.FAL_KEY
-else:
-    print("Warning: FAL_KEY not found in environment variables. Video generation may fail.")
-
-def process_image(image_path, output_filename, shoe_name):
-    """Process a single image and generate a video"""
-    print(f"\nProcessing image: {os.path.basename(image_path)}")
-    
-    try:
-        # Read and encode the image
-        mime = mimetypes.guess_type(image_path)[0] or "image/png"
-        with open(image_path, "rb") as f:
-            b64 = base64.b64encode(f.read()).decode("utf-8")
-        data_uri = f"data:{mime};base64,{b64}"
-
-        # Generate the video with the original prompt
-        print(f"Generating video for {os.path.basename(image_path)}...")
-        result = fal_client.run(
-            "fal-ai/veo3/fast/image-to-video",
-            arguments={
-                # "prompt": f"A cinematic video of a person doing a casual fit check in front of a mirror. The camera smoothly rotates to capture front, back, left, and right views. The environment is bright, well-lit, and stylish. The focus is primarily on the sneakers: close-up shots, slow pans, zooms, and dramatic angles highlight how the sneakers pair with the outfit. Do not change anything about the shoe — its design, color, and details must remain exactly the same. They are wearing {shoe_name}. The rest of the clothing remains secondary, slightly blurred or framed to keep attention on the sneakers. Natural gestures, like adjusting pants or shifting weight, emphasize the sneakers as the centerpiece of the drip.",
-                "prompt": f"A cinematic video of a person doing a casual fit check, standing in front of a full-length mirror in a bright, white-walled dressing room (minimal showroom-style background). The camera performs one continuous, smooth 360-degree orbit around them, steadily capturing front, back, left, and right views with no cuts or jumps. The focus is primarily on the footwear – the person is wearing {shoe_name}. The shoes remain identical, consistent, and unchanged in design, shape, orientation, and detail throughout the video (no flipping, no inversion, no mirroring). The camera smoothly zooms in towards the shoes while keeping the feet, legs visible, ensuring the shoes stay attached to the person. The video includes close-up shots and slow pans highlighting the shoes from multiple angles, such as slow zooms on the shoes and low-angle views that emphasize them, while keeping orientation stable and transition smooth. The rest of the outfit above the shoes is secondary and kept softly blurred/out of focus so that the shoes stay the centerpiece of every frame. Lighting is bright, even, and neutral (no dramatic shadows), ensuring the shoes are always clearly visible. The person stands relaxed and neutral, simply turning naturally to show the outfit, with no strong emotions or narrative. Audio: none (no music or sound – the video is silent).",
-                "image_url": data_uri,
-                "duration": "8s",
-                "generate_audio": False,
-                "resolution": "720p",
-            }
-        )
-
-        # Save the video
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-        print(f"Saving video to: {output_path}")
-        urlretrieve(result["video"]["url"], output_path)
-        return True
-        
-    except Exception as e:
-        print(f"Error processing {image_path}: {str(e)}")
-        return False
-
-def main():
-    # Get image files from the uploads folder
-    image_patterns = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp"]
-    image_files = []
-    
-    for pattern in image_patterns:
-        image_files.extend(glob(os.path.join(UPLOAD_FOLDER, pattern)))
-        if len(image_files) >= 4:  # Limit to 4 images
-            image_files = image_files[:4]
-            break
-    
-    if not image_files:
-        print("No image files found in the uploads folder!")
-        return
-    
-    print(f"Found {len(image_files)} images to process")
-    
-    # Process each image
-    for i, image_path in enumerate(image_files, 1):
-        timestamp = int(time.time())
-        output_filename = f"fitcheck_{i}_{timestamp}.mp4"
-        
-        print(f"\n{'='*50}")
-        print(f"Processing image {i}/{len(image_files)}: {os.path.basename(image_path)}")
-        print(f"Output will be saved as: {output_filename}")
-        print(f"{'='*50}")
-        
-        success = process_image(image_path, output_filename, SHOE_NAME)
-        if success:
-            print(f"✓ Successfully processed {os.path.basename(image_path)}")
-        else:
-            print(f"✗ Failed to process {os.path.basename(image_path)}")
-        
-        # Add a small delay between processing images
-        if i < len(image_files):
-            print("\nWaiting a moment before next image...")
-            time.sleep(2)
-    
-    print("\nAll done! Check the generated_videos folder for your videos.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
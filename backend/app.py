@@ -1,17 +1,27 @@
 import os
+import json
+import time
 import base64
-import uuid
-import asyncio
 import concurrent.futures
-from flask import Flask, request, jsonify
+from dataclasses import asdict
+from flask import Flask, g, request, jsonify, Response, stream_with_context, url_for, send_file, send_from_directory
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 
 from config import Config
-from utils import allowed_file
+from utils import allowed_file, prepared_image_cache
 from services.gemini_service import GeminiService
 from services.video_service import VideoService
 from services.exa_service import ExaService
+from services.job_service import JobService, referenced_job_paths
+from services.storage_janitor import StorageJanitor
+from services.storage_service import LocalArtifactStore
+from services.ingest_service import ImageIngestService
+from services.asset_service import ImageAssetService
+from services.metrics import metrics, cache_collector, singleflight_collector
+from services.cache_service import TieredCache, ArtifactCache
+from services.lazy_service import LazyService, ServiceUnavailableError, readiness
+from services.resilience import resilience
+from services.admission import AdmissionController, AdmissionRejected
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -20,16 +30,172 @@ CORS(app, origins=Config.CORS_ORIGINS)
 # Initialize configuration
 Config.init_app(app)
 
-# Initialize services
-gemini_service = GeminiService()
-video_service = VideoService()
-exa_service = ExaService()
+# Content-addressed artifact stores; an upload's image_id is its store key
+upload_store = LocalArtifactStore(Config.UPLOAD_FOLDER)
+generated_store = LocalArtifactStore(Config.GENERATED_FOLDER)
+video_store = LocalArtifactStore(Config.VIDEO_FOLDER)
 
+# Uploads are normalized once on ingest; later stages only read the stored master and variants
+image_ingest = ImageIngestService(upload_store)
+
+# Generated images are served by content key with resized/WebP/AVIF renditions
+image_assets = ImageAssetService(generated_store)
+IMAGE_MAX_AGE = min(
+    Config.IMAGE_ASSET_MAX_AGE,
+    Config.STORAGE_POLICIES['generated'].get('max_age_seconds') or Config.IMAGE_ASSET_MAX_AGE
+)
+
+# Model result caches live outside the services so the janitor and /stats can read them
+# before (or without) the services being built
+recommendation_cache = TieredCache(
+    os.path.join(Config.CACHE_FOLDER, 'recommendations'),
+    ttl=Config.RECOMMENDATION_CACHE_TTL,
+    memory_entries=Config.RECOMMENDATION_CACHE_MEMORY_ENTRIES,
+    disk_entries=Config.RECOMMENDATION_CACHE_DISK_ENTRIES
+)
+tryon_cache = ArtifactCache(
+    os.path.join(Config.CACHE_FOLDER, 'tryon_index.sqlite3'),
+    max_entries=Config.TRYON_CACHE_MAX_ENTRIES,
+    max_bytes=Config.TRYON_CACHE_MAX_BYTES
+)
+
+# Services (and the SDKs they import) are built on first use in the process that serves
+# requests; an unconfigured or broken service answers 503 without taking the others down
+gemini_service = LazyService("gemini", lambda: GeminiService(
+    generated_store=generated_store,
+    image_ingest=image_ingest,
+    recommendation_cache=recommendation_cache,
+    tryon_cache=tryon_cache
+))
+video_service = LazyService("video", lambda: VideoService(video_store=video_store), required_config=["FAL_KEY"])
+exa_service = LazyService("exa", ExaService)
+job_service = LazyService("jobs", JobService)
+services = {
+    "gemini": gemini_service,
+    "video": video_service,
+    "exa": exa_service,
+    "jobs": job_service
+}
+
+# Shared, long-lived pool for (shoe, angle) generation tasks across all requests.
+# GeminiService additionally bounds concurrent model calls to the configured quota.
+generation_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=Config.GENERATION_MAX_WORKERS,
+    thread_name_prefix="generation"
+)
+
+# Decodes and normalizes the files of a batch upload in parallel
+ingest_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=Config.BATCH_INGEST_MAX_WORKERS,
+    thread_name_prefix="ingest"
+)
+
+# Keeps uploads, generated images and videos within their quotas without touching files
+# that any worker's jobs or the shared cache indexes still reference. Every worker starts
+# it, but only the one holding the janitor lock file sweeps.
+def job_referenced_paths():
+    """Files used by the video jobs of every worker, read from the shared job snapshots"""
+    return referenced_job_paths(video_path_for=lambda video_url: video_store.path(os.path.basename(video_url)))
+
+storage_janitor = StorageJanitor(reference_providers=[
+    tryon_cache.paths,
+    image_assets.renditions.paths,
+    job_referenced_paths
+])
+if Config.STORAGE_JANITOR_ENABLED:
+    storage_janitor.start()
+
+# Request latency and concurrency per endpoint; cache counters are read at scrape time
+http_request_duration = metrics.histogram(
+    'fitcheck_http_request_duration_seconds', 'Time to produce a response', ['endpoint', 'method', 'status']
+)
+http_requests_in_flight = metrics.gauge(
+    'fitcheck_http_requests_in_flight', 'Requests currently being handled', ['endpoint']
+)
+def started_stats(service, read):
+    """Stats source that reports nothing until the lazy service has been built"""
+    def source():
+        instance = service.peek()
+        return read(instance) if instance is not None else None
+    return source
+
+metrics.register_collector(cache_collector({
+    "recommendations": recommendation_cache.stats,
+    "tryon": tryon_cache.stats,
+    "prepared_images": prepared_image_cache.stats,
+    "image_renditions": image_assets.stats,
+    "gemini_files": started_stats(gemini_service, lambda gemini: gemini.file_registry.stats()),
+    "exa_search": started_stats(exa_service, lambda exa: exa.search_stats()),
+    "product_catalog": started_stats(exa_service, lambda exa: exa.catalog.stats())
+}))
+
+metrics.register_collector(singleflight_collector({
+    "gemini": started_stats(gemini_service, lambda gemini: gemini.inflight.stats()),
+    "gemini_async": started_stats(gemini_service, lambda gemini: gemini.async_inflight.stats()),
+    "video": started_stats(video_service, lambda video: video.inflight.stats()),
+    "exa": started_stats(exa_service, lambda exa: exa.inflight.stats())
+}))
+
+# Priority classes with per-class concurrency and queue budgets, so bursts of long generation
+# requests cannot take every worker from uploads and searches
+admission = AdmissionController()
+metrics.register_collector(admission.collect)
+
+@app.before_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_started = time.perf_counter()
+        http_requests_in_flight.inc(request.endpoint or 'unmatched')
+
+@app.after_request
+def record_request_duration(response):
+    # Streamed responses are timed until their first byte is ready, not until the stream ends
+    started = g.get('request_started')
+    if started is not None:
+        http_request_duration.observe(
+            time.perf_counter() - started, request.endpoint or 'unmatched', request.method, response.status_code
+        )
+    return response
+
+@app.before_request
+def admit_request():
+    # Registered after the timer, so rejected requests are still counted and timed
+    priority_class = admission.class_for(request.endpoint)
+    if priority_class is not None:
+        g.admission_ticket = admission.acquire(priority_class)
+
+@app.teardown_request
+def finish_request_timer(exc):
+    # Runs even when a handler raised, so the in-flight gauge cannot drift upwards
+    if g.pop('request_started', None) is not None:
+        http_requests_in_flight.dec(request.endpoint or 'unmatched')
+
+@app.teardown_request
+def release_admission(exc):
+    # Streamed responses keep their slot until the stream ends (stream_with_context)
+    admission.release(g.pop('admission_ticket', None))
+
+
+@app.errorhandler(ServiceUnavailableError)
+def service_unavailable(e):
+    return jsonify({"error": str(e), "service": e.service}), 503
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    response = jsonify({"error": str(e), "priority_class": e.priority_class})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy", "message": "FitCheck.AI Backend with Gemini is running!"})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Start building every service and report readiness; 503 until all configured services are ready"""
+    report = readiness(services)
+    return jsonify(report), 200 if report["ready"] else 503
+
 @app.route('/upload', methods=['POST'])
 def upload_image():
     """Handle image upload and return shoe recommendations using Gemini 2.5 Pro"""
@@ -43,11 +209,14 @@ def upload_image():
         return jsonify({"error": "No file selected"}), 400
     
     if file and allowed_file(file.filename):
-        # Save the uploaded file
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(filepath)
+        # Normalize the upload and store it under its content hash; the raw file is not kept
+        try:
+            image_meta = image_ingest.ingest(file.read())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        image_id = image_meta["image_id"]
+        filepath = upload_store.path(image_id)
         
         # Get shoe recommendations using Gemini service
         recommendations = gemini_service.analyze_outfit_and_recommend_shoes(filepath)
@@ -55,12 +224,119 @@ def upload_image():
         # Store the image path for later use
         return jsonify({
             "success": True,
-            "image_id": unique_filename,
+            "image_id": image_id,
+            "image": {
+                "width": image_meta["width"],
+                "height": image_meta["height"],
+                "sha256": image_meta["sha256"]
+            },
             "recommendations": recommendations
         })
     
     return jsonify({"error": "Invalid file type"}), 400
 
+def ingest_upload(filename, data):
+    """Ingest one file of a batch upload; returns (metadata, None) or (None, error message)"""
+    if not allowed_file(filename):
+        return None, "Invalid file type"
+    try:
+        return image_ingest.ingest(data), None
+    except ValueError as e:
+        return None, str(e)
+
+def image_summary(image_meta):
+    return {
+        "width": image_meta["width"],
+        "height": image_meta["height"],
+        "sha256": image_meta["sha256"]
+    }
+
+@app.route('/upload-batch', methods=['POST'])
+def upload_batch():
+    """Upload several outfit photos and return shoe recommendations keyed by image id"""
+    
+    files = [file for file in request.files.getlist('images') if file.filename]
+    if not files:
+        return jsonify({"error": "No image files provided"}), 400
+    if len(files) > Config.BATCH_UPLOAD_MAX_IMAGES:
+        return jsonify({"error": f"At most {Config.BATCH_UPLOAD_MAX_IMAGES} images per batch"}), 400
+    
+    # Read the request body here, then decode and normalize the images in parallel
+    uploads = [(file.filename, file.read()) for file in files]
+    with metrics.span('app.batch_ingest'):
+        ingested = list(ingest_executor.map(lambda upload: ingest_upload(*upload), uploads))
+    
+    images = {}
+    errors = []
+    for (filename, _), (image_meta, error) in zip(uploads, ingested):
+        if error:
+            errors.append({"filename": filename, "error": error})
+        else:
+            images[image_meta["image_id"]] = image_meta
+    
+    paths = {upload_store.path(image_id): image_id for image_id in images}
+    results = gemini_service.analyze_outfits_batch(list(paths))
+    
+    stream_format = requested_stream_format(request.form)
+    if stream_format:
+        return stream_batch_recommendations(results, paths, images, errors, stream_format)
+    
+    recommendations = {}
+    for image_path, shoes, source in results:
+        image_id = paths[image_path]
+        recommendations[image_id] = {
+            "image": image_summary(images[image_id]),
+            "recommendations": shoes,
+            "source": source
+        }
+    
+    return jsonify({
+        "success": True,
+        # Image ids in upload order; duplicate photos share one id
+        "image_ids": list(images),
+        "results": recommendations,
+        "errors": errors
+    })
+
+def stream_batch_recommendations(results, paths, images, errors, stream_format):
+    """Stream one record per image as soon as its recommendations are ready, followed by a summary record"""
+    
+    def format_record(record):
+        if stream_format == 'sse':
+            return f"event: {record['type']}\ndata: {json.dumps(record)}\n\n"
+        return json.dumps(record) + "\n"
+    
+    def generate():
+        try:
+            for error in errors:
+                yield format_record({"type": "error", **error})
+            
+            for image_path, shoes, source in results:
+                image_id = paths[image_path]
+                yield format_record({
+                    "type": "recommendation",
+                    "image_id": image_id,
+                    "image": image_summary(images[image_id]),
+                    "recommendations": shoes,
+                    "source": source
+                })
+            
+            yield format_record({
+                "type": "summary",
+                "success": True,
+                "total": len(images),
+                "failed": len(errors)
+            })
+        finally:
+            results.close()
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/generate-outfits', methods=['POST'])
 def generate_outfits():
     """Generate outfit visualizations for recommended shoes using Gemini 2.5 Flash"""
@@ -72,13 +348,14 @@ def generate_outfits():
     if not image_id or not shoes:
         return jsonify({"error": "Missing image_id or shoes data"}), 400
     
-    original_image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_id)
+    original_image_path = upload_store.path(image_id)
     
-    if not os.path.exists(original_image_path):
+    if not original_image_path:
         return jsonify({"error": "Original image not found"}), 404
     
     results = []
     angles = ['front', 'back', 'left', 'right']
+    asset_base = requested_asset_base(data)
     
     for shoe in shoes:
         shoe_desc = f"{shoe.get('brand', '')} {shoe.get('name', '')} in {shoe.get('color', '')}"
@@ -88,14 +365,7 @@ def generate_outfits():
             # Generate visualization for each angle using Gemini service
             generated_path = gemini_service.generate_outfit_visualization(original_image_path, shoe_desc, angle)
             
-            # Convert to base64 for sending to frontend
-            with open(generated_path, 'rb') as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-            
-            shoe_visualizations.append({
-                "angle": angle,
-                "image": f"data:image/jpeg;base64,{img_base64}"
-            })
+            shoe_visualizations.append({"angle": angle, **image_payload(generated_path, asset_base)})
         
         results.append({
             "shoe": shoe,
@@ -107,29 +377,119 @@ def generate_outfits():
         "results": results
     })
 
-def process_single_shoe(shoe, original_image_path, angles):
-    """Process a single shoe and generate all angle visualizations"""
-    shoe_desc = f"{shoe.get('brand', '')} {shoe.get('name', '')} in {shoe.get('color', '')}"
-    shoe_visualizations = []
+def requested_asset_base(data):
+    """Return the absolute URL prefix for image assets when the client asked for URLs instead of base64"""
+    if data.get('images') == 'url' or request.args.get('images') == 'url':
+        return request.host_url.rstrip('/')
+    return None
+
+def image_payload(image_path, asset_base=None):
+    """Return the image fields for a generated file: asset URLs when asset_base is set, else a data URI"""
+    key = image_assets.key_for_path(image_path) if asset_base else None
+    if key:
+        return {
+            "image_url": f"{asset_base}/images/{key}",
+            "thumbnail_url": f"{asset_base}/images/{key}?size=thumb"
+        }
     
-    for angle in angles:
-        # Generate AI-powered visualization for each angle using Gemini Image Generation
-        generated_path = gemini_service.generate_outfit_image_with_shoes(original_image_path, shoe_desc, angle)
-        
-        # Convert to base64 for sending to frontend
-        with open(generated_path, 'rb') as img_file:
+    # Convert to base64 for sending to frontend
+    with metrics.span('app.base64_encode'):
+        with open(image_path, 'rb') as img_file:
             img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-        
-        shoe_visualizations.append({
-            "angle": angle,
-            "image": f"data:image/jpeg;base64,{img_base64}"
-        })
+    return {"image": f"data:image/jpeg;base64,{img_base64}"}
+
+def generate_angle_visualization(shoe, original_image_path, angle, asset_base=None, queued_at=None):
+    """Generate one AI-powered visualization of a shoe from a single angle"""
+    if queued_at is not None:
+        metrics.observe('app.generation_queue_wait', time.perf_counter() - queued_at)
+    
+    shoe_desc = f"{shoe.get('brand', '')} {shoe.get('name', '')} in {shoe.get('color', '')}"
+    
+    # Generate AI-powered visualization using Gemini Image Generation
+    generated_path = gemini_service.generate_outfit_image_with_shoes(original_image_path, shoe_desc, angle)
     
+    return {"angle": angle, **image_payload(generated_path, asset_base)}
+
+def submit_angle_visualizations(shoes, original_image_path, angles, asset_base=None):
+    """Schedule every (shoe, angle) generation independently on the shared executor"""
     return {
-        "shoe": shoe,
-        "visualizations": shoe_visualizations
+        generation_executor.submit(
+            generate_angle_visualization, shoe, original_image_path, angle, asset_base, time.perf_counter()
+        ): (index, shoe, angle)
+        for index, shoe in enumerate(shoes)
+        for angle in angles
     }
 
+def requested_stream_format(data):
+    """Return 'ndjson' or 'sse' when the client asked for a streamed response, else None"""
+    stream_format = data.get('stream') or request.args.get('stream')
+    if stream_format in ('ndjson', 'sse'):
+        return stream_format
+    if stream_format is True:
+        return 'ndjson'
+    
+    accept = request.headers.get('Accept', '')
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if 'text/event-stream' in accept:
+        return 'sse'
+    return None
+
+def stream_outfit_visualizations(shoes, original_image_path, angles, stream_format, asset_base=None):
+    """Stream one record per (shoe, angle) as soon as it is generated, followed by a summary record"""
+    
+    def format_record(record):
+        if stream_format == 'sse':
+            return f"event: {record['type']}\ndata: {json.dumps(record)}\n\n"
+        return json.dumps(record) + "\n"
+    
+    def generate():
+        future_to_task = submit_angle_visualizations(shoes, original_image_path, angles, asset_base)
+        try:
+            
+            completed = 0
+            failed = 0
+            for future in concurrent.futures.as_completed(future_to_task):
+                index, shoe, angle = future_to_task[future]
+                try:
+                    visualization = future.result()
+                    completed += 1
+                    yield format_record({
+                        "type": "visualization",
+                        "shoe_index": index,
+                        "shoe": shoe,
+                        **visualization
+                    })
+                except Exception as e:
+                    print(f"Error processing shoe {index} ({angle}): {str(e)}")
+                    failed += 1
+                    yield format_record({
+                        "type": "error",
+                        "shoe_index": index,
+                        "shoe": shoe,
+                        "angle": angle,
+                        "error": str(e)
+                    })
+            
+            yield format_record({
+                "type": "summary",
+                "success": True,
+                "total": len(future_to_task),
+                "completed": completed,
+                "failed": failed
+            })
+        finally:
+            # Drop queued work if the client went away before the stream finished
+            for future in future_to_task:
+                future.cancel()
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/generate-outfits-ai', methods=['POST'])
 def generate_outfits_ai():
     """Generate AI-powered outfit visualizations using Gemini 2.5 Flash Image Preview"""
@@ -141,41 +501,93 @@ def generate_outfits_ai():
     if not image_id or not shoes:
         return jsonify({"error": "Missing image_id or shoes data"}), 400
     
-    original_image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_id)
+    original_image_path = upload_store.path(image_id)
     
-    if not os.path.exists(original_image_path):
+    if not original_image_path:
         return jsonify({"error": "Original image not found"}), 404
     
     angles = ['front', 'back', 'left', 'right']
     
-    # Process shoes in parallel for better performance
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        # Submit all shoe processing tasks
-        future_to_shoe = {
-            executor.submit(process_single_shoe, shoe, original_image_path, angles): shoe 
-            for shoe in shoes
+    # Optionally answer with cacheable asset URLs instead of inline base64
+    asset_base = requested_asset_base(data)
+    
+    # Stream each angle as it is ready when the client asks for it
+    stream_format = requested_stream_format(data)
+    if stream_format:
+        return stream_outfit_visualizations(shoes, original_image_path, angles, stream_format, asset_base)
+    
+    # Fan out every (shoe, angle) pair so wall time approaches a single generation
+    future_to_task = submit_angle_visualizations(shoes, original_image_path, angles, asset_base)
+    
+    visualizations = {index: {} for index in range(len(shoes))}
+    errors = {}
+    for future in concurrent.futures.as_completed(future_to_task):
+        index, shoe, angle = future_to_task[future]
+        try:
+            visualizations[index][angle] = future.result()
+        except Exception as e:
+            print(f"Error processing shoe {index} ({angle}): {str(e)}")
+            errors.setdefault(index, {})[angle] = str(e)
+    
+    # Reassemble per-shoe results in request and angle order
+    results = []
+    for index, shoe in enumerate(shoes):
+        result = {
+            "shoe": shoe,
+            "visualizations": [visualizations[index][angle] for angle in angles if angle in visualizations[index]]
         }
-        
-        results = []
-        for future in concurrent.futures.as_completed(future_to_shoe):
-            try:
-                result = future.result()
-                results.append(result)
-            except Exception as e:
-                print(f"Error processing shoe: {str(e)}")
-                # Add error result for this shoe
-                shoe = future_to_shoe[future]
-                results.append({
-                    "shoe": shoe,
-                    "visualizations": [],
-                    "error": str(e)
-                })
+        if index in errors:
+            # Failure message per failed angle
+            result["errors"] = errors[index]
+        results.append(result)
     
     return jsonify({
         "success": True,
         "results": results
     })
 
+def absolute_asset_url(url, base_url=None):
+    """Turn a server-relative asset URL into an absolute one for the frontend"""
+    if url.startswith('/'):
+        return (base_url or request.host_url.rstrip('/')) + url
+    return url
+
+def serialize_video_results(results, base_url=None):
+    """Convert per-shoe video results to JSON with absolute video URLs (base_url defaults to this request's host)"""
+    json_results = []
+    for result in results:
+        result = asdict(result) if not isinstance(result, dict) else result
+        for video in result["videos"]:
+            video["video_url"] = absolute_asset_url(video["video_url"], base_url)
+        json_results.append(result)
+    return json_results
+
+def generate_front_angle_image(original_image_path, shoe):
+    """Generate the front angle try-on image for a shoe, falling back to the original image"""
+    shoe_desc = f"{shoe.get('brand', '')} {shoe.get('name', '')} in {shoe.get('color', '')}"
+    print(f"Generating front angle image for shoe: {shoe_desc}")
+    front_image_path = gemini_service.generate_outfit_image_with_shoes(original_image_path, shoe_desc, 'front')
+    print(f"Generated image path: {front_image_path}")
+    
+    # Verify the generated image exists and is valid
+    if front_image_path and os.path.exists(front_image_path):
+        file_size = os.path.getsize(front_image_path)
+        print(f"Image file size: {file_size} bytes")
+        return front_image_path
+    
+    print(f"Warning: Generated image not found or invalid: {front_image_path}")
+    # Use original image as fallback
+    return original_image_path
+
+async def run_video_generation(original_image_path, shoes, on_result=None):
+    """Run every shoe through its own image -> video -> download pipeline"""
+    return await video_service.generate_videos_pipeline(
+        shoes,
+        lambda shoe: generate_front_angle_image(original_image_path, shoe),
+        executor=generation_executor,
+        on_result=on_result
+    )
+
 @app.route('/generate-videos', methods=['POST'])
 def generate_videos():
     """Generate videos for front angle images of recommended shoes"""
@@ -187,55 +599,20 @@ def generate_videos():
     if not image_id or not shoes:
         return jsonify({"error": "Missing image_id or shoes data"}), 400
     
-    original_image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_id)
+    original_image_path = upload_store.path(image_id)
     
-    if not os.path.exists(original_image_path):
+    if not original_image_path:
         return jsonify({"error": "Original image not found"}), 404
     
+    # Answer 503 up front when video generation is not configured
+    video_service.get()
+    
     try:
-        # Generate front angle images for all shoes first using AI image generation
-        front_angle_images = []
-        for i, shoe in enumerate(shoes):
-            shoe_desc = f"{shoe.get('brand', '')} {shoe.get('name', '')} in {shoe.get('color', '')}"
-            print(f"Generating front angle image for shoe {i+1}: {shoe_desc}")
-            front_image_path = gemini_service.generate_outfit_image_with_shoes(original_image_path, shoe_desc, 'front')
-            print(f"Generated image path: {front_image_path}")
-            
-            # Verify the generated image exists and is valid
-            if front_image_path and os.path.exists(front_image_path):
-                file_size = os.path.getsize(front_image_path)
-                print(f"Image file size: {file_size} bytes")
-                front_angle_images.append(front_image_path)
-            else:
-                print(f"Warning: Generated image not found or invalid: {front_image_path}")
-                # Use original image as fallback
-                front_angle_images.append(original_image_path)
-        
-        # Generate videos asynchronously
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            results = loop.run_until_complete(
-                video_service.generate_videos_for_all_shoes(original_image_path, shoes, front_angle_images)
-            )
-        finally:
-            loop.close()
+        # Run on the shared background loop instead of creating a loop per request
+        results = job_service.run_sync(run_video_generation(original_image_path, shoes))
         
         # Convert results to JSON-serializable format
-        json_results = []
-        for result in results:
-            json_results.append({
-                "shoe": result.shoe,
-                "videos": [
-                    {
-                        "angle": video.angle,
-                        "video_url": video.video_url,
-                        "status": video.status
-                    }
-                    for video in result.videos
-                ]
-            })
+        json_results = serialize_video_results(results)
         
         return jsonify({
             "success": True,
@@ -246,6 +623,127 @@ def generate_videos():
         print(f"Error in video generation: {str(e)}")
         return jsonify({"error": f"Video generation failed: {str(e)}"}), 500
 
+@app.route('/video-jobs', methods=['POST'])
+def submit_video_job():
+    """Start video generation in the background and return a job id immediately"""
+    
+    data = request.json
+    image_id = data.get('image_id')
+    shoes = data.get('shoes', [])
+    
+    if not image_id or not shoes:
+        return jsonify({"error": "Missing image_id or shoes data"}), 400
+    
+    original_image_path = upload_store.path(image_id)
+    
+    if not original_image_path:
+        return jsonify({"error": "Original image not found"}), 404
+    
+    # Answer 503 up front when video generation is not configured
+    video_service.get()
+    
+    job_id = job_service.submit(
+        shoes,
+        lambda on_result: run_video_generation(original_image_path, shoes, on_result=on_result),
+        input_paths=[original_image_path]
+    )
+    
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status_url": url_for('get_video_job', job_id=job_id),
+        "events_url": url_for('stream_video_job_events', job_id=job_id)
+    }), 202
+
+@app.route('/video-jobs/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    """Poll the status of a video generation job"""
+    job = job_service.get_job(job_id)
+    
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    job["results"] = serialize_video_results(job["results"])
+    return jsonify({"success": True, "job": job})
+
+@app.route('/video-jobs/<job_id>/events', methods=['GET'])
+def stream_video_job_events(job_id):
+    """Stream job progress as server-sent events until the job finishes"""
+    # The stream holds a worker thread for the job's lifetime; a single-threaded worker
+    # (e.g. gunicorn sync) would be blocked, so clients poll there or use the ASGI server
+    if not request.environ.get('wsgi.multithread'):
+        return jsonify({
+            "error": "Job events need a threaded or ASGI server; poll the job status instead",
+            "status_url": url_for('get_video_job', job_id=job_id)
+        }), 501
+    
+    if job_service.get_job(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    def generate():
+        version = -1
+        while True:
+            current_version = job_service.version(job_id)
+            if current_version == version:
+                # Nothing changed within the heartbeat window; keep the connection alive
+                yield ": heartbeat\n\n"
+            else:
+                version = current_version
+                job = job_service.get_job(job_id)
+                if job is None:
+                    return
+                job["results"] = serialize_video_results(job["results"])
+                yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+                if job["status"] in JobService.TERMINAL_STATUSES:
+                    return
+            job_service.wait_for_update(job_id, version, Config.VIDEO_JOB_SSE_HEARTBEAT_SECONDS)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/videos/<path:filename>', methods=['GET'])
+def serve_video(filename):
+    """Serve a generated video with Range/206, ETag and conditional request support"""
+    video_path = video_store.path(filename)
+    if not video_path:
+        return jsonify({"error": "Video not found"}), 404
+    
+    return send_from_directory(
+        os.path.dirname(video_path),
+        os.path.basename(video_path),
+        mimetype='video/mp4',
+        conditional=True,
+        etag=True,
+        max_age=Config.VIDEO_CACHE_MAX_AGE
+    )
+
+@app.route('/images/<key>', methods=['GET'])
+def serve_image(key):
+    """Serve a generated image by content key; ?size= picks a thumbnail, Accept picks WebP/AVIF"""
+    try:
+        asset = image_assets.rendition(key, request.args.get('size'), request.headers.get('Accept', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if asset is None:
+        return jsonify({"error": "Image not found"}), 404
+    
+    # Content-addressed URLs never change, but the janitor may evict the file, so caches
+    # keep a response no longer than the generated folder's retention
+    response = send_file(
+        asset["path"],
+        mimetype=asset["mimetype"],
+        conditional=True,
+        etag=True,
+        max_age=IMAGE_MAX_AGE
+    )
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
 @app.route('/search-products', methods=['POST'])
 def search_products():
     """Search for products using Firecrawl based on shoe recommendations"""
@@ -298,6 +796,55 @@ def search_products():
         print(f"Error in product search: {str(e)}")
         return jsonify({"error": f"Product search failed: {str(e)}"}), 500
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose stage timings, request latency, in-flight gauges and cache ratios for Prometheus"""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Report cache hit/miss counters; sections of services that have not been built yet are null"""
+    gemini = gemini_service.peek()
+    video = video_service.peek()
+    exa = exa_service.peek()
+    return jsonify({
+        "recommendation_cache": recommendation_cache.stats(),
+        "tryon_cache": tryon_cache.stats(),
+        "prepared_image_cache": prepared_image_cache.stats(),
+        "image_renditions": image_assets.stats(),
+        "image_ingest": image_ingest.stats(),
+        "gemini_files": gemini.file_registry.stats() if gemini else None,
+        "storage": {
+            "uploads": upload_store.stats(),
+            "generated": generated_store.stats(),
+            "videos": video_store.stats()
+        },
+        "search_cache": exa.search_stats() if exa else None,
+        "coalescing": {
+            "gemini": gemini.inflight.stats() if gemini else None,
+            "gemini_async": gemini.async_inflight.stats() if gemini else None,
+            "video": video.inflight.stats() if video else None,
+            "exa": exa.inflight.stats() if exa else None
+        },
+        "services": {name: service.status() for name, service in services.items()},
+        "admission": admission.stats()
+    })
+
+@app.route('/resilience', methods=['GET'])
+def resilience_status():
+    """Report retry counters and circuit breaker state for each upstream provider"""
+    return jsonify({"providers": resilience.snapshot()})
+
+@app.route('/storage/report', methods=['GET'])
+def storage_report():
+    """Dry-run the storage janitor and report what it would delete"""
+    return jsonify({
+        "report": storage_janitor.run(dry_run=True),
+        "last_run": storage_janitor.last_report
+    })
+
 @app.route('/test-gemini', methods=['GET'])
 def test_gemini():
     """Test Gemini API connection"""
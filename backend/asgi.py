@@ -0,0 +1,516 @@
+"""
+ASGI serving mode: run with `uvicorn asgi:app --port 8080`
+
+The generation endpoints are coroutines on the server's single event loop and await the
+async Gemini, FAL and httpx clients, so a pending generation holds no OS thread. Every
+other route is answered by the Flask app in app.py through a WSGI adapter.
+"""
+import os
+import json
+import time
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from config import Config
+from utils import allowed_file
+from services.job_service import BackgroundLoop, JobService
+from services.lazy_service import ServiceUnavailableError
+from services.metrics import metrics
+from services.admission import AdmissionRejected
+from app import (
+    app as flask_app, upload_store, image_ingest, gemini_service, video_service, exa_service, job_service,
+    image_payload, serialize_video_results, http_request_duration, http_requests_in_flight, admission
+)
+
+ANGLES = ['front', 'back', 'left', 'right']
+
+
+def instrumented(endpoint):
+    """Record request latency and in-flight counts under the same labels as the Flask hooks"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            if not metrics.enabled:
+                return await handler(request)
+
+            started = time.perf_counter()
+            http_requests_in_flight.inc(endpoint)
+            try:
+                response = await handler(request)
+            finally:
+                http_requests_in_flight.dec(endpoint)
+            http_request_duration.observe(time.perf_counter() - started, endpoint, request.method, response.status_code)
+            return response
+        return wrapper
+    return decorator
+
+def admitted(endpoint):
+    """Hold a slot of the endpoint's priority class (Config.ADMISSION_ENDPOINTS) while the request runs"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            priority_class = admission.class_for(endpoint)
+            if priority_class is None:
+                return await handler(request)
+
+            try:
+                ticket = await admission.acquire_async(priority_class)
+            except AdmissionRejected as e:
+                return JSONResponse(
+                    {"error": str(e), "priority_class": e.priority_class},
+                    status_code=503,
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+
+            try:
+                response = await handler(request)
+            except BaseException:
+                admission.release(ticket)
+                raise
+
+            # Streamed responses keep their slot until the stream ends
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = released_after(response.body_iterator, ticket)
+            else:
+                admission.release(ticket)
+            return response
+        return wrapper
+    return decorator
+
+async def released_after(body_iterator, ticket):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        admission.release(ticket)
+
+def error(message, status_code):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+async def service_unavailable(request, exc):
+    return JSONResponse({"error": str(exc), "service": exc.service}, status_code=503)
+
+def base_url(request):
+    return str(request.base_url).rstrip('/')
+
+async def read_json(request):
+    """Return the JSON object body of a request, or None if it is missing or malformed"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+class RequestTooLarge(Exception):
+    """The request body grew past Config.MAX_CONTENT_LENGTH"""
+
+
+async def limited_stream(request, limit):
+    """Yield the request body, raising RequestTooLarge once more than limit bytes arrived"""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise RequestTooLarge()
+        yield chunk
+
+async def read_upload_form(request):
+    """
+    Parse a multipart upload without buffering more than Config.MAX_CONTENT_LENGTH bytes
+
+    Chunked or header-less bodies have no Content-Length to check up front, so the bytes are
+    counted as they arrive. Raises RequestTooLarge, or ValueError for a malformed form.
+    """
+    if not request.headers.get('content-type', '').startswith('multipart/form-data'):
+        return FormData()
+    try:
+        return await MultiPartParser(request.headers, limited_stream(request, Config.MAX_CONTENT_LENGTH)).parse()
+    except MultiPartException as e:
+        raise ValueError(e.message)
+
+async def read_generation_request(request):
+    """Parse {image_id, shoes}; returns (data, original_image_path, error_response)"""
+    data = await read_json(request)
+    if data is None:
+        return None, None, error("Invalid JSON body", 400)
+
+    image_id = data.get('image_id')
+    shoes = data.get('shoes', [])
+    if not image_id or not shoes:
+        return None, None, error("Missing image_id or shoes data", 400)
+
+    original_image_path = upload_store.path(image_id)
+    if not original_image_path:
+        return None, None, error("Original image not found", 404)
+
+    return data, original_image_path, None
+
+def requested_asset_base(request, data):
+    """Return the absolute URL prefix for image assets when the client asked for URLs instead of base64"""
+    if data.get('images') == 'url' or request.query_params.get('images') == 'url':
+        return base_url(request)
+    return None
+
+def requested_stream_format(request, data):
+    """Return 'ndjson' or 'sse' when the client asked for a streamed response, else None"""
+    stream_format = data.get('stream') or request.query_params.get('stream')
+    if stream_format in ('ndjson', 'sse'):
+        return stream_format
+    if stream_format is True:
+        return 'ndjson'
+
+    accept = request.headers.get('accept', '')
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if 'text/event-stream' in accept:
+        return 'sse'
+    return None
+
+@instrumented('upload_image')
+@admitted('upload_image')
+async def upload_image(request):
+    """Handle image upload and return shoe recommendations"""
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > Config.MAX_CONTENT_LENGTH:
+        return error("File too large", 413)
+
+    try:
+        form = await read_upload_form(request)
+    except RequestTooLarge:
+        return error("File too large", 413)
+    except ValueError as e:
+        return error(str(e), 400)
+    file = form.get('image')
+
+    if file is None or isinstance(file, str):
+        return error("No image file provided", 400)
+
+    if not file.filename:
+        return error("No file selected", 400)
+
+    if not allowed_file(file.filename):
+        return error("Invalid file type", 400)
+
+    try:
+        # Decoding and resizing are CPU work, so they run off the event loop
+        image_meta = await asyncio.to_thread(image_ingest.ingest, await file.read())
+    except ValueError as e:
+        return error(str(e), 400)
+
+    image_id = image_meta["image_id"]
+    recommendations = await gemini_service.analyze_outfit_and_recommend_shoes_async(upload_store.path(image_id))
+
+    return JSONResponse({
+        "success": True,
+        "image_id": image_id,
+        "image": {
+            "width": image_meta["width"],
+            "height": image_meta["height"],
+            "sha256": image_meta["sha256"]
+        },
+        "recommendations": recommendations
+    })
+
+async def generate_angle_visualization(shoe, original_image_path, angle, asset_base=None):
+    """Generate one AI-powered visualization of a shoe from a single angle"""
+    shoe_desc = f"{shoe.get('brand', '')} {shoe.get('name', '')} in {shoe.get('color', '')}"
+    generated_path = await gemini_service.generate_outfit_image_with_shoes_async(original_image_path, shoe_desc, angle)
+    return {"angle": angle, **image_payload(generated_path, asset_base)}
+
+def schedule_angle_visualizations(shoes, original_image_path, angles, asset_base=None):
+    """Start every (shoe, angle) generation as a task; each resolves to (index, shoe, angle, result, error)"""
+    async def run(index, shoe, angle):
+        try:
+            return index, shoe, angle, await generate_angle_visualization(shoe, original_image_path, angle, asset_base), None
+        except Exception as e:
+            return index, shoe, angle, None, e
+
+    return [
+        asyncio.create_task(run(index, shoe, angle))
+        for index, shoe in enumerate(shoes)
+        for angle in angles
+    ]
+
+def stream_outfit_visualizations(shoes, original_image_path, angles, stream_format, asset_base=None):
+    """Stream one record per (shoe, angle) as soon as it is generated, followed by a summary record"""
+
+    def format_record(record):
+        if stream_format == 'sse':
+            return f"event: {record['type']}\ndata: {json.dumps(record)}\n\n"
+        return json.dumps(record) + "\n"
+
+    async def generate():
+        tasks = schedule_angle_visualizations(shoes, original_image_path, angles, asset_base)
+        try:
+            completed = 0
+            failed = 0
+            for next_done in asyncio.as_completed(tasks):
+                index, shoe, angle, visualization, exc = await next_done
+                if exc is None:
+                    completed += 1
+                    yield format_record({
+                        "type": "visualization",
+                        "shoe_index": index,
+                        "shoe": shoe,
+                        **visualization
+                    })
+                else:
+                    print(f"Error processing shoe {index} ({angle}): {str(exc)}")
+                    failed += 1
+                    yield format_record({
+                        "type": "error",
+                        "shoe_index": index,
+                        "shoe": shoe,
+                        "angle": angle,
+                        "error": str(exc)
+                    })
+
+            yield format_record({
+                "type": "summary",
+                "success": True,
+                "total": len(tasks),
+                "completed": completed,
+                "failed": failed
+            })
+        finally:
+            # The client went away; shared generations keep running and still fill the try-on cache
+            for task in tasks:
+                task.cancel()
+
+    media_type = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@instrumented('generate_outfits_ai')
+@admitted('generate_outfits_ai')
+async def generate_outfits_ai(request):
+    """Generate AI-powered outfit visualizations for every (shoe, angle) concurrently"""
+    data, original_image_path, error_response = await read_generation_request(request)
+    if error_response:
+        return error_response
+
+    shoes = data['shoes']
+    asset_base = requested_asset_base(request, data)
+
+    stream_format = requested_stream_format(request, data)
+    if stream_format:
+        return stream_outfit_visualizations(shoes, original_image_path, ANGLES, stream_format, asset_base)
+
+    visualizations = {index: {} for index in range(len(shoes))}
+    errors = {}
+    for next_done in asyncio.as_completed(schedule_angle_visualizations(shoes, original_image_path, ANGLES, asset_base)):
+        index, shoe, angle, visualization, exc = await next_done
+        if exc is None:
+            visualizations[index][angle] = visualization
+        else:
+            print(f"Error processing shoe {index} ({angle}): {str(exc)}")
+            errors.setdefault(index, {})[angle] = str(exc)
+
+    # Reassemble per-shoe results in request and angle order
+    results = []
+    for index, shoe in enumerate(shoes):
+        result = {
+            "shoe": shoe,
+            "visualizations": [visualizations[index][angle] for angle in ANGLES if angle in visualizations[index]]
+        }
+        if index in errors:
+            # Failure message per failed angle
+            result["errors"] = errors[index]
+        results.append(result)
+
+    return JSONResponse({"success": True, "results": results})
+
+async def generate_front_angle_image(original_image_path, shoe):
+    """Generate the front angle try-on image for a shoe, falling back to the original image"""
+    shoe_desc = f"{shoe.get('brand', '')} {shoe.get('name', '')} in {shoe.get('color', '')}"
+    front_image_path = await gemini_service.generate_outfit_image_with_shoes_async(original_image_path, shoe_desc, 'front')
+
+    if front_image_path and os.path.exists(front_image_path):
+        return front_image_path
+
+    print(f"Warning: Generated image not found or invalid: {front_image_path}")
+    return original_image_path
+
+async def run_video_generation(original_image_path, shoes, on_result=None):
+    """Run every shoe through its own image -> video -> download pipeline, all on the event loop"""
+    return await video_service.generate_videos_pipeline(
+        shoes,
+        functools.partial(generate_front_angle_image, original_image_path),
+        on_result=on_result
+    )
+
+@instrumented('generate_videos')
+@admitted('generate_videos')
+async def generate_videos(request):
+    """Generate videos for front angle images of recommended shoes"""
+    data, original_image_path, error_response = await read_generation_request(request)
+    if error_response:
+        return error_response
+
+    # Answer 503 up front when video generation is not configured
+    video_service.get()
+
+    try:
+        results = await run_video_generation(original_image_path, data['shoes'])
+        return JSONResponse({
+            "success": True,
+            "results": serialize_video_results(results, base_url(request))
+        })
+    except Exception as e:
+        print(f"Error in video generation: {str(e)}")
+        return error(f"Video generation failed: {str(e)}", 500)
+
+@instrumented('submit_video_job')
+@admitted('submit_video_job')
+async def submit_video_job(request):
+    """Start video generation on the event loop and return a job id immediately"""
+    data, original_image_path, error_response = await read_generation_request(request)
+    if error_response:
+        return error_response
+
+    video_service.get()
+
+    shoes = data['shoes']
+    job_id = job_service.submit(
+        shoes,
+        lambda on_result: run_video_generation(original_image_path, shoes, on_result=on_result),
+        input_paths=[original_image_path]
+    )
+
+    return JSONResponse({
+        "success": True,
+        "job_id": job_id,
+        "status_url": str(request.app.url_path_for('get_video_job', job_id=job_id)),
+        "events_url": str(request.app.url_path_for('stream_video_job_events', job_id=job_id))
+    }, status_code=202)
+
+@instrumented('get_video_job')
+@admitted('get_video_job')
+async def get_video_job(request):
+    """Poll the status of a video generation job"""
+    job = job_service.get_job(request.path_params['job_id'])
+
+    if job is None:
+        return error("Job not found", 404)
+
+    job["results"] = serialize_video_results(job["results"], base_url(request))
+    return JSONResponse({"success": True, "job": job})
+
+@instrumented('stream_video_job_events')
+async def stream_video_job_events(request):
+    """Stream job progress as server-sent events until the job finishes"""
+    job_id = request.path_params['job_id']
+    if job_service.get_job(job_id) is None:
+        return error("Job not found", 404)
+
+    asset_base = base_url(request)
+
+    async def generate():
+        version = -1
+        while True:
+            current_version = job_service.version(job_id)
+            if current_version == version:
+                # Nothing changed within the heartbeat window; keep the connection alive
+                yield ": heartbeat\n\n"
+            else:
+                version = current_version
+                job = job_service.get_job(job_id)
+                if job is None:
+                    return
+                job["results"] = serialize_video_results(job["results"], asset_base)
+                yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+                if job["status"] in JobService.TERMINAL_STATUSES:
+                    return
+            await job_service.wait_for_update_async(job_id, version, Config.VIDEO_JOB_SSE_HEARTBEAT_SECONDS)
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@instrumented('search_products')
+@admitted('search_products')
+async def search_products(request):
+    """Search for products for each shoe recommendation"""
+    data = await read_json(request)
+    if data is None:
+        return error("Invalid JSON body", 400)
+
+    shoes = data.get('shoes', [])
+    outfit_description = data.get('outfit_description', '')
+
+    if not shoes:
+        return error("No shoes provided for search", 400)
+
+    try:
+        # exa_py has no async client; its short searches fan out on the service's own bounded pool
+        search_results = await asyncio.to_thread(exa_service.search_shoes_for_outfit, outfit_description, shoes)
+    except Exception as e:
+        print(f"Error in product search: {str(e)}")
+        return error(f"Product search failed: {str(e)}", 500)
+
+    # Group results by shoe recommendation
+    grouped_results = {}
+    for result in search_results:
+        shoe_info = result.get('shoe_info', {})
+        shoe_key = f"{shoe_info.get('brand', '')} {shoe_info.get('name', '')}"
+
+        if shoe_key not in grouped_results:
+            grouped_results[shoe_key] = {
+                'shoe': shoe_info,
+                'search_results': []
+            }
+
+        grouped_results[shoe_key]['search_results'].append({
+            'url': result.get('url', ''),
+            'title': result.get('title', ''),
+            'description': result.get('description', ''),
+            'source': result.get('source', ''),
+            'search_query': result.get('search_query', '')
+        })
+
+    results = [
+        {'shoe': group['shoe'], 'search_results': group['search_results'][:2]}  # Limit to 2 results per shoe
+        for group in grouped_results.values()
+    ]
+
+    return JSONResponse({"success": True, "results": results})
+
+@asynccontextmanager
+async def lifespan(app):
+    # Video jobs run on the server's loop, next to the requests that submit and watch them
+    job_service.use_loop(BackgroundLoop(loop=asyncio.get_running_loop()))
+    yield
+
+app = Starlette(
+    routes=[
+        Route('/upload', upload_image, methods=['POST']),
+        Route('/generate-outfits-ai', generate_outfits_ai, methods=['POST']),
+        Route('/generate-videos', generate_videos, methods=['POST']),
+        Route('/video-jobs', submit_video_job, methods=['POST']),
+        Route('/video-jobs/{job_id}', get_video_job, methods=['GET']),
+        Route('/video-jobs/{job_id}/events', stream_video_job_events, methods=['GET']),
+        Route('/search-products', search_products, methods=['POST']),
+        # Health, stats, metrics, static assets and the remaining endpoints stay on Flask
+        Mount('', app=WSGIMiddleware(flask_app))
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=Config.CORS_ORIGINS, allow_methods=['*'], allow_headers=['*'])
+    ],
+    exception_handlers={ServiceUnavailableError: service_unavailable},
+    lifespan=lifespan
+)
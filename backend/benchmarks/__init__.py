@@ -0,0 +1 @@
+"""Offline load and latency benchmarks against simulated Gemini, FAL and Exa backends"""
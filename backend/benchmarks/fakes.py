@@ -0,0 +1,318 @@
+import io
+import os
+import time
+import uuid
+import asyncio
+import random
+import threading
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from PIL import Image
+
+
+class FakeBackendError(RuntimeError):
+    """Fault injected by a fake backend"""
+    # Reported like a provider 503 so injected faults exercise the retry and breaker layer
+    status_code = 503
+
+
+@dataclass
+class LatencyModel:
+    """Latency distribution of a simulated call, in seconds"""
+    kind: str = "lognormal"  # constant | uniform | lognormal
+    a: float = 0.1  # constant value, uniform low bound or lognormal median
+    b: float = 0.5  # uniform high bound or lognormal sigma
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """Parse 'constant:0.2', 'uniform:0.1:0.3' or 'lognormal:0.5:0.4'"""
+        parts = spec.split(':')
+        kind = parts[0]
+        if kind not in ('constant', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        values = [float(value) for value in parts[1:]]
+        if kind == 'constant':
+            return cls(kind, values[0], 0.0)
+        return cls(kind, values[0], values[1])
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'constant':
+            return self.a
+        if self.kind == 'uniform':
+            return rng.uniform(self.a, self.b)
+        return rng.lognormvariate(0.0, self.b) * self.a
+
+
+@dataclass
+class FakeBackend:
+    """Latency, fault rate and payload size of one simulated provider call"""
+    name: str
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0
+    payload_bytes: int = 0
+    time_scale: float = 1.0
+
+    def __post_init__(self):
+        self._rng = random.Random(self.name)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.faults = 0
+
+    def _next_call(self):
+        with self._lock:
+            delay = self.latency.sample(self._rng) * self.time_scale
+            fail = self._rng.random() < self.error_rate
+            self.calls += 1
+            if fail:
+                self.faults += 1
+        return delay, fail
+
+    def call(self) -> None:
+        """Sleep for a sampled latency and raise an injected fault at the configured rate"""
+        delay, fail = self._next_call()
+        time.sleep(delay)
+        if fail:
+            raise FakeBackendError(f"{self.name}: injected fault")
+
+    async def call_async(self) -> None:
+        """Async variant of call that waits without holding a thread"""
+        delay, fail = self._next_call()
+        await asyncio.sleep(delay)
+        if fail:
+            raise FakeBackendError(f"{self.name}: injected fault")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"calls": self.calls, "faults": self.faults}
+
+
+def make_composite_jpeg(panel_size=(256, 384), gutter: int = 8) -> bytes:
+    """Return a 2x2 grid of distinct gradient panels on a white background, as composite try-ons are"""
+    width, height = panel_size
+    img = Image.new('RGB', (2 * width + gutter, 2 * height + gutter), (255, 255, 255))
+    for index, color in enumerate([(200, 60, 60), (60, 160, 60), (60, 60, 200), (180, 160, 40)]):
+        gradient = Image.linear_gradient('L').resize(panel_size).rotate(90 * index).convert('RGB')
+        panel = Image.blend(gradient, Image.new('RGB', panel_size, color), 0.5)
+        img.paste(panel, ((index % 2) * (width + gutter), (index // 2) * (height + gutter)))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def make_jpeg(payload_bytes: int, seed: int = 0) -> bytes:
+    """Return a valid JPEG of roughly payload_bytes; distinct seeds give distinct bytes"""
+    rng = random.Random(seed)
+    img = Image.new('RGB', (512, 768), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    # Encode the seed in a row of blocks so distinct seeds also differ in pixels, not just bytes
+    for bit in range(32):
+        if (seed >> bit) & 1:
+            img.paste((255, 255, 255), (bit * 16, 0, bit * 16 + 16, 16))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG')
+    data = buffer.getvalue()
+
+    # Decoders ignore bytes after the end-of-image marker, so padding keeps the image valid
+    padding = max(0, payload_bytes - len(data))
+    return data + rng.randbytes(padding) if padding else data
+
+
+class FakeGeminiModel:
+    """Stands in for genai.GenerativeModel; answers with a recommend_shoes (or recommend_shoes_batch) function call"""
+
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def generate_content(self, contents: Any = None, **kwargs):
+        self.backend.call()
+        return self._response(contents, kwargs.get("tools"))
+
+    async def generate_content_async(self, contents: Any = None, **kwargs):
+        await self.backend.call_async()
+        return self._response(contents, kwargs.get("tools"))
+
+    def _recommendations(self):
+        suffix = uuid.uuid4().hex[:6]
+        return [
+            {"name": f"Runner {suffix}", "brand": "Benchmark", "color": "white", "style": "sneaker",
+             "reason": "Simulated recommendation"},
+            {"name": f"Boot {suffix}", "brand": "Benchmark", "color": "black", "style": "boot",
+             "reason": "Simulated recommendation"},
+        ]
+
+    def _response(self, contents: Any = None, tools: Any = None):
+        args = {"recommendations": self._recommendations()}
+        if tools and getattr(tools[0], "name", None) == "recommend_shoes_batch":
+            # Batch calls label each image "Image N:"; answer every numbered image
+            count = sum(1 for item in contents if isinstance(item, str) and item.startswith("Image "))
+            args = {"results": [
+                {"image_number": number, "recommendations": self._recommendations()}
+                for number in range(1, count + 1)
+            ]}
+        part = SimpleNamespace(function_call=SimpleNamespace(args=args), text=None)
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))], text="")
+
+
+def _asks_for_grid(contents: Any) -> bool:
+    for content in contents or []:
+        for part in getattr(content, 'parts', None) or []:
+            if '2x2 grid' in (getattr(part, 'text', None) or ''):
+                return True
+    return False
+
+
+class FakeImageGenerationModels:
+    """Stands in for genai.Client().models; streams one generated image"""
+
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+        self._base_image = make_jpeg(0)
+        self._composite_image = make_composite_jpeg()
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any):
+        self.backend.call()
+        yield self._chunk(contents)
+
+    def _chunk(self, contents: Any = None):
+        # Composite prompts get a splittable 2x2 grid, every other prompt a single image
+        base_image = self._composite_image if _asks_for_grid(contents) else self._base_image
+        # Unique trailing bytes so every generation is a distinct artifact
+        padding = max(0, self.backend.payload_bytes - len(base_image))
+        data = base_image + os.urandom(padding)
+        inline_data = SimpleNamespace(data=data, mime_type="image/jpeg")
+        part = SimpleNamespace(inline_data=inline_data, text=None)
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class FakeAsyncImageGenerationModels:
+    """Stands in for genai.Client().aio.models"""
+
+    def __init__(self, models: FakeImageGenerationModels):
+        self.models = models
+
+    async def generate_content_stream(self, model: str, contents: Any, config: Any):
+        await self.models.backend.call_async()
+
+        async def stream():
+            yield self.models._chunk(contents)
+        return stream()
+
+
+class FakeFalClient:
+    """Stands in for fal_client.AsyncClient; queued renders finish after the simulated latency"""
+
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    async def submit(self, application: str, arguments: Dict[str, Any]) -> "FakeFalHandle":
+        return FakeFalHandle(self.backend)
+
+
+class FakeFalHandle:
+    """Stands in for fal_client.AsyncRequestHandle"""
+
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+        self.request_id = uuid.uuid4().hex
+        self.polls = 0
+
+    async def iter_events(self, with_logs: bool = False, interval: float = 0.1):
+        # Latency and injected faults apply to waiting for the render, as they would with FAL
+        self.polls += 1
+        await self.backend.call_async()
+        yield SimpleNamespace(status="COMPLETED")
+
+    async def get(self) -> Dict[str, Any]:
+        return {"video": {"url": f"fake://video/{self.request_id}.mp4"}}
+
+
+class FakeDownloader:
+    """Stands in for VideoService._download_video; writes a video payload of the configured size"""
+
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    async def __call__(self, url: str, filename: str) -> None:
+        await self.backend.call_async()
+        with open(filename, 'wb') as f:
+            f.write(os.urandom(self.backend.payload_bytes))
+
+
+class FakeExa:
+    """Stands in for exa_py.Exa"""
+
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def search(self, query: str, num_results: int = 2, **kwargs):
+        self.backend.call()
+        text = "x" * self.backend.payload_bytes
+        return SimpleNamespace(results=[
+            SimpleNamespace(url=f"https://shop.example.com/{uuid.uuid4().hex}", title=f"{query} #{i + 1}", text=text)
+            for i in range(num_results)
+        ])
+
+
+DEFAULT_BACKENDS = {
+    # name: (latency spec, error rate, payload bytes)
+    'gemini_recommend': ('lognormal:0.5:0.3', 0.0, 0),
+    'gemini_upload': ('lognormal:0.1:0.3', 0.0, 0),
+    'gemini_image': ('lognormal:1.0:0.3', 0.0, 300 * 1024),
+    'fal_render': ('lognormal:2.0:0.3', 0.0, 0),
+    'fal_download': ('lognormal:0.2:0.3', 0.0, 2 * 1024 * 1024),
+    'exa_search': ('lognormal:0.3:0.3', 0.0, 2000),
+}
+
+
+def build_backends(overrides: Dict[str, Dict[str, Any]] = None, time_scale: float = 1.0) -> Dict[str, FakeBackend]:
+    """Create every fake backend from the defaults plus per-backend overrides"""
+    overrides = overrides or {}
+    backends = {}
+    for name, (latency, error_rate, payload_bytes) in DEFAULT_BACKENDS.items():
+        settings = overrides.get(name, {})
+        backends[name] = FakeBackend(
+            name=name,
+            latency=LatencyModel.parse(settings.get('latency', latency)),
+            error_rate=settings.get('error_rate', error_rate),
+            payload_bytes=settings.get('payload_bytes', payload_bytes),
+            time_scale=time_scale
+        )
+    return backends
+
+
+def install(app_module, backends: Dict[str, FakeBackend]) -> None:
+    """Build the app's lazy services and swap the SDK clients they use for the fakes"""
+    gemini = app_module.gemini_service.get()
+    gemini.gemini_pro_vision = FakeGeminiModel(backends['gemini_recommend'])
+    gemini.gemini_flash = FakeGeminiModel(backends['gemini_recommend'])
+    image_models = FakeImageGenerationModels(backends['gemini_image'])
+    gemini.genai_client = SimpleNamespace(
+        models=image_models,
+        aio=SimpleNamespace(models=FakeAsyncImageGenerationModels(image_models))
+    )
+
+    def upload_file(data, mime_type=None):
+        backends['gemini_upload'].call()
+        return SimpleNamespace(name=f"files/{uuid.uuid4().hex}", expiration_time=None)
+
+    gemini.file_registry.upload_fn = upload_file
+    gemini.file_registry.delete_fn = lambda name: None
+
+    video = app_module.video_service.get()
+    video.fal = FakeFalClient(backends['fal_render'])
+    video._download_video = FakeDownloader(backends['fal_download'])
+
+    app_module.exa_service.get().exa = FakeExa(backends['exa_search'])
+
+
+def backend_stats(backends: Dict[str, FakeBackend]) -> Dict[str, Dict[str, Any]]:
+    return {name: backend.stats() for name, backend in backends.items()}
+
+
+def shoe_list(count: int, tag: str) -> List[Dict[str, str]]:
+    """Shoes that miss the local product catalog, made unique by tag"""
+    return [
+        {"brand": "Benchmark", "name": f"Model {tag}-{i}", "color": "white", "style": "sneaker"}
+        for i in range(count)
+    ]
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the Flask endpoints with simulated Gemini, FAL and Exa backends
+
+Usage (from the backend directory):
+    python -m benchmarks.harness --concurrency 8 --requests 40
+    python -m benchmarks.harness --save-baseline main
+    python -m benchmarks.harness --compare main --tolerance 0.2
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import concurrent.futures
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes
+
+BASELINE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+ENDPOINTS = ['upload', 'generate-outfits-ai', 'generate-videos', 'search-products']
+
+
+def load_app(storage_root: str):
+    """Import the Flask app with all storage redirected to storage_root and no live credentials needed"""
+    from config import Config
+
+    Config.UPLOAD_FOLDER = os.path.join(storage_root, 'uploads')
+    Config.GENERATED_FOLDER = os.path.join(storage_root, 'generated')
+    Config.VIDEO_FOLDER = os.path.join(storage_root, 'videos')
+    Config.CACHE_FOLDER = os.path.join(storage_root, 'cache')
+    Config.STORAGE_JANITOR_ENABLED = False
+    Config.FAL_KEY = Config.FAL_KEY or 'benchmark'
+
+    import app as app_module
+    return app_module
+
+
+class ResourceSampler:
+    """Samples process RSS and thread count on a background thread"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.rss_peak = 0
+        self.threads_peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="benchmark-sampler", daemon=True)
+
+    @staticmethod
+    def rss_bytes() -> int:
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            import resource
+            # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == 'darwin' else peak * 1024
+
+    def _sample(self) -> None:
+        self.rss_peak = max(self.rss_peak, self.rss_bytes())
+        self.threads_peak = max(self.threads_peak, threading.active_count())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_load(request_fn: Callable[[object, int], Any], total: int, concurrency: int, app) -> Dict[str, Any]:
+    """Issue total requests with at most concurrency in flight; returns latency and resource statistics"""
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        nonlocal errors
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+
+        started = time.perf_counter()
+        try:
+            response = request_fn(client, i)
+            # Consume streamed bodies so the measurement covers the whole response
+            response.get_data()
+            ok = response.status_code < 400
+        except Exception as e:
+            print(f"Request {i} failed: {str(e)}")
+            ok = False
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    with ResourceSampler() as sampler:
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="benchmark") as pool:
+            list(pool.map(one, range(total)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "throughput_rps": round(total / wall, 3) if wall else 0.0,
+        "wall_seconds": round(wall, 3),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(percentile(latencies, 0.99) * 1000, 1),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0
+        },
+        "rss_peak_mb": round(sampler.rss_peak / (1024 * 1024), 1),
+        "threads_peak": sampler.threads_peak
+    }
+
+
+def build_scenarios(app_module, args) -> Dict[str, Callable[[object, int], Any]]:
+    """Request factories per endpoint; unique inputs defeat caches unless --repeat-ratio is set"""
+    run_tag = f"{int(time.time())}"
+
+    def pick(i: int) -> int:
+        # Every Nth request reuses input 0, so repeat_ratio of the traffic can hit caches
+        if args.repeat_ratio > 0 and i % max(1, int(round(1 / args.repeat_ratio))) == 0:
+            return 0
+        return i
+
+    def upload_image(client, seed: int):
+        image = fakes.make_jpeg(args.upload_bytes, seed=seed)
+        return client.post('/upload', data={'image': (io.BytesIO(image), f"bench_{seed}.jpg")},
+                           content_type='multipart/form-data')
+
+    # Outfit and video scenarios work against one pre-uploaded photo
+    setup_client = app_module.app.test_client()
+    image_id = upload_image(setup_client, seed=-1).get_json()["image_id"]
+
+    return {
+        'upload': lambda client, i: upload_image(client, seed=pick(i)),
+        'generate-outfits-ai': lambda client, i: client.post('/generate-outfits-ai', json={
+            "image_id": image_id,
+            "shoes": fakes.shoe_list(args.shoes, f"{run_tag}-outfit-{pick(i)}"),
+            "images": args.image_mode
+        }),
+        'generate-videos': lambda client, i: client.post('/generate-videos', json={
+            "image_id": image_id,
+            "shoes": fakes.shoe_list(args.shoes, f"{run_tag}-video-{pick(i)}")
+        }),
+        'search-products': lambda client, i: client.post('/search-products', json={
+            "shoes": fakes.shoe_list(args.shoes, f"{run_tag}-search-{pick(i)}")
+        }),
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print a comparison table and return the list of regressions beyond tolerance"""
+    regressions = []
+    print(f"\n{'endpoint':<22}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+    for endpoint, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        metrics = [
+            ("p50_ms", previous["latency_ms"]["p50"], current["latency_ms"]["p50"], True),
+            ("p95_ms", previous["latency_ms"]["p95"], current["latency_ms"]["p95"], True),
+            ("p99_ms", previous["latency_ms"]["p99"], current["latency_ms"]["p99"], True),
+            ("throughput_rps", previous["throughput_rps"], current["throughput_rps"], False),
+            ("rss_peak_mb", previous["rss_peak_mb"], current["rss_peak_mb"], True),
+        ]
+        for name, before, after, lower_is_better in metrics:
+            change = (after - before) / before if before else 0.0
+            print(f"{endpoint:<22}{name:<16}{before:>12}{after:>12}{change:>+10.1%}")
+            worse = change > tolerance if lower_is_better else change < -tolerance
+            # Only latency and throughput gate the run; memory is informational
+            if worse and name != "rss_peak_mb":
+                regressions.append(f"{endpoint} {name}: {before} -> {after} ({change:+.1%})")
+    return regressions
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_FOLDER, f"{name}.json")
+
+
+def parse_backend_overrides(values: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Parse --backend name.field=value options"""
+    overrides = {}
+    for value in values or []:
+        target, _, setting = value.partition('=')
+        name, _, field_name = target.partition('.')
+        if name not in fakes.DEFAULT_BACKENDS or field_name not in ('latency', 'error_rate', 'payload_bytes'):
+            raise SystemExit(f"Invalid --backend option: {value}")
+        parsed = setting if field_name == 'latency' else (
+            float(setting) if field_name == 'error_rate' else int(setting)
+        )
+        overrides.setdefault(name, {})[field_name] = parsed
+    return overrides
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline FitCheck.AI endpoint benchmark with simulated backends")
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument('--concurrency', type=int, default=8, help="requests in flight at once")
+    parser.add_argument('--requests', type=int, default=32, help="requests per endpoint")
+    parser.add_argument('--shoes', type=int, default=2, help="shoes per outfit/video/search request")
+    parser.add_argument('--upload-bytes', type=int, default=1024 * 1024, help="size of uploaded test images")
+    parser.add_argument('--image-mode', choices=['base64', 'url'], default='base64',
+                        help="how /generate-outfits-ai returns images")
+    parser.add_argument('--repeat-ratio', type=float, default=0.0,
+                        help="share of requests that repeat an earlier input (cache hits)")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="multiplier for all simulated latencies")
+    parser.add_argument('--backend', action='append', metavar='NAME.FIELD=VALUE',
+                        help="override a fake backend, e.g. gemini_image.latency=uniform:0.5:1.5, "
+                             "fal_render.error_rate=0.1, gemini_image.payload_bytes=500000")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--save-baseline', metavar='NAME', help="save the report as a named baseline")
+    parser.add_argument('--compare', metavar='NAME', help="compare against a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument('--verbose', action='store_true', help="keep the app's own logging")
+    args = parser.parse_args(argv)
+
+    backends = fakes.build_backends(parse_backend_overrides(args.backend), args.time_scale)
+
+    with tempfile.TemporaryDirectory(prefix="fitcheck-bench-") as storage_root:
+        app_module = load_app(storage_root)
+        fakes.install(app_module, backends)
+
+        # The services log every call; keep the report readable unless asked otherwise
+        real_stdout = sys.stdout
+        if not args.verbose:
+            sys.stdout = open(os.devnull, 'w')
+        try:
+            scenarios = build_scenarios(app_module, args)
+            results = {}
+            for endpoint in args.endpoints:
+                real_stdout.write(f"Benchmarking {endpoint} ({args.requests} requests, concurrency {args.concurrency})...\n")
+                results[endpoint] = run_load(scenarios[endpoint], args.requests, args.concurrency, app_module.app)
+        finally:
+            if sys.stdout is not real_stdout:
+                sys.stdout.close()
+                sys.stdout = real_stdout
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {key: value for key, value in vars(args).items()
+                         if key not in ('output', 'save_baseline', 'compare', 'verbose')}
+        },
+        "endpoints": results,
+        "backends": fakes.backend_stats(backends)
+    }
+
+    print(f"\n{'endpoint':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}{'RSS MB':>9}{'threads':>9}")
+    for endpoint, result in results.items():
+        latency = result["latency_ms"]
+        print(f"{endpoint:<22}{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}"
+              f"{result['throughput_rps']:>9}{result['errors']:>8}{result['rss_peak_mb']:>9}{result['threads_peak']:>9}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_FOLDER, exist_ok=True)
+        with open(baseline_path(args.save_baseline), 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline '{args.save_baseline}'")
+
+    if args.compare:
+        try:
+            with open(baseline_path(args.compare)) as f:
+                baseline = json.load(f)
+        except OSError:
+            print(f"Baseline '{args.compare}' not found")
+            return 2
+
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions beyond tolerance:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions beyond tolerance")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
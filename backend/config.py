@@ -9,8 +9,25 @@ class Config:
     
     # Flask configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    UPLOAD_FOLDER = 'uploads'
-    GENERATED_FOLDER = 'generated'
+    
+    # Storage folders, anchored to the backend directory so they do not depend on the CWD.
+    # Uploads, generated images and videos are content-addressed artifact stores.
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+    GENERATED_FOLDER = os.path.join(BASE_DIR, 'generated')
+    CACHE_FOLDER = os.path.join(BASE_DIR, 'cache')
+    VIDEO_FOLDER = os.path.join(BASE_DIR, 'generated_videos')
+    # Batch renders of ImageToVideo.py; not managed by the storage janitor, so backfills are never evicted
+    BACKFILL_VIDEO_FOLDER = os.path.join(BASE_DIR, 'backfill_videos')
+    
+    # Asset serving: let a fronting nginx/Apache send files via X-Sendfile when enabled
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
+    VIDEO_CACHE_MAX_AGE = 24 * 60 * 60  # 1 day; video names are content hashes and never change
+    IMAGE_ASSET_MAX_AGE = 24 * 60 * 60  # 1 day; the janitor may evict images, so cached URLs must not outlive them
+    IMAGE_ASSET_SIZES = {'thumb': 256, 'medium': 512}  # longest side in pixels
+    IMAGE_ASSET_QUALITY = {'JPEG': 85, 'WEBP': 80, 'AVIF': 60}
+    IMAGE_RENDITION_CACHE_MAX_ENTRIES = 10000
+    IMAGE_RENDITION_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
     # CORS origins
@@ -30,6 +47,20 @@ class Config:
     # Exa API configuration
     EXA_API_KEY = os.getenv('EXA_API_KEY')
     
+    # Exa product search settings
+    EXA_SEARCH_MAX_WORKERS = 8
+    EXA_SEARCH_CACHE_MAX_ENTRIES = 2048
+    EXA_SEARCH_CACHE_TTL = 6 * 60 * 60  # fresh for 6 hours
+    EXA_SEARCH_CACHE_STALE_TTL = 24 * 60 * 60  # then served stale for up to a day while refreshing
+    
+    # Local product catalog searched before Exa
+    PRODUCT_CATALOG_PATH = os.getenv(
+        'PRODUCT_CATALOG_PATH',
+        os.path.join(BASE_DIR, 'data', 'product_catalog.json')
+    )
+    PRODUCT_CATALOG_MIN_CONFIDENCE = 0.8  # fraction of the shoe's model name tokens a product must match; brand and color must match fully
+    PRODUCT_CATALOG_RELOAD_INTERVAL_SECONDS = 30
+    
     # Gemini model names
     GEMINI_PRO_VISION_MODEL = 'gemini-2.5-pro'
     GEMINI_FLASH_MODEL = 'gemini-2.5-flash'
@@ -41,13 +72,160 @@ class Config:
     VIZ_MAX_IMAGE_SIZE = 768
     VIZ_IMAGE_DIMENSIONS = (512, 768)
     
+    # Upload ingest: decode once, normalize to a master image and store pre-sized variants
+    INGEST_MASTER_MAX_SIZE = 2048
+    INGEST_MASTER_QUALITY = 95
+    INGEST_MAX_PIXELS = 50 * 1000 * 1000  # reject decompression bombs above 50 megapixels
+    INGEST_METADATA_CACHE_ENTRIES = 1024
+    
+    # In-process cache of prepared (resized JPEG) image bytes
+    PREPARED_IMAGE_CACHE_MAX_ENTRIES = 256
+    PREPARED_IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+    
+    # Gemini File API handle reuse (uploaded files expire server-side after 48 hours)
+    GEMINI_FILE_DEFAULT_TTL_SECONDS = 48 * 60 * 60
+    GEMINI_FILE_EXPIRY_MARGIN_SECONDS = 10 * 60
+    GEMINI_FILE_IDLE_SECONDS = 6 * 60 * 60
+    GEMINI_FILE_CLEANUP_INTERVAL_SECONDS = 10 * 60
+    
+    # Generation concurrency settings
+    # Threads shared by all requests for (shoe, angle) generation tasks
+    GENERATION_MAX_WORKERS = 16
+    # Concurrent image generation calls allowed process-wide (size to the Gemini quota)
+    GEMINI_IMAGE_GENERATION_CONCURRENCY = 8
+    
+    # Optional single-call multi-angle try-on: one 2x2 composite (front, back, left, right) per shoe,
+    # split locally into per-angle images; falls back to per-angle calls when no grid is detected
+    GEMINI_COMPOSITE_ANGLES_ENABLED = os.getenv('GEMINI_COMPOSITE_ANGLES_ENABLED', 'false').lower() == 'true'
+    COMPOSITE_MIN_TILE_SIZE = 128  # pixels; smaller panels are rejected
+    COMPOSITE_FAILURE_TTL_SECONDS = 10 * 60  # an (image, shoe) whose composite failed uses per-angle calls meanwhile
+    
+    # Recommendation cache settings
+    # Bump the prompt version whenever the recommendation prompt or schema changes
+    RECOMMENDATION_PROMPT_VERSION = 'v1'
+    RECOMMENDATION_CACHE_TTL = 7 * 24 * 60 * 60  # 7 days
+    RECOMMENDATION_CACHE_MEMORY_ENTRIES = 512
+    RECOMMENDATION_CACHE_DISK_ENTRIES = 10000
+    
+    # Batch outfit analysis (/upload-batch): uncached images are packed into shared model calls
+    BATCH_UPLOAD_MAX_IMAGES = 50
+    BATCH_INGEST_MAX_WORKERS = 4  # parallel decode/normalize of the uploaded files
+    BATCH_ANALYSIS_IMAGES_PER_CALL = 4
+    BATCH_ANALYSIS_MAX_PARALLEL_CALLS = 4
+    
+    # Try-on image cache settings (files live in GENERATED_FOLDER and are deleted by the storage janitor)
+    TRYON_CACHE_MAX_ENTRIES = 2000
+    TRYON_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
+    
+    # Background video job settings
+    VIDEO_JOB_MAX_CONCURRENT = 2
+    VIDEO_JOB_RETENTION_SECONDS = 60 * 60  # 1 hour
+    VIDEO_JOB_SSE_HEARTBEAT_SECONDS = 15
+    # Job snapshots shared by all workers (default: CACHE_FOLDER/jobs); must be storage every worker can reach
+    VIDEO_JOB_STORE_FOLDER = os.getenv('VIDEO_JOB_STORE_FOLDER')
+    VIDEO_JOB_POLL_INTERVAL_SECONDS = 0.5  # how often a worker checks a job another worker runs
+    
+    # Per-stage concurrency of the video pipeline (front image -> render -> download)
+    VIDEO_IMAGE_STAGE_CONCURRENCY = 4
+    VIDEO_RENDER_STAGE_CONCURRENCY = 4
+    VIDEO_DOWNLOAD_STAGE_CONCURRENCY = 4
+    VIDEO_RENDER_TIMEOUT_SECONDS = 10 * 60  # a queued render is polled until done or this deadline
+    VIDEO_RENDER_POLL_INTERVAL_SECONDS = 2.0
+    VIDEO_DOWNLOAD_TIMEOUT_SECONDS = 120
+    VIDEO_DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+    
+    # Services are built on first use (or by /ready); a failed build is retried after this delay
+    SERVICE_INIT_RETRY_SECONDS = 30
+    
+    # Admission control (services/admission.py): each managed endpoint belongs to a priority class
+    # (lower number = served first) with its own concurrency and queue budget. Requests over budget
+    # wait up to queue_timeout_seconds; once a class queue is full they get 503 with Retry-After.
+    # Heavy classes get less than the total capacity so interactive requests always have room.
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_TOTAL_CAPACITY = int(os.getenv('ADMISSION_TOTAL_CAPACITY', '32'))
+    ADMISSION_MAX_RETRY_AFTER_SECONDS = 120
+    ADMISSION_CLASSES = {
+        'interactive': {'priority': 0, 'max_concurrent': 32, 'max_queue': 64,
+                        'queue_timeout_seconds': 10.0, 'expected_seconds': 0.5},
+        'generation': {'priority': 1, 'max_concurrent': 8, 'max_queue': 16,
+                       'queue_timeout_seconds': 15.0, 'expected_seconds': 20.0},
+        'video': {'priority': 2, 'max_concurrent': 4, 'max_queue': 4,
+                  'queue_timeout_seconds': 5.0, 'expected_seconds': 120.0}
+    }
+    # Endpoint (Flask view function) -> priority class; endpoints not listed are never queued
+    ADMISSION_ENDPOINTS = {
+        'upload_image': 'interactive',
+        'upload_batch': 'generation',
+        'search_products': 'interactive',
+        'serve_image': 'interactive',
+        'serve_video': 'interactive',
+        'submit_video_job': 'interactive',
+        'get_video_job': 'interactive',
+        'generate_outfits': 'generation',
+        'generate_outfits_ai': 'generation',
+        'generate_videos': 'video'
+    }
+    
+    # Retries and circuit breakers per provider (services/resilience.py).
+    # Transient failures (429, 5xx, timeouts, connection errors) are retried with full-jitter
+    # exponential backoff; after failure_threshold consecutive failures the provider's breaker
+    # opens and calls fail fast for recovery_seconds before a single trial call is let through.
+    RESILIENCE_POLICIES = {
+        'gemini': {'max_attempts': 3, 'base_delay': 0.5, 'max_delay': 8.0,
+                   'failure_threshold': 5, 'recovery_seconds': 30.0},
+        'gemini_image': {'max_attempts': 3, 'base_delay': 1.0, 'max_delay': 10.0,
+                         'failure_threshold': 5, 'recovery_seconds': 30.0},
+        'fal': {'max_attempts': 2, 'base_delay': 2.0, 'max_delay': 15.0,
+                'failure_threshold': 3, 'recovery_seconds': 60.0},
+        'exa': {'max_attempts': 3, 'base_delay': 0.25, 'max_delay': 4.0,
+                'failure_threshold': 5, 'recovery_seconds': 30.0}
+    }
+    
+    # Prometheus metrics on /metrics; when disabled, instrumentation is a no-op
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    
+    # Storage janitor: per-folder quotas, enforced by age first and then least recently used.
+    # Files referenced by any worker's jobs or the cache indexes are never deleted, nor are files
+    # younger than STORAGE_MIN_AGE_SECONDS (they may still be in use by a request).
+    # A stored artifact's files (an upload's master, metadata and variants) are kept or deleted together.
+    STORAGE_JANITOR_ENABLED = os.getenv('STORAGE_JANITOR_ENABLED', 'true').lower() == 'true'
+    STORAGE_JANITOR_INTERVAL_SECONDS = 15 * 60
+    # Only the worker holding this lock sweeps; it must be on storage every worker shares
+    STORAGE_JANITOR_LOCK_FILE = os.path.join(CACHE_FOLDER, 'storage_janitor.lock')
+    STORAGE_MIN_AGE_SECONDS = 10 * 60
+    STORAGE_INCOMING_MAX_AGE_SECONDS = 60 * 60  # scratch files of unfinished uploads and downloads
+    STORAGE_POLICIES = {
+        'uploads': {
+            'folder': UPLOAD_FOLDER,
+            'max_bytes': 2 * 1024 * 1024 * 1024,  # 2GB
+            'max_files': 5000,
+            'max_age_seconds': 3 * 24 * 60 * 60,
+            'transient_patterns': ['temp_*'],  # scratch files left in uploads by older versions
+            'transient_max_age_seconds': 60 * 60
+        },
+        'generated': {
+            'folder': GENERATED_FOLDER,
+            'max_bytes': 4 * 1024 * 1024 * 1024,  # 4GB
+            'max_files': 20000,
+            'max_age_seconds': 7 * 24 * 60 * 60
+        },
+        'videos': {
+            'folder': VIDEO_FOLDER,
+            'max_bytes': 10 * 1024 * 1024 * 1024,  # 10GB
+            'max_files': 2000,
+            'max_age_seconds': 7 * 24 * 60 * 60
+        }
+    }
+    
     @staticmethod
     def init_app(app):
         """Initialize application with configuration"""
         app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
         app.config['UPLOAD_FOLDER'] = Config.UPLOAD_FOLDER
         app.config['GENERATED_FOLDER'] = Config.GENERATED_FOLDER
+        app.config['USE_X_SENDFILE'] = Config.USE_X_SENDFILE
         
         # Create necessary directories
         os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
         os.makedirs(Config.GENERATED_FOLDER, exist_ok=True)
+        os.makedirs(Config.CACHE_FOLDER, exist_ok=True)
@@ -35,6 +35,16 @@ class ShoeVideoGeneration:
     shoe: Dict[str, str]
     videos: List[VideoGeneration]
 
+@dataclass
+class VideoJob:
+    """Data class for an asynchronous video generation job"""
+    job_id: str
+    status: str  # 'queued', 'processing', 'completed', 'partial', 'failed'
+    results: List[ShoeVideoGeneration]
+    created_at: float
+    updated_at: float
+    error: str = ""
+
 class DefaultShoes:
     """Default shoe recommendations for fallback scenarios"""
     
@@ -0,0 +1,248 @@
+import math
+import time
+import asyncio
+import itertools
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a request cannot be admitted; answered with 503 and Retry-After"""
+
+    def __init__(self, priority_class: str, reason: str, retry_after: int):
+        super().__init__(f"Server is busy ({priority_class} capacity exhausted: {reason}); retry in {retry_after}s")
+        self.priority_class = priority_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request; pass it back to AdmissionController.release when the request ends"""
+    __slots__ = ('priority_class', 'admitted_at')
+
+    def __init__(self, priority_class: str):
+        self.priority_class = priority_class
+        self.admitted_at = time.perf_counter()
+
+
+class _PriorityClass:
+    def __init__(self, name: str, priority: int, max_concurrent: int, max_queue: int,
+                 queue_timeout_seconds: float, expected_seconds: float):
+        self.name = name
+        self.priority = priority
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        # Moving average of how long admitted requests hold their slot, used for Retry-After
+        self.average_seconds = expected_seconds
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+
+class _Waiter:
+    __slots__ = ('priority_class', 'seq', 'granted', 'event', 'loop', 'future')
+
+    def __init__(self, priority_class: _PriorityClass, seq: int):
+        self.priority_class = priority_class
+        self.seq = seq
+        self.granted = False
+        self.event = None
+        self.loop = None
+        self.future = None
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(True)
+
+
+class AdmissionController:
+    """
+    Priority classes with capacity budgets in front of the endpoints
+
+    Every managed endpoint belongs to a priority class. A request runs when its class is below
+    max_concurrent and the process is below its total capacity; otherwise it waits in a queue
+    that is served highest priority (lowest number) first. When the class queue already holds
+    max_queue requests, or a request waits longer than queue_timeout_seconds, it is rejected with
+    a Retry-After estimated from the class's recent service time. Because the heavy classes'
+    budgets are smaller than the total capacity, cheap interactive requests always find a slot.
+    """
+
+    def __init__(self, capacity: int = None, classes: Dict[str, Dict[str, Any]] = None,
+                 endpoints: Dict[str, str] = None, enabled: bool = None):
+        self.enabled = Config.ADMISSION_ENABLED if enabled is None else enabled
+        self.capacity = capacity or Config.ADMISSION_TOTAL_CAPACITY
+        self.endpoints = endpoints if endpoints is not None else Config.ADMISSION_ENDPOINTS
+        self.classes = {
+            name: _PriorityClass(name, **settings)
+            for name, settings in (classes if classes is not None else Config.ADMISSION_CLASSES).items()
+        }
+
+        self.in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def class_for(self, endpoint: Optional[str]) -> Optional[str]:
+        """Priority class of an endpoint, or None if the endpoint is not managed"""
+        if not self.enabled or endpoint is None:
+            return None
+        return self.endpoints.get(endpoint)
+
+    def _can_run(self, priority_class: _PriorityClass) -> bool:
+        return self.in_flight < self.capacity and priority_class.in_flight < priority_class.max_concurrent
+
+    def _grant(self, waiter: _Waiter) -> None:
+        waiter.granted = True
+        priority_class = waiter.priority_class
+        priority_class.waiting -= 1
+        priority_class.in_flight += 1
+        priority_class.admitted += 1
+        self.in_flight += 1
+
+        if waiter.event is not None:
+            waiter.event.set()
+        elif waiter.future is not None:
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters, highest priority and oldest first; call with the lock held"""
+        if not self._waiters:
+            return
+
+        self._waiters.sort(key=lambda waiter: (waiter.priority_class.priority, waiter.seq))
+        remaining = []
+        for waiter in self._waiters:
+            if self._can_run(waiter.priority_class):
+                self._grant(waiter)
+            else:
+                remaining.append(waiter)
+        self._waiters = remaining
+
+    def _retry_after(self, priority_class: _PriorityClass) -> int:
+        """Seconds until the class queue has likely drained, clamped to Config.ADMISSION_MAX_RETRY_AFTER_SECONDS"""
+        backlog = priority_class.waiting + priority_class.in_flight + 1
+        estimate = priority_class.average_seconds * backlog / max(1, priority_class.max_concurrent)
+        return max(1, min(Config.ADMISSION_MAX_RETRY_AFTER_SECONDS, math.ceil(estimate)))
+
+    def _enqueue(self, class_name: str) -> _Waiter:
+        """Queue a waiter and dispatch; raises AdmissionRejected when the class queue is full"""
+        priority_class = self.classes[class_name]
+        waiter = _Waiter(priority_class, next(self._seq))
+        priority_class.waiting += 1
+        self._waiters.append(waiter)
+        self._dispatch()
+
+        if not waiter.granted:
+            if priority_class.waiting > priority_class.max_queue:
+                self._abandon(waiter)
+                priority_class.rejected_queue_full += 1
+                raise AdmissionRejected(class_name, "queue full", self._retry_after(priority_class))
+            priority_class.queued += 1
+        return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Remove a waiter that gave up; call with the lock held"""
+        self._waiters.remove(waiter)
+        waiter.priority_class.waiting -= 1
+
+    def _timed_out(self, waiter: _Waiter) -> Optional[Ticket]:
+        """Settle a waiter whose wait ended without a signal; returns a ticket if it was granted meanwhile"""
+        priority_class = waiter.priority_class
+        with self._lock:
+            if waiter.granted:
+                return Ticket(priority_class.name)
+            self._abandon(waiter)
+            priority_class.rejected_timeout += 1
+            retry_after = self._retry_after(priority_class)
+        raise AdmissionRejected(priority_class.name, "queue wait timed out", retry_after)
+
+    def acquire(self, class_name: str) -> Ticket:
+        """Wait for a slot in the class, blocking the calling thread; raises AdmissionRejected"""
+        with self._lock:
+            waiter = self._enqueue(class_name)
+            if waiter.granted:
+                return Ticket(class_name)
+            waiter.event = threading.Event()
+
+        if waiter.event.wait(waiter.priority_class.queue_timeout_seconds):
+            return Ticket(class_name)
+        return self._timed_out(waiter)
+
+    async def acquire_async(self, class_name: str) -> Ticket:
+        """Wait for a slot in the class without blocking the event loop; raises AdmissionRejected"""
+        with self._lock:
+            waiter = self._enqueue(class_name)
+            if waiter.granted:
+                return Ticket(class_name)
+            waiter.loop = asyncio.get_running_loop()
+            waiter.future = waiter.loop.create_future()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), waiter.priority_class.queue_timeout_seconds)
+            return Ticket(class_name)
+        except asyncio.TimeoutError:
+            return self._timed_out(waiter)
+        except asyncio.CancelledError:
+            # The client went away while queued; give back a slot granted in the meantime
+            with self._lock:
+                if not waiter.granted:
+                    self._abandon(waiter)
+                    raise
+            self.release(Ticket(class_name))
+            raise
+
+    def release(self, ticket: Optional[Ticket]) -> None:
+        """Free the slot held by an admitted request and wake the next waiters"""
+        if ticket is None:
+            return
+
+        held = time.perf_counter() - ticket.admitted_at
+        with self._lock:
+            priority_class = self.classes[ticket.priority_class]
+            priority_class.in_flight -= 1
+            self.in_flight -= 1
+            priority_class.average_seconds += 0.2 * (held - priority_class.average_seconds)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-class in-flight and queued requests, admissions and rejections"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "classes": {
+                    name: {
+                        "priority": c.priority,
+                        "max_concurrent": c.max_concurrent,
+                        "max_queue": c.max_queue,
+                        "in_flight": c.in_flight,
+                        "waiting": c.waiting,
+                        "admitted": c.admitted,
+                        "queued": c.queued,
+                        "rejected_queue_full": c.rejected_queue_full,
+                        "rejected_timeout": c.rejected_timeout,
+                        "average_seconds": round(c.average_seconds, 3)
+                    }
+                    for name, c in self.classes.items()
+                }
+            }
+
+    def collect(self):
+        """Metrics collector: per-class in-flight and queued requests and rejections"""
+        classes = self.stats()["classes"]
+        yield ('fitcheck_admission_in_flight', 'Admitted requests running per priority class', 'gauge',
+               [({'class': name}, c['in_flight']) for name, c in classes.items()])
+        yield ('fitcheck_admission_waiting', 'Requests queued for admission per priority class', 'gauge',
+               [({'class': name}, c['waiting']) for name, c in classes.items()])
+        yield ('fitcheck_admission_rejected_total', 'Requests rejected with 503 per priority class', 'counter',
+               [({'class': name, 'reason': reason}, c[f'rejected_{reason}'])
+                for name, c in classes.items() for reason in ('queue_full', 'timeout')])
@@ -0,0 +1,118 @@
+import io
+import os
+import mimetypes
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from config import Config
+from utils import normalize_image
+from services.cache_service import ArtifactCache
+from services.storage_service import ArtifactStore
+
+
+class ImageAssetService:
+    """Serves stored images by content key, with resized and re-encoded renditions"""
+
+    # Preference order when the client accepts several formats
+    FORMATS = [
+        ('image/avif', 'AVIF', '.avif'),
+        ('image/webp', 'WEBP', '.webp'),
+    ]
+
+    def __init__(self, store: ArtifactStore):
+        """
+        Create the asset service
+
+        Args:
+            store: Store holding the source images; renditions are written to it as well
+        """
+        self.store = store
+        self.renditions = ArtifactCache(
+            os.path.join(Config.CACHE_FOLDER, 'rendition_index.sqlite3'),
+            max_entries=Config.IMAGE_RENDITION_CACHE_MAX_ENTRIES,
+            max_bytes=Config.IMAGE_RENDITION_CACHE_MAX_BYTES
+        )
+
+        Image.init()
+        self.supported_formats = [entry for entry in self.FORMATS if entry[1] in Image.SAVE]
+
+    def key_for_path(self, image_path: str) -> Optional[str]:
+        """Return the asset key of a stored image path, or None if the file is not in the store"""
+        key = os.path.basename(image_path or '')
+        if self.store.path(key) != image_path:
+            return None
+        return key
+
+    def negotiate_format(self, accept_header: str) -> Optional[Tuple[str, str, str]]:
+        """Pick the best modern format listed explicitly in Accept; None means keep the JPEG"""
+        accepted = set()
+        for item in (accept_header or '').split(','):
+            parts = [part.strip() for part in item.split(';')]
+            quality = 1.0
+            for param in parts[1:]:
+                if param.startswith('q='):
+                    try:
+                        quality = float(param[2:])
+                    except ValueError:
+                        quality = 0.0
+            if quality > 0:
+                accepted.add(parts[0].lower())
+
+        for entry in self.supported_formats:
+            if entry[0] in accepted:
+                return entry
+        return None
+
+    def rendition(self, key: str, size: str = None, accept_header: str = '') -> Optional[Dict[str, Any]]:
+        """
+        Resolve the file to send for an image request
+
+        Args:
+            key: Store key of the source image
+            size: Name of a configured size (e.g. 'thumb'), or None for full size
+            accept_header: The request's Accept header used for format negotiation
+
+        Returns:
+            Dict with the file path and mimetype, or None if the image does not exist
+
+        Raises:
+            ValueError: If size is not a configured size
+        """
+        source_path = self.store.path(key)
+        if source_path is None:
+            return None
+
+        max_size = None
+        if size:
+            if size not in Config.IMAGE_ASSET_SIZES:
+                raise ValueError(f"Unknown size '{size}'; expected one of {sorted(Config.IMAGE_ASSET_SIZES)}")
+            max_size = Config.IMAGE_ASSET_SIZES[size]
+
+        target = self.negotiate_format(accept_header)
+        if max_size is None and target is None:
+            return {"path": source_path, "mimetype": mimetypes.guess_type(source_path)[0] or "image/jpeg"}
+
+        mimetype, pil_format, extension = target or ('image/jpeg', 'JPEG', '.jpg')
+        rendition_key = f"{key}:{size or 'full'}:{pil_format}"
+
+        path = self.renditions.get(rendition_key)
+        if path is None:
+            path = self._render(source_path, max_size, pil_format, extension)
+            self.renditions.put(rendition_key, path, meta={"source": key, "size": size, "format": pil_format})
+
+        return {"path": path, "mimetype": mimetype}
+
+    def _render(self, source_path: str, max_size: Optional[int], pil_format: str, extension: str) -> str:
+        """Resize and encode a source image and store the result; returns its path"""
+        with Image.open(source_path) as img:
+            img = normalize_image(img, max_size or max(img.size))
+            buffer = io.BytesIO()
+            img.save(buffer, format=pil_format, quality=Config.IMAGE_ASSET_QUALITY[pil_format])
+
+        return self.store.path(self.store.put(buffer.getvalue(), extension))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.renditions.stats()
+        stats["formats"] = [entry[0] for entry in self.supported_formats]
+        return stats
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+from utils import MemoryCache
+
+
+class TieredCache:
+    """Two-tier JSON cache: an in-memory LRU in front of a directory of files on disk"""
+
+    def __init__(self, folder: str, ttl: Optional[float] = None,
+                 memory_entries: int = 256, disk_entries: int = 10000):
+        """
+        Create a tiered cache
+
+        Args:
+            folder: Directory holding one JSON file per cached entry
+            ttl: Seconds an entry stays valid in either tier (None means no expiry)
+            memory_entries: Maximum entries held in memory
+            disk_entries: Maximum entry files kept on disk before LRU eviction
+        """
+        self.folder = folder
+        self.ttl = ttl
+        self.disk_entries = disk_entries
+        self.memory = MemoryCache(max_entries=memory_entries, ttl=ttl)
+
+        self._lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_evictions = 0
+
+        os.makedirs(self.folder, exist_ok=True)
+
+    def get(self, key: str) -> Any:
+        """Return the cached value from memory or disk, or None on a miss"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        path = self._path_for(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self.ttl is not None and entry.get("created_at", 0) + self.ttl <= time.time():
+            self._remove_file(path)
+            return None
+
+        # Touch the file so disk eviction follows recency of use
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        remaining = None
+        if self.ttl is not None:
+            remaining = entry["created_at"] + self.ttl - time.time()
+        self.memory.set(key, entry["value"], ttl=remaining)
+
+        with self._lock:
+            self.disk_hits += 1
+        return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value in both tiers"""
+        self.memory.set(key, value)
+
+        path = self._path_for(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({"created_at": time.time(), "value": value}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry {key}: {str(e)}")
+            self._remove_file(temp_path)
+            return
+
+        self._prune_disk()
+
+    def delete(self, key: str) -> None:
+        """Remove a key from both tiers"""
+        self.memory.delete(key)
+        self._remove_file(self._path_for(key))
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _remove_file(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _prune_disk(self) -> None:
+        """Evict least recently used entry files beyond the disk quota"""
+        with self._lock:
+            try:
+                entries = [e for e in os.scandir(self.folder) if e.name.endswith('.json')]
+            except OSError:
+                return
+
+            overflow = len(entries) - self.disk_entries
+            if overflow <= 0:
+                return
+
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            for entry in entries[:overflow]:
+                self._remove_file(entry.path)
+                self.disk_evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return combined counters for both tiers"""
+        memory_stats = self.memory.stats()
+        with self._lock:
+            disk_hits = self.disk_hits
+            disk_evictions = self.disk_evictions
+
+        # Memory misses that were answered by disk are hits overall
+        hits = memory_stats["hits"] + disk_hits
+        misses = memory_stats["misses"] - disk_hits
+        lookups = hits + misses
+        return {
+            "memory": memory_stats,
+            "disk_hits": disk_hits,
+            "disk_evictions": disk_evictions,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class ArtifactCache:
+    """
+    Persistent index mapping cache keys to generated files, with LRU and size-quota eviction
+
+    The index is a SQLite database shared by every worker process: each put and eviction is a
+    small transaction instead of a rewrite of the whole index, and entries written by one
+    worker are visible to the others (and to the storage janitor) at once.
+
+    Eviction only drops index entries. The files live in content-addressed stores where they
+    may also back URLs already handed out or inputs of running jobs, so deleting them is left to
+    the storage janitor, which sees every reference (including this index).
+    """
+
+    # A hit refreshes the entry's last use at most this often, so hot keys do not write on every read
+    TOUCH_INTERVAL_SECONDS = 60
+
+    def __init__(self, index_path: str, max_entries: int = 1000, max_bytes: Optional[int] = None):
+        """
+        Create an artifact cache
+
+        Args:
+            index_path: SQLite file recording key -> file path, size and last use
+            max_entries: Maximum number of artifacts indexed before LRU eviction
+            max_bytes: Optional total size quota for the indexed files
+        """
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._lock:
+            self._import_legacy_index()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached file path for key, or None if missing or deleted from disk"""
+        with self._lock:
+            try:
+                db = self._db()
+                row = db.execute('SELECT path, last_used FROM artifacts WHERE key = ?', (key,)).fetchone()
+                if row is not None and not os.path.exists(row[0]):
+                    # The file was removed behind our back; forget it
+                    db.execute('DELETE FROM artifacts WHERE key = ?', (key,))
+                    row = None
+                if row is not None and time.time() - row[1] > self.TOUCH_INTERVAL_SECONDS:
+                    db.execute('UPDATE artifacts SET last_used = ? WHERE key = ?', (time.time(), key))
+            except sqlite3.Error as e:
+                print(f"Error reading artifact index: {str(e)}")
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, path: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        """Record a generated file under key and evict old artifacts beyond the quota"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute('BEGIN IMMEDIATE')
+                try:
+                    db.execute(
+                        'INSERT OR REPLACE INTO artifacts (key, path, size, last_used, meta) VALUES (?, ?, ?, ?, ?)',
+                        (key, path, size, time.time(), json.dumps(meta or {}))
+                    )
+                    self._evict(db)
+                    db.execute('COMMIT')
+                except BaseException:
+                    db.execute('ROLLBACK')
+                    raise
+            except sqlite3.Error as e:
+                print(f"Error saving artifact index: {str(e)}")
+
+    def paths(self) -> set:
+        """Return the set of file paths currently referenced by the cache, as recorded by every worker"""
+        with self._lock:
+            return {row[0] for row in self._db().execute('SELECT path FROM artifacts')}
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        """Drop least recently used entries until within quota, keeping their files; call inside a transaction"""
+        count, total_bytes = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts').fetchone()
+        if count <= self.max_entries and (self.max_bytes is None or total_bytes <= self.max_bytes):
+            return
+
+        evicted = []
+        for key, size in db.execute('SELECT key, size FROM artifacts ORDER BY last_used'):
+            if count <= self.max_entries and (self.max_bytes is None or total_bytes <= self.max_bytes):
+                break
+            evicted.append((key,))
+            count -= 1
+            total_bytes -= size
+        db.executemany('DELETE FROM artifacts WHERE key = ?', evicted)
+        self.evictions += len(evicted)
+
+    def _db(self) -> sqlite3.Connection:
+        """This process's connection to the index, opened on first use; caller must hold the lock"""
+        # A connection must not cross a fork (e.g. a preloading WSGI server), so each process opens its own
+        if self._connection is None or self._connection_pid != os.getpid():
+            index_dir = os.path.dirname(self.index_path)
+            if index_dir:
+                os.makedirs(index_dir, exist_ok=True)
+
+            db = sqlite3.connect(self.index_path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS artifacts ('
+                'key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, '
+                'last_used REAL NOT NULL, meta TEXT NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS artifacts_last_used ON artifacts (last_used)')
+            self._connection = db
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _import_legacy_index(self) -> None:
+        """Carry over the entries of the JSON index older versions kept next to the database"""
+        legacy_path = os.path.splitext(self.index_path)[0] + '.json'
+        if legacy_path == self.index_path or not os.path.exists(legacy_path):
+            return
+
+        try:
+            with open(legacy_path, 'r') as f:
+                index = json.load(f)
+            rows = [
+                (key, entry["path"], entry["size"], entry["last_used"], json.dumps(entry.get("meta") or {}))
+                for key, entry in index.items() if os.path.exists(entry.get("path", ""))
+            ]
+            self._db().executemany(
+                'INSERT OR IGNORE INTO artifacts (key, path, size, last_used, meta) VALUES (?, ?, ?, ?, ?)', rows
+            )
+            os.replace(legacy_path, legacy_path + '.imported')
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, sqlite3.Error) as e:
+            print(f"Error importing legacy artifact index {legacy_path}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return this process's hit/miss counters and the shared index's occupancy"""
+        with self._lock:
+            try:
+                entries, total_bytes = self._db().execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts'
+                ).fetchone()
+            except sqlite3.Error:
+                entries = total_bytes = 0
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+
+
+class ProductCatalog:
+    """Local product catalog searched through a token inverted index with BM25 ranking"""
+
+    # Query words that say nothing about which product is wanted
+    STOPWORDS = {'shoes', 'shoe', 'buy', 'online', 'in', 'the', 'a', 'and', 'for', 'with', 'of'}
+
+    # Field weights: a token in the model name counts more than one in the description
+    FIELD_WEIGHTS = {'brand': 2, 'name': 3, 'color': 1, 'style': 1, 'title': 1, 'description': 1}
+
+    # Shoe fields that must agree with a product, and the product fields they are matched against
+    MATCH_FIELDS = {'brand': ('brand',), 'name': ('name', 'title'), 'color': ('color',)}
+
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+
+    def __init__(self, catalog_path: str = None):
+        """Load the catalog file (if present) and build the index"""
+        self.catalog_path = catalog_path or Config.PRODUCT_CATALOG_PATH
+
+        self._lock = threading.Lock()
+        self._docs: Dict[str, Dict[str, Any]] = {}  # doc id -> product
+        self._doc_hashes: Dict[str, str] = {}
+        self._doc_terms: Dict[str, Dict[str, int]] = {}  # doc id -> weighted term frequencies
+        self._doc_lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)  # term -> {doc id: tf}
+        self._total_length = 0
+
+        self._loaded_mtime = None
+        self._last_check = 0.0
+
+        self.hits = 0
+        self.misses = 0
+
+        self.reload_if_changed(force=True)
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """Lowercase alphanumeric tokens without stopwords"""
+        return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in cls.STOPWORDS]
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Re-index products whose entries changed on disk; checks at most once per reload interval"""
+        now = time.time()
+        if not force and now - self._last_check < Config.PRODUCT_CATALOG_RELOAD_INTERVAL_SECONDS:
+            return False
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.catalog_path)
+        except OSError:
+            return False
+
+        if mtime == self._loaded_mtime:
+            return False
+
+        try:
+            with open(self.catalog_path, 'r') as f:
+                products = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading product catalog: {str(e)}")
+            return False
+
+        with self._lock:
+            self._apply_changes(products)
+            self._loaded_mtime = mtime
+
+        print(f"Product catalog loaded: {len(self._docs)} products")
+        return True
+
+    def _apply_changes(self, products: List[Dict[str, Any]]) -> None:
+        """Index only added or modified products and drop removed ones; caller must hold the lock"""
+        incoming = {}
+        for product in products:
+            if not product.get('url'):
+                continue
+            doc_id = product.get('id') or product['url']
+            incoming[doc_id] = product
+
+        for doc_id in list(self._docs):
+            if doc_id not in incoming:
+                self._unindex(doc_id)
+
+        for doc_id, product in incoming.items():
+            doc_hash = hashlib.sha256(json.dumps(product, sort_keys=True).encode('utf-8')).hexdigest()
+            if self._doc_hashes.get(doc_id) == doc_hash:
+                continue
+            if doc_id in self._docs:
+                self._unindex(doc_id)
+            self._index(doc_id, product, doc_hash)
+
+    def _index(self, doc_id: str, product: Dict[str, Any], doc_hash: str) -> None:
+        terms = defaultdict(int)
+        for field, weight in self.FIELD_WEIGHTS.items():
+            for token in self.tokenize(str(product.get(field, ''))):
+                terms[token] += weight
+
+        self._docs[doc_id] = product
+        self._doc_hashes[doc_id] = doc_hash
+        self._doc_terms[doc_id] = dict(terms)
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for token, tf in terms.items():
+            self._postings[token][doc_id] = tf
+
+    def _unindex(self, doc_id: str) -> None:
+        for token in self._doc_terms.pop(doc_id, {}):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+        self._docs.pop(doc_id, None)
+        self._doc_hashes.pop(doc_id, None)
+
+    def search(self, query: str, limit: Optional[int] = 2) -> List[Tuple[float, float, Dict[str, Any]]]:
+        """
+        Rank catalog products for a query
+
+        Args:
+            query: Free-text search query
+            limit: Maximum number of products to return (None for every product that matches a token)
+
+        Returns:
+            List of (bm25 score, confidence, product), best first. Confidence is the
+            fraction of distinct query tokens that the product matches.
+        """
+        self.reload_if_changed()
+
+        query_tokens = list(dict.fromkeys(self.tokenize(query)))
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            doc_count = len(self._docs)
+            if doc_count == 0:
+                return []
+            average_length = self._total_length / doc_count
+
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for token in query_tokens:
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length_norm = 1 - self.BM25_B + self.BM25_B * self._doc_lengths[doc_id] / average_length
+                    scores[doc_id] += idf * tf * (self.BM25_K1 + 1) / (tf + self.BM25_K1 * length_norm)
+                    matched[doc_id] += 1
+
+            ranked = sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+            if limit is not None:
+                ranked = ranked[:limit]
+            return [
+                (scores[doc_id], matched[doc_id] / len(query_tokens), self._docs[doc_id])
+                for doc_id in ranked
+            ]
+
+    def field_confidence(self, shoe: Dict[str, str], product: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Share of each shoe field's tokens found in the matching product fields
+
+        A field the shoe leaves empty scores 0, since the product cannot be confirmed on it.
+        """
+        confidence = {}
+        for field, product_fields in self.MATCH_FIELDS.items():
+            shoe_tokens = set(self.tokenize(str(shoe.get(field) or '')))
+            product_tokens = {
+                token for product_field in product_fields
+                for token in self.tokenize(str(product.get(product_field) or ''))
+            }
+            confidence[field] = len(shoe_tokens & product_tokens) / len(shoe_tokens) if shoe_tokens else 0.0
+        return confidence
+
+    def is_confident(self, shoe: Dict[str, str], product: Dict[str, Any],
+                     min_confidence: Optional[float] = None) -> bool:
+        """Whether a product is the recommended shoe: same brand and color, and the model name matches"""
+        if min_confidence is None:
+            min_confidence = Config.PRODUCT_CATALOG_MIN_CONFIDENCE
+
+        confidence = self.field_confidence(shoe, product)
+        return confidence['brand'] == 1.0 and confidence['color'] == 1.0 and confidence['name'] >= min_confidence
+
+    def confident_matches(self, shoe: Dict[str, str], limit: int = 2,
+                          min_confidence: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Return catalog products that are the recommended shoe, best ranked first
+
+        Args:
+            shoe: Recommendation with brand, name, color and style
+            limit: Maximum number of products to return
+            min_confidence: Share of the shoe's model name tokens a product must match
+
+        Returns:
+            Confident products; empty when the catalog cannot answer and Exa should be asked
+        """
+        query = " ".join(str(shoe.get(field) or '') for field in ('brand', 'name', 'color', 'style'))
+
+        # Every ranked candidate is checked before cutting to the limit, so a well-scored
+        # product of the wrong model or color cannot crowd out the right one
+        matches = []
+        for _, _, product in self.search(query, limit=None):
+            if self.is_confident(shoe, product, min_confidence):
+                matches.append(product)
+                if len(matches) >= limit:
+                    break
+
+        if matches:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return matches
+
+    def stats(self) -> Dict[str, Any]:
+        """Return catalog size and answer counters"""
+        lookups = self.hits + self.misses
+        return {
+            "products": len(self._docs),
+            "terms": len(self._postings),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
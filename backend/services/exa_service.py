@@ -1,7 +1,14 @@
 import os
+import time
+import threading
+import concurrent.futures
 from typing import List, Dict, Any, Optional
-from exa_py import Exa
 from config import Config
+from utils import MemoryCache
+from services.catalog_service import ProductCatalog
+from services.singleflight import SingleFlight
+from services.metrics import metrics
+from services.resilience import resilience
 
 class ExaService:
     """Service class for Exa web search operations"""
@@ -10,52 +17,160 @@ class ExaService:
         """Initialize Exa service with API key"""
         self.api_key = Config.EXA_API_KEY
         if self.api_key:
+            from exa_py import Exa
             self.exa = Exa(self.api_key)
         else:
             self.exa = None
+        
+        # Local catalog answers well-known products without a network hop
+        self.catalog = ProductCatalog(Config.PRODUCT_CATALOG_PATH)
+        
+        # Long-lived pool for concurrent per-shoe searches and background refreshes
+        self.search_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=Config.EXA_SEARCH_MAX_WORKERS,
+            thread_name_prefix="exa-search"
+        )
+        
+        # Normalized query -> {"results", "fetched_at"}; entries outlive their freshness
+        # by the stale window so they can be served while a refresh runs
+        self.search_cache = MemoryCache(
+            max_entries=Config.EXA_SEARCH_CACHE_MAX_ENTRIES,
+            ttl=Config.EXA_SEARCH_CACHE_TTL + Config.EXA_SEARCH_CACHE_STALE_TTL
+        )
+        # Identical concurrent searches share one Exa request
+        self.inflight = SingleFlight("exa")
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self.stale_served = 0
+        self.refreshes = 0
+    
+    def _normalize_query(self, query: str) -> str:
+        """Normalize a query so equivalent spellings share a cache entry"""
+        return " ".join(query.lower().split())
     
-    def search_products(self, query: str, limit: int = 2) -> List[Dict[str, Any]]:
+    def search_products(self, query: str, limit: int = 2, shoe: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
         """
-        Search for products using Exa web search
+        Search for products using Exa web search, answering from the query cache when possible
         
         Args:
             query: Search query for products
             limit: Number of results to return (default: 2)
+            shoe: Recommendation the query was built from; lets the local catalog answer it
             
         Returns:
             List of search results with URLs and metadata
         """
+        # Confident local catalog matches skip Exa entirely
+        if shoe:
+            with metrics.span('exa.catalog'):
+                catalog_results = self._search_catalog(shoe, query, limit)
+            if catalog_results:
+                return catalog_results
+        
+        if not self.exa:
+            print("Exa API key not configured, using fallback results")
+            return self._get_fallback_results(query)
+        
+        cache_key = f"{limit}:{self._normalize_query(query)}"
+        entry = self.search_cache.get(cache_key)
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if age >= Config.EXA_SEARCH_CACHE_TTL:
+                # Stale: serve it now and refresh in the background
+                self.stale_served += 1
+                self._refresh_in_background(cache_key, query, limit)
+            return self._copy_results(entry["results"], query)
+        
         try:
-            if not self.exa:
-                print("Exa API key not configured, using fallback results")
-                return self._get_fallback_results(query)
-            
-            print(f"Searching for: {query}")
-            
-            # Search using Exa
-            results = self.exa.search(
+            results = self.inflight.do(cache_key, self._fetch_and_cache, cache_key, query, limit)
+            return self._copy_results(results, query)
+        except Exception as e:
+            print(f"Error in Exa search: {str(e)}")
+            return self._get_fallback_results(query)
+    
+    def _search_catalog(self, shoe: Dict[str, str], query: str, limit: int) -> List[Dict[str, Any]]:
+        """Return confident matches from the local product catalog in search result format"""
+        try:
+            products = self.catalog.confident_matches(shoe, limit)
+        except Exception as e:
+            print(f"Error in catalog search: {str(e)}")
+            return []
+        
+        return [
+            {
+                'url': product['url'],
+                'title': product.get('title') or f"{product.get('brand', '')} {product.get('name', '')}".strip(),
+                'description': product.get('description') or 'No description available',
+                'source': self._extract_domain(product['url']),
+                'search_query': query
+            }
+            for product in products
+        ]
+    
+    def _search_exa(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Run one Exa search and convert its results; raises on failure"""
+        print(f"Searching for: {query}")
+        
+        # Search using Exa; while its breaker is open this fails fast and callers serve fallbacks
+        with metrics.span('exa.search'):
+            results = resilience.call(
+                'exa',
+                self.exa.search,
                 query,
                 type="auto",  # Let Exa choose between neural and keyword search
                 num_results=limit
             )
-            
-            # Process results
-            processed_results = []
-            for result in results.results:
-                processed_results.append({
-                    'url': result.url,
-                    'title': result.title,
-                    'description': getattr(result, 'text', '')[:200] + '...' if hasattr(result, 'text') and result.text else 'No description available',
-                    'source': self._extract_domain(result.url),
-                    'search_query': query
-                })
-            
-            print(f"Found {len(processed_results)} results")
-            return processed_results
-                
-        except Exception as e:
-            print(f"Error in Exa search: {str(e)}")
-            return self._get_fallback_results(query)
+        
+        # Process results
+        processed_results = []
+        for result in results.results:
+            processed_results.append({
+                'url': result.url,
+                'title': result.title,
+                'description': getattr(result, 'text', '')[:200] + '...' if hasattr(result, 'text') and result.text else 'No description available',
+                'source': self._extract_domain(result.url),
+                'search_query': query
+            })
+        
+        print(f"Found {len(processed_results)} results")
+        return processed_results
+    
+    def _fetch_and_cache(self, cache_key: str, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Search Exa and store the results; fallback results are never cached"""
+        results = self._search_exa(query, limit)
+        self.search_cache.set(cache_key, {"results": results, "fetched_at": time.time()})
+        return results
+    
+    def _refresh_in_background(self, cache_key: str, query: str, limit: int) -> None:
+        """Schedule at most one background refresh per stale cache entry"""
+        with self._refresh_lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+            self.refreshes += 1
+        
+        def refresh():
+            try:
+                self._fetch_and_cache(cache_key, query, limit)
+            except Exception as e:
+                print(f"Error refreshing Exa search '{query}': {str(e)}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(cache_key)
+        
+        self.search_executor.submit(refresh)
+    
+    def _copy_results(self, results: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+        """Return per-call copies so callers can annotate results without touching the cache"""
+        return [dict(result, search_query=query) for result in results]
+    
+    def search_stats(self) -> Dict[str, Any]:
+        """Return query cache counters"""
+        stats = self.search_cache.stats()
+        stats["stale_served"] = self.stale_served
+        stats["background_refreshes"] = self.refreshes
+        stats["catalog"] = self.catalog.stats()
+        return stats
     
     def _extract_domain(self, url: str) -> str:
         """Extract domain from URL"""
@@ -136,37 +251,17 @@ class ExaService:
         Returns:
             List of search results for each shoe recommendation
         """
-        all_results = []
+        search_queries = [self._build_shoe_query(shoe) for shoe in shoe_recommendations]
         
-        for shoe in shoe_recommendations:
-            # Create search query for this specific shoe
-            brand = shoe.get('brand', '')
-            name = shoe.get('name', '')
-            color = shoe.get('color', '')
-            style = shoe.get('style', '')
-            
-            # Build comprehensive search query
-            query_parts = []
-            if brand:
-                query_parts.append(brand)
-            if name:
-                query_parts.append(name)
-            if color:
-                query_parts.append(color)
-            if style:
-                query_parts.append(style)
-            
-            # Add shopping context
-            query_parts.append("shoes")
-            query_parts.append("buy")
-            query_parts.append("online")
-            
-            search_query = " ".join(query_parts)
-            
-            print(f"Searching for: {search_query}")
-            
-            # Search for this shoe
-            results = self.search_products(search_query, limit=2)
+        # Search for all shoes concurrently on the shared pool
+        futures = [
+            self.search_executor.submit(self.search_products, search_query, 2, shoe)
+            for shoe, search_query in zip(shoe_recommendations, search_queries)
+        ]
+        
+        all_results = []
+        for shoe, search_query, future in zip(shoe_recommendations, search_queries, futures):
+            results = future.result()
             
             # Add shoe info to results
             for result in results:
@@ -177,6 +272,35 @@ class ExaService:
         
         return all_results
     
+    def _build_shoe_query(self, shoe: Dict[str, str]) -> str:
+        """Build the product search query for a single shoe recommendation"""
+        # Create search query for this specific shoe
+        brand = shoe.get('brand', '')
+        name = shoe.get('name', '')
+        color = shoe.get('color', '')
+        style = shoe.get('style', '')
+        
+        # Build comprehensive search query
+        query_parts = []
+        if brand:
+            query_parts.append(brand)
+        if name:
+            query_parts.append(name)
+        if color:
+            query_parts.append(color)
+        if style:
+            query_parts.append(style)
+        
+        # Add shopping context
+        query_parts.append("shoes")
+        query_parts.append("buy")
+        query_parts.append("online")
+        
+        search_query = " ".join(query_parts)
+        
+        print(f"Searching for: {search_query}")
+        return search_query
+    
     def test_connection(self) -> Dict[str, Any]:
         """Test Exa API connection"""
         try:
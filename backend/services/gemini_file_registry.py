@@ -0,0 +1,147 @@
+import io
+import time
+import hashlib
+import threading
+import concurrent.futures
+from typing import Any, Callable, Dict
+
+from config import Config
+from services.resilience import resilience
+
+
+class GeminiFileRegistry:
+    """Reuses files uploaded with genai.upload_file, keyed by the SHA-256 of their bytes"""
+
+    def __init__(self, upload_fn: Callable = None, delete_fn: Callable = None):
+        """Initialize the registry; upload/delete functions default to the genai SDK"""
+        self.upload_fn = upload_fn
+        self.delete_fn = delete_fn
+
+        self._files: Dict[str, Dict[str, Any]] = {}  # hash -> {"file", "expires_at", "last_used"}
+        self._pending: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._cleanup_thread = None
+        self._stop = threading.Event()
+
+        self.hits = 0
+        self.uploads = 0
+        self.coalesced = 0
+        self.deleted = 0
+
+    def get_or_upload(self, data: bytes, mime_type: str = "image/jpeg"):
+        """Return a live uploaded File for these bytes, uploading at most once across threads"""
+        key = hashlib.sha256(data).hexdigest()
+        now = time.time()
+
+        with self._lock:
+            entry = self._files.get(key)
+            if entry and entry["expires_at"] - Config.GEMINI_FILE_EXPIRY_MARGIN_SECONDS > now:
+                entry["last_used"] = now
+                self.hits += 1
+                return entry["file"]
+
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = concurrent.futures.Future()
+                self._pending[key] = pending
+                is_owner = True
+            else:
+                self.coalesced += 1
+                is_owner = False
+
+        # Another thread is already uploading the same bytes; wait for its result
+        if not is_owner:
+            return pending.result()
+
+        try:
+            upload_fn = self.upload_fn
+            if upload_fn is None:
+                import google.generativeai as genai
+                upload_fn = genai.upload_file
+            # A fresh stream per attempt, since a failed attempt may have consumed it
+            uploaded_file = resilience.call('gemini', lambda: upload_fn(io.BytesIO(data), mime_type=mime_type))
+        except Exception as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(e)
+            raise
+
+        with self._lock:
+            self._files[key] = {
+                "file": uploaded_file,
+                "expires_at": self._expiry_of(uploaded_file, now),
+                "last_used": now
+            }
+            del self._pending[key]
+            self.uploads += 1
+
+        pending.set_result(uploaded_file)
+        self._ensure_cleanup_thread()
+        return uploaded_file
+
+    def _expiry_of(self, uploaded_file, uploaded_at: float) -> float:
+        """Read the server-side expiry of a File, falling back to the configured lifetime"""
+        expiration_time = getattr(uploaded_file, "expiration_time", None)
+        try:
+            return expiration_time.timestamp()
+        except (AttributeError, TypeError, ValueError, OverflowError):
+            return uploaded_at + Config.GEMINI_FILE_DEFAULT_TTL_SECONDS
+
+    def _ensure_cleanup_thread(self) -> None:
+        """Start the background cleanup thread on first use"""
+        with self._lock:
+            if self._cleanup_thread is not None:
+                return
+            self._cleanup_thread = threading.Thread(
+                target=self._cleanup_loop, name="gemini-file-cleanup", daemon=True
+            )
+            self._cleanup_thread.start()
+
+    def _cleanup_loop(self) -> None:
+        while not self._stop.wait(Config.GEMINI_FILE_CLEANUP_INTERVAL_SECONDS):
+            self.cleanup()
+
+    def cleanup(self) -> int:
+        """Forget expired files and delete idle ones from the server; returns the number removed"""
+        now = time.time()
+        idle_cutoff = now - Config.GEMINI_FILE_IDLE_SECONDS
+
+        with self._lock:
+            expired = [
+                key for key, entry in self._files.items()
+                if entry["expires_at"] - Config.GEMINI_FILE_EXPIRY_MARGIN_SECONDS <= now
+                or entry["last_used"] < idle_cutoff
+            ]
+            removed = [self._files.pop(key) for key in expired]
+
+        for entry in removed:
+            # Files past their expiry are already gone server-side
+            if entry["expires_at"] <= now:
+                continue
+            try:
+                delete_fn = self.delete_fn
+                if delete_fn is None:
+                    import google.generativeai as genai
+                    delete_fn = genai.delete_file
+                delete_fn(entry["file"].name)
+                self.deleted += 1
+            except Exception as e:
+                print(f"Error deleting Gemini file {getattr(entry['file'], 'name', '')}: {str(e)}")
+
+        return len(removed)
+
+    def stop(self) -> None:
+        """Stop the background cleanup thread"""
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return reuse counters and the number of live files"""
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "in_flight_uploads": len(self._pending),
+                "hits": self.hits,
+                "uploads": self.uploads,
+                "coalesced": self.coalesced,
+                "deleted": self.deleted
+            }
@@ -1,22 +1,52 @@
 import os
 import json
-import uuid
+import time
+import io
+import asyncio
+import hashlib
+import threading
 import mimetypes
-from typing import List, Dict, Any
-import google.generativeai as genai
-from google import genai as new_genai
-from google.genai import types
+import concurrent.futures
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont
 
 from config import Config
 from models import DefaultShoes
-from utils import prepare_image_for_processing, clean_temp_file, create_placeholder_image
+from utils import normalize_shoe_description, MemoryCache
+from services.cache_service import TieredCache, ArtifactCache
+from services.gemini_file_registry import GeminiFileRegistry
+from services.singleflight import SingleFlight, AsyncSingleFlight
+from services.storage_service import ArtifactStore, LocalArtifactStore
+from services.ingest_service import ImageIngestService
+from services.metrics import metrics
+from services.resilience import resilience
+from services.image_grid import split_grid
+
+# Panels of a composite try-on in reading order: top-left, top-right, bottom-left, bottom-right
+COMPOSITE_ANGLES = ['front', 'back', 'left', 'right']
+
+composite_outcomes = metrics.counter(
+    'fitcheck_composite_tryon_total', 'Composite try-on generations by outcome (split or fallback)', ['outcome']
+)
 
 class GeminiService:
     """Service class for Google Gemini AI operations"""
     
-    def __init__(self):
-        """Initialize Gemini models"""
+    def __init__(self, generated_store: ArtifactStore = None, image_ingest: ImageIngestService = None,
+                 recommendation_cache: TieredCache = None, tryon_cache: ArtifactCache = None):
+        """
+        Initialize Gemini models
+
+        Args:
+            generated_store: Store that generated images are written to
+            image_ingest: Ingest pipeline whose pre-sized variants are sent to the models
+            recommendation_cache: Cache of recommendations (built from Config when None)
+            tryon_cache: Index of generated try-on images (built from Config when None)
+        """
+        # The SDKs are slow to import, so they load with the service rather than the module
+        import google.generativeai as genai
+        from google import genai as new_genai
+        
         if Config.GOOGLE_API_KEY:
             genai.configure(api_key=Config.GOOGLE_API_KEY)
             # Initialize new GenAI client for image generation
@@ -25,93 +55,236 @@ class GeminiService:
         self.gemini_pro_vision = genai.GenerativeModel(Config.GEMINI_PRO_VISION_MODEL)
         self.gemini_flash = genai.GenerativeModel(Config.GEMINI_FLASH_MODEL)
         self.gemini_pro = genai.GenerativeModel(Config.GEMINI_PRO_MODEL)
+        
+        # Cache of recommendations keyed by normalized image content, model and prompt version
+        self.recommendation_cache = recommendation_cache if recommendation_cache is not None else TieredCache(
+            os.path.join(Config.CACHE_FOLDER, 'recommendations'),
+            ttl=Config.RECOMMENDATION_CACHE_TTL,
+            memory_entries=Config.RECOMMENDATION_CACHE_MEMORY_ENTRIES,
+            disk_entries=Config.RECOMMENDATION_CACHE_DISK_ENTRIES
+        )
+        
+        # Uploaded files are reused across calls until they expire server-side
+        self.file_registry = GeminiFileRegistry()
+        
+        # Process-wide bound on concurrent image generation calls
+        self.image_generation_slots = threading.BoundedSemaphore(Config.GEMINI_IMAGE_GENERATION_CONCURRENCY)
+        # The same bound for the *_async methods, which wait on the event loop instead of a thread
+        self.async_image_generation_slots = asyncio.Semaphore(Config.GEMINI_IMAGE_GENERATION_CONCURRENCY)
+        
+        # Index of generated try-on images keyed by (image, shoe, angle, model)
+        self.tryon_cache = tryon_cache if tryon_cache is not None else ArtifactCache(
+            os.path.join(Config.CACHE_FOLDER, 'tryon_index.sqlite3'),
+            max_entries=Config.TRYON_CACHE_MAX_ENTRIES,
+            max_bytes=Config.TRYON_CACHE_MAX_BYTES
+        )
+        
+        # Model calls of a batch analysis run in parallel, each covering several images
+        self.batch_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=Config.BATCH_ANALYSIS_MAX_PARALLEL_CALLS,
+            thread_name_prefix="gemini-batch"
+        )
+        
+        # (image, shoe) pairs whose composite could not be split; they use per-angle calls until expiry
+        self.failed_composites = MemoryCache(max_entries=1024, ttl=Config.COMPOSITE_FAILURE_TTL_SECONDS)
+        
+        # Identical concurrent calls (same cache key) share one model call
+        self.inflight = SingleFlight("gemini")
+        self.async_inflight = AsyncSingleFlight("gemini-async")
+        
+        self.generated_store = generated_store or LocalArtifactStore(Config.GENERATED_FOLDER)
+        self.image_ingest = image_ingest or ImageIngestService(LocalArtifactStore(Config.UPLOAD_FOLDER))
+    
+    def _recommendation_cache_key(self, image_path: str) -> str:
+        """Build the recommendation cache key from image content, model and prompt version"""
+        image_hash = self.image_ingest.image_hash(image_path, Config.MAX_IMAGE_SIZE)
+        raw_key = f"{image_hash}:{Config.GEMINI_PRO_VISION_MODEL}:{Config.RECOMMENDATION_PROMPT_VERSION}"
+        return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+    
+    def _tryon_cache_key(self, original_image_path: str, shoe_description: str, angle: str) -> str:
+        """Build the try-on cache key from image content, shoe, angle and model"""
+        image_hash = self.image_ingest.image_hash(original_image_path, Config.VIZ_MAX_IMAGE_SIZE)
+        shoe_key = normalize_shoe_description(shoe_description)
+        raw_key = f"{image_hash}:{shoe_key}:{angle.lower()}:{Config.GEMINI_IMAGE_GENERATION_MODEL}"
+        return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
     
     def analyze_outfit_and_recommend_shoes(self, image_path: str) -> List[Dict[str, str]]:
         """Use Gemini 2.5 Pro to analyze outfit and recommend shoes using function calling"""
         
         try:
-            # Prepare image for processing
-            temp_path = prepare_image_for_processing(image_path)
+            cache_key = self._recommendation_cache_key(image_path)
+        except Exception as e:
+            print(f"Error in shoe recommendation: {str(e)}")
+            return DefaultShoes.FALLBACK_SHOES
+        
+        # Concurrent uploads of the same photo share one model call
+        shoes = self.inflight.do(f"recommend:{cache_key}", self._analyze_outfit, image_path, cache_key)
+        return [dict(shoe) for shoe in shoes]
+    
+    def _analyze_outfit(self, image_path: str, cache_key: str) -> List[Dict[str, str]]:
+        """Answer a recommendation from the cache or the model"""
+        
+        try:
+            # Repeat uploads of the same photo are answered from the cache
+            cached_shoes = self.recommendation_cache.get(cache_key)
+            if cached_shoes:
+                print(f"Recommendation cache hit for {image_path}")
+                return cached_shoes
+            
+            # Prepare image for processing (decoded once, then served from memory)
+            with metrics.span('gemini.prepare_image'):
+                image_data = self.image_ingest.prepared_bytes(image_path, Config.MAX_IMAGE_SIZE)
             
             # Upload image to Gemini
-            uploaded_file = genai.upload_file(temp_path)
-            
-            # Define the function for shoe recommendations
-            recommend_shoes_func = genai.protos.FunctionDeclaration(
-                name="recommend_shoes",
-                description="Recommend shoes based on the outfit in the image",
-                parameters=genai.protos.Schema(
-                    type=genai.protos.Type.OBJECT,
-                    properties={
-                        "recommendations": genai.protos.Schema(
-                            type=genai.protos.Type.ARRAY,
-                            items=genai.protos.Schema(
-                                type=genai.protos.Type.OBJECT,
-                                properties={
-                                    "name": genai.protos.Schema(
-                                        type=genai.protos.Type.STRING,
-                                        description="The shoe model name"
-                                    ),
-                                    "brand": genai.protos.Schema(
-                                        type=genai.protos.Type.STRING,
-                                        description="The brand name"
-                                    ),
-                                    "color": genai.protos.Schema(
-                                        type=genai.protos.Type.STRING,
-                                        description="The primary color(s)"
-                                    ),
-                                    "style": genai.protos.Schema(
-                                        type=genai.protos.Type.STRING,
-                                        description="The type of shoe"
-                                    ),
-                                    "reason": genai.protos.Schema(
-                                        type=genai.protos.Type.STRING,
-                                        description="Why this shoe works with the outfit"
-                                    )
-                                },
-                                required=["name", "brand", "color", "style", "reason"]
-                            )
-                        )
-                    },
-                    required=["recommendations"]
-                )
-            )
+            with metrics.span('gemini.upload_file'):
+                uploaded_file = self.file_registry.get_or_upload(image_data, mime_type="image/jpeg")
             
-            # Create the prompt for Gemini
-            prompt = """You are a fashion expert AI assistant. Analyze the outfit in this image and recommend exactly 2 shoes that would perfectly complement the style.
-
-            Consider:
-            - The outfit's style, colors, and formality level
-            - Current fashion trends
-            - Versatility and practicality
-            - The overall aesthetic and vibe
-
-            Return exactly 2 shoe recommendations that would work well with this outfit. Use the recommend_shoes function to provide your recommendations."""
+            recommend_shoes_func, prompt = self._recommendation_request()
             
             # Generate response with function calling
-            response = self.gemini_pro_vision.generate_content(
-                [uploaded_file, prompt],
-                tools=[recommend_shoes_func],
-                tool_config={"function_calling_config": {"mode": "AUTO"}}
-            )
+            with metrics.span('gemini.recommend'):
+                response = resilience.call(
+                    'gemini',
+                    self.gemini_pro_vision.generate_content,
+                    [uploaded_file, prompt],
+                    tools=[recommend_shoes_func],
+                    tool_config={"function_calling_config": {"mode": "AUTO"}}
+                )
+            
+            return self._finish_recommendation(response, cache_key)
+            
+        except Exception as e:
+            print(f"Error in shoe recommendation: {str(e)}")
+            # Return default recommendations on error
+            return DefaultShoes.FALLBACK_SHOES
+    
+    async def analyze_outfit_and_recommend_shoes_async(self, image_path: str) -> List[Dict[str, str]]:
+        """Async variant of analyze_outfit_and_recommend_shoes for the ASGI server"""
+        
+        try:
+            cache_key = self._recommendation_cache_key(image_path)
+        except Exception as e:
+            print(f"Error in shoe recommendation: {str(e)}")
+            return DefaultShoes.FALLBACK_SHOES
+        
+        shoes = await self.async_inflight.do(
+            f"recommend:{cache_key}",
+            lambda: self._analyze_outfit_async(image_path, cache_key)
+        )
+        return [dict(shoe) for shoe in shoes]
+    
+    async def _analyze_outfit_async(self, image_path: str, cache_key: str) -> List[Dict[str, str]]:
+        """Answer a recommendation from the cache or the model without blocking the event loop"""
+        
+        try:
+            cached_shoes = self.recommendation_cache.get(cache_key)
+            if cached_shoes:
+                print(f"Recommendation cache hit for {image_path}")
+                return cached_shoes
+            
+            with metrics.span('gemini.prepare_image'):
+                image_data = self.image_ingest.prepared_bytes(image_path, Config.MAX_IMAGE_SIZE)
             
-            # Extract recommendations from the function call response
-            shoes = self._extract_shoe_recommendations(response)
+            # The files API has no async client; uploads are rare because files are reused until expiry
+            with metrics.span('gemini.upload_file'):
+                uploaded_file = await asyncio.to_thread(self.file_registry.get_or_upload, image_data, "image/jpeg")
             
-            # Clean up temp file
-            clean_temp_file(temp_path)
+            recommend_shoes_func, prompt = self._recommendation_request()
             
-            # Ensure we have exactly 2 recommendations
-            from utils import ensure_shoe_count
-            shoes = ensure_shoe_count(shoes, 2)
+            with metrics.span('gemini.recommend'):
+                response = await resilience.call_async('gemini', lambda: self.gemini_pro_vision.generate_content_async(
+                    [uploaded_file, prompt],
+                    tools=[recommend_shoes_func],
+                    tool_config={"function_calling_config": {"mode": "AUTO"}}
+                ))
             
-            return shoes
+            return self._finish_recommendation(response, cache_key)
             
         except Exception as e:
             print(f"Error in shoe recommendation: {str(e)}")
-            # Return default recommendations on error
             return DefaultShoes.FALLBACK_SHOES
     
+    def _recommendation_request(self):
+        """Return the recommend_shoes function declaration and the prompt sent with the image"""
+        import google.generativeai as genai
+        
+        # Define the function for shoe recommendations
+        recommend_shoes_func = genai.protos.FunctionDeclaration(
+            name="recommend_shoes",
+            description="Recommend shoes based on the outfit in the image",
+            parameters=genai.protos.Schema(
+                type=genai.protos.Type.OBJECT,
+                properties={
+                    "recommendations": self._shoe_list_schema(genai)
+                },
+                required=["recommendations"]
+            )
+        )
+        
+        # Create the prompt for Gemini
+        prompt = """You are a fashion expert AI assistant. Analyze the outfit in this image and recommend exactly 2 shoes that would perfectly complement the style.
+
+            Consider:
+            - The outfit's style, colors, and formality level
+            - Current fashion trends
+            - Versatility and practicality
+            - The overall aesthetic and vibe
+
+            Return exactly 2 shoe recommendations that would work well with this outfit. Use the recommend_shoes function to provide your recommendations."""
+        
+        return recommend_shoes_func, prompt
+    
+    def _shoe_list_schema(self, genai):
+        """Schema of a list of recommended shoes, shared by the single and batch declarations"""
+        return genai.protos.Schema(
+            type=genai.protos.Type.ARRAY,
+            items=genai.protos.Schema(
+                type=genai.protos.Type.OBJECT,
+                properties={
+                    "name": genai.protos.Schema(
+                        type=genai.protos.Type.STRING,
+                        description="The shoe model name"
+                    ),
+                    "brand": genai.protos.Schema(
+                        type=genai.protos.Type.STRING,
+                        description="The brand name"
+                    ),
+                    "color": genai.protos.Schema(
+                        type=genai.protos.Type.STRING,
+                        description="The primary color(s)"
+                    ),
+                    "style": genai.protos.Schema(
+                        type=genai.protos.Type.STRING,
+                        description="The type of shoe"
+                    ),
+                    "reason": genai.protos.Schema(
+                        type=genai.protos.Type.STRING,
+                        description="Why this shoe works with the outfit"
+                    )
+                },
+                required=["name", "brand", "color", "style", "reason"]
+            )
+        )
+    
+    def _finish_recommendation(self, response, cache_key: str) -> List[Dict[str, str]]:
+        """Turn a model response into exactly 2 shoes, caching genuine model answers"""
+        # Extract recommendations from the function call response
+        return self._finish_shoes(self._extract_shoe_recommendations(response), cache_key)
+    
+    def _finish_shoes(self, shoes: List[Dict[str, str]], cache_key: str) -> List[Dict[str, str]]:
+        """Pad or trim model shoes to exactly 2, caching genuine model answers"""
+        # Only genuine model answers are cached, never padded or fallback shoes
+        model_answered = len(shoes) >= 2
+        
+        # Ensure we have exactly 2 recommendations
+        from utils import ensure_shoe_count
+        shoes = ensure_shoe_count(shoes, 2)
+        
+        if model_answered:
+            self.recommendation_cache.set(cache_key, shoes)
+        
+        return shoes
+    
     def _extract_shoe_recommendations(self, response) -> List[Dict[str, str]]:
         """Extract shoe recommendations from Gemini response"""
         shoes = []
@@ -145,15 +318,166 @@ class GeminiService:
         
         return shoes
     
+    def analyze_outfits_batch(self, image_paths: List[str]) -> Iterator[Tuple[str, List[Dict[str, str]], str]]:
+        """
+        Recommend shoes for several outfit photos with as few model calls as possible
+        
+        Cached images are answered first; the rest are packed up to Config.BATCH_ANALYSIS_IMAGES_PER_CALL
+        per model call, and the calls run in parallel. Images a batch call did not answer fall back
+        to the single-image call.
+        
+        Args:
+            image_paths: Paths of ingested uploads
+            
+        Yields:
+            (image_path, shoes, source) as results become available; source is cache, batch, single or fallback
+        """
+        # Identical photos (same cache key) are analyzed once
+        pending: Dict[str, List[str]] = {}
+        for image_path in dict.fromkeys(image_paths):
+            try:
+                cache_key = self._recommendation_cache_key(image_path)
+            except Exception as e:
+                print(f"Error in shoe recommendation: {str(e)}")
+                yield image_path, [dict(shoe) for shoe in DefaultShoes.FALLBACK_SHOES], 'fallback'
+                continue
+            
+            cached_shoes = self.recommendation_cache.get(cache_key)
+            if cached_shoes:
+                yield image_path, [dict(shoe) for shoe in cached_shoes], 'cache'
+                continue
+            pending.setdefault(cache_key, []).append(image_path)
+        
+        keys = list(pending)
+        size = max(1, Config.BATCH_ANALYSIS_IMAGES_PER_CALL)
+        futures = [
+            self.batch_executor.submit(self._analyze_outfit_group, [(key, pending[key][0]) for key in keys[i:i + size]])
+            for i in range(0, len(keys), size)
+        ]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                for cache_key, shoes, source in future.result():
+                    for image_path in pending[cache_key]:
+                        yield image_path, [dict(shoe) for shoe in shoes], source
+        finally:
+            # Drop queued groups if the caller stopped early (e.g. a streaming client went away)
+            for future in futures:
+                future.cancel()
+    
+    def _analyze_outfit_group(self, items: List[Tuple[str, str]]) -> List[Tuple[str, List[Dict[str, str]], str]]:
+        """Answer (cache_key, image_path) items with one model call, falling back to single calls per image"""
+        answered = {}
+        if len(items) > 1:
+            try:
+                answered = self._recommend_group(items)
+            except Exception as e:
+                print(f"Error in batch shoe recommendation: {str(e)}")
+        
+        results = []
+        for cache_key, image_path in items:
+            if cache_key in answered:
+                results.append((cache_key, answered[cache_key], 'batch'))
+            else:
+                shoes = self.inflight.do(f"recommend:{cache_key}", self._analyze_outfit, image_path, cache_key)
+                results.append((cache_key, shoes, 'single'))
+        return results
+    
+    def _recommend_group(self, items: List[Tuple[str, str]]) -> Dict[str, List[Dict[str, str]]]:
+        """One model call for several images; returns shoes for the images the model answered"""
+        contents = []
+        for number, (cache_key, image_path) in enumerate(items, 1):
+            with metrics.span('gemini.prepare_image'):
+                image_data = self.image_ingest.prepared_bytes(image_path, Config.MAX_IMAGE_SIZE)
+            with metrics.span('gemini.upload_file'):
+                uploaded_file = self.file_registry.get_or_upload(image_data, mime_type="image/jpeg")
+            contents.extend([f"Image {number}:", uploaded_file])
+        
+        recommend_batch_func, prompt = self._batch_recommendation_request(len(items))
+        contents.append(prompt)
+        
+        with metrics.span('gemini.recommend_batch'):
+            response = resilience.call(
+                'gemini',
+                self.gemini_pro_vision.generate_content,
+                contents,
+                tools=[recommend_batch_func],
+                tool_config={"function_calling_config": {"mode": "AUTO"}}
+            )
+        
+        shoes_by_number = self._extract_batch_recommendations(response)
+        answered = {}
+        for number, (cache_key, image_path) in enumerate(items, 1):
+            shoes = shoes_by_number.get(number, [])
+            if len(shoes) >= 2:
+                answered[cache_key] = self._finish_shoes(shoes, cache_key)
+        return answered
+    
+    def _batch_recommendation_request(self, image_count: int):
+        """Return the recommend_shoes_batch function declaration and the prompt sent with numbered images"""
+        import google.generativeai as genai
+        
+        recommend_batch_func = genai.protos.FunctionDeclaration(
+            name="recommend_shoes_batch",
+            description="Recommend shoes for each numbered outfit image",
+            parameters=genai.protos.Schema(
+                type=genai.protos.Type.OBJECT,
+                properties={
+                    "results": genai.protos.Schema(
+                        type=genai.protos.Type.ARRAY,
+                        items=genai.protos.Schema(
+                            type=genai.protos.Type.OBJECT,
+                            properties={
+                                "image_number": genai.protos.Schema(
+                                    type=genai.protos.Type.INTEGER,
+                                    description="The number of the image these shoes are for"
+                                ),
+                                "recommendations": self._shoe_list_schema(genai)
+                            },
+                            required=["image_number", "recommendations"]
+                        )
+                    )
+                },
+                required=["results"]
+            )
+        )
+        
+        prompt = f"""You are a fashion expert AI assistant. You are given {image_count} numbered outfit images. Analyze each outfit separately and recommend exactly 2 shoes for each image that would perfectly complement its style.
+
+            Consider, for each image:
+            - The outfit's style, colors, and formality level
+            - Current fashion trends
+            - Versatility and practicality
+            - The overall aesthetic and vibe
+
+            Use the recommend_shoes_batch function once, with one entry per image (image_number 1 to {image_count}), each with exactly 2 shoe recommendations."""
+        
+        return recommend_batch_func, prompt
+    
+    def _extract_batch_recommendations(self, response) -> Dict[int, List[Dict[str, str]]]:
+        """Extract per-image shoe lists from a recommend_shoes_batch function call"""
+        shoes_by_number = {}
+        if response.candidates and response.candidates[0].content.parts:
+            for part in response.candidates[0].content.parts:
+                if part.function_call and "results" in part.function_call.args:
+                    for result in part.function_call.args["results"]:
+                        try:
+                            number = int(result["image_number"])
+                            shoes_by_number[number] = [dict(rec) for rec in result["recommendations"]]
+                        except (KeyError, TypeError, ValueError):
+                            continue
+        return shoes_by_number
+    
     def generate_outfit_visualization(self, original_image_path: str, shoe_description: str, angle: str) -> str:
         """Generate visualization of person wearing the recommended shoes using Gemini 2.5 Flash"""
         
         try:
             # Prepare image for processing
-            temp_path = prepare_image_for_processing(original_image_path, Config.VIZ_MAX_IMAGE_SIZE)
+            with metrics.span('gemini.prepare_image'):
+                image_data = self.image_ingest.prepared_bytes(original_image_path, Config.VIZ_MAX_IMAGE_SIZE)
             
             # Upload image to Gemini
-            uploaded_file = genai.upload_file(temp_path)
+            with metrics.span('gemini.upload_file'):
+                uploaded_file = self.file_registry.get_or_upload(image_data, mime_type="image/jpeg")
             
             # Create prompt for image generation/editing
             prompt = f"""Based on this image of a person, I need you to describe in detail how they would look wearing {shoe_description} from a {angle} view angle.
@@ -167,10 +491,8 @@ class GeminiService:
             Be specific about colors, styles, and visual details."""
             
             # Generate description using Gemini Flash
-            response = self.gemini_flash.generate_content([uploaded_file, prompt])
-            
-            # Clean up temp file
-            clean_temp_file(temp_path)
+            with metrics.span('gemini.describe'):
+                response = resilience.call('gemini', self.gemini_flash.generate_content, [uploaded_file, prompt])
             
             # Create visualization image
             return self._create_visualization_image(shoe_description, angle, response.text)
@@ -182,20 +504,108 @@ class GeminiService:
     def generate_outfit_image_with_shoes(self, original_image_path: str, shoe_description: str, angle: str) -> str:
         """Generate actual image of person wearing the recommended shoes using Gemini 2.5 Flash Image Preview"""
         
+        try:
+            cache_key = self._tryon_cache_key(original_image_path, shoe_description, angle)
+        except Exception as e:
+            print(f"Error generating outfit image: {str(e)}")
+            return self._create_error_visualization()
+        
+        # Concurrent requests for the same (image, shoe, angle) share one generation
+        return self.inflight.do(
+            f"tryon:{cache_key}",
+            self._generate_outfit_image_with_shoes,
+            original_image_path, shoe_description, angle, cache_key
+        )
+    
+    def _generate_outfit_image_with_shoes(self, original_image_path: str, shoe_description: str, angle: str, cache_key: str) -> str:
+        """Answer a try-on image from the cache or the image generation model"""
+        
         try:
             print(f"Starting image generation for: {shoe_description} - {angle} angle")
             print(f"Original image path: {original_image_path}")
             
-            # Prepare image for processing
-            temp_path = prepare_image_for_processing(original_image_path, Config.VIZ_MAX_IMAGE_SIZE)
-            print(f"Prepared temp image path: {temp_path}")
+            # Reuse a previously generated image for the same (image, shoe, angle)
+            cached_path = self.tryon_cache.get(cache_key)
+            if cached_path:
+                print(f"Try-on cache hit: {cached_path}")
+                return cached_path
+            
+            # Composite mode: one call renders all four angles of the shoe
+            if self._composite_eligible(angle):
+                composite_path = self._composite_angle(original_image_path, shoe_description, angle)
+                if composite_path:
+                    return composite_path
+            
+            # Prepare image for processing; repeated angles and shoes reuse the same bytes
+            with metrics.span('gemini.prepare_image'):
+                image_data = self.image_ingest.prepared_bytes(original_image_path, Config.VIZ_MAX_IMAGE_SIZE)
+            print(f"Prepared image size: {len(image_data)} bytes")
+            
+            contents, generate_content_config = self._tryon_request(image_data, shoe_description, angle)
+            
+            # Generate the image, retrying transient failures behind the image generation breaker
+            generated_image_path = resilience.call(
+                'gemini_image', self._generate_image_in_slot, contents, generate_content_config, angle
+            )
+            
+            return self._finish_tryon(cache_key, generated_image_path, shoe_description, angle)
+            
+        except Exception as e:
+            print(f"Error generating outfit image: {str(e)}")
+            return self._create_error_visualization()
+    
+    async def generate_outfit_image_with_shoes_async(self, original_image_path: str, shoe_description: str, angle: str) -> str:
+        """Async variant of generate_outfit_image_with_shoes; the generation is awaited, not run on a thread"""
+        
+        try:
+            cache_key = self._tryon_cache_key(original_image_path, shoe_description, angle)
+        except Exception as e:
+            print(f"Error generating outfit image: {str(e)}")
+            return self._create_error_visualization()
+        
+        return await self.async_inflight.do(
+            f"tryon:{cache_key}",
+            lambda: self._generate_outfit_image_with_shoes_async(original_image_path, shoe_description, angle, cache_key)
+        )
+    
+    async def _generate_outfit_image_with_shoes_async(self, original_image_path: str, shoe_description: str, angle: str, cache_key: str) -> str:
+        """Answer a try-on image from the cache or the async image generation client"""
+        
+        try:
+            print(f"Starting image generation for: {shoe_description} - {angle} angle")
+            
+            # The index is a SQLite file; its reads and writes stay off the event loop
+            cached_path = await asyncio.to_thread(self.tryon_cache.get, cache_key)
+            if cached_path:
+                print(f"Try-on cache hit: {cached_path}")
+                return cached_path
+            
+            if self._composite_eligible(angle):
+                composite_path = await self._composite_angle_async(original_image_path, shoe_description, angle)
+                if composite_path:
+                    return composite_path
+            
+            with metrics.span('gemini.prepare_image'):
+                image_data = self.image_ingest.prepared_bytes(original_image_path, Config.VIZ_MAX_IMAGE_SIZE)
             
-            # Read and encode the original image
-            with open(temp_path, 'rb') as image_file:
-                image_data = image_file.read()
+            contents, generate_content_config = self._tryon_request(image_data, shoe_description, angle)
             
-            # Create prompt for image generation
-            prompt = f"""Generate a realistic image of this person wearing {shoe_description} from a {angle} view angle. 
+            generated_image_path = await resilience.call_async(
+                'gemini_image', lambda: self._generate_image_in_slot_async(contents, generate_content_config)
+            )
+            
+            return await asyncio.to_thread(self._finish_tryon, cache_key, generated_image_path, shoe_description, angle)
+            
+        except Exception as e:
+            print(f"Error generating outfit image: {str(e)}")
+            return self._create_error_visualization()
+    
+    def _tryon_request(self, image_data: bytes, shoe_description: str, angle: str):
+        """Build the contents and config of an image generation call for one (shoe, angle)"""
+        from google.genai import types
+        
+        # Create prompt for image generation
+        prompt = f"""Generate a realistic image of this person wearing {shoe_description} from a {angle} view angle. 
             
             Requirements:
             - Show the person wearing the exact shoes described: {shoe_description}
@@ -206,80 +616,272 @@ class GeminiService:
             - Focus on the {angle} angle view as requested
             
             Make sure the shoes complement the outfit perfectly and the overall look is cohesive."""
+        
+        # Create content with the image and prompt
+        contents = [
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part.from_bytes(
+                        data=image_data,
+                        mime_type="image/jpeg"
+                    ),
+                    types.Part.from_text(text=prompt),
+                ],
+            ),
+        ]
+        
+        # Configure for image generation
+        generate_content_config = types.GenerateContentConfig(
+            response_modalities=["IMAGE", "TEXT"],
+        )
+        
+        return contents, generate_content_config
+    
+    def _composite_eligible(self, angle: str) -> bool:
+        return Config.GEMINI_COMPOSITE_ANGLES_ENABLED and angle.lower() in COMPOSITE_ANGLES
+    
+    def _composite_tile_keys(self, original_image_path: str, shoe_description: str) -> Dict[str, str]:
+        """Try-on cache keys of the composite tiles; kept apart from full-size per-angle images"""
+        return {
+            angle: self._tryon_cache_key(original_image_path, shoe_description, f"{angle}:composite")
+            for angle in COMPOSITE_ANGLES
+        }
+    
+    def _composite_angle(self, original_image_path: str, shoe_description: str, angle: str) -> Optional[str]:
+        """
+        One angle of a composite try-on; the four angle requests of a shoe share one generation
+        
+        Returns:
+            Path of the angle's tile, or None when the caller should fall back to a per-angle call
+        """
+        composite_key = self._tryon_cache_key(original_image_path, shoe_description, 'composite')
+        if self.failed_composites.get(composite_key):
+            return None
+        
+        tile_paths = self.inflight.do(
+            f"composite:{composite_key}",
+            self._generate_composite,
+            original_image_path, shoe_description, composite_key
+        )
+        return tile_paths.get(angle.lower()) if tile_paths else None
+    
+    def _generate_composite(self, original_image_path: str, shoe_description: str, composite_key: str) -> Optional[Dict[str, str]]:
+        """Answer all four angle tiles from the cache or one composite generation; None on failure"""
+        tile_keys = self._composite_tile_keys(original_image_path, shoe_description)
+        cached = {angle: self.tryon_cache.get(key) for angle, key in tile_keys.items()}
+        if all(cached.values()):
+            print(f"Composite try-on cache hit: {shoe_description}")
+            return cached
+        
+        try:
+            with metrics.span('gemini.prepare_image'):
+                image_data = self.image_ingest.prepared_bytes(original_image_path, Config.VIZ_MAX_IMAGE_SIZE)
             
-            # Create content with the image and prompt
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_bytes(
-                            data=image_data,
-                            mime_type="image/jpeg"
-                        ),
-                        types.Part.from_text(text=prompt),
-                    ],
-                ),
-            ]
+            contents, generate_content_config = self._composite_request(image_data, shoe_description)
+            composite_path = resilience.call(
+                'gemini_image', self._generate_image_in_slot, contents, generate_content_config, 'composite'
+            )
+            if not composite_path:
+                raise ValueError("no image was generated")
+            
+            with open(composite_path, 'rb') as f:
+                composite_data = f.read()
+            with metrics.span('gemini.split_composite'):
+                tiles = split_grid(composite_data)
+            
+            return self._store_composite_tiles(tiles, tile_keys, shoe_description)
+        except Exception as e:
+            return self._composite_failed(composite_key, e)
+    
+    async def _composite_angle_async(self, original_image_path: str, shoe_description: str, angle: str) -> Optional[str]:
+        """Async variant of _composite_angle"""
+        composite_key = self._tryon_cache_key(original_image_path, shoe_description, 'composite')
+        if self.failed_composites.get(composite_key):
+            return None
+        
+        tile_paths = await self.async_inflight.do(
+            f"composite:{composite_key}",
+            lambda: self._generate_composite_async(original_image_path, shoe_description, composite_key)
+        )
+        return tile_paths.get(angle.lower()) if tile_paths else None
+    
+    async def _generate_composite_async(self, original_image_path: str, shoe_description: str, composite_key: str) -> Optional[Dict[str, str]]:
+        """Async variant of _generate_composite; the split runs on a worker thread"""
+        tile_keys = self._composite_tile_keys(original_image_path, shoe_description)
+        cached = await asyncio.to_thread(lambda: {angle: self.tryon_cache.get(key) for angle, key in tile_keys.items()})
+        if all(cached.values()):
+            print(f"Composite try-on cache hit: {shoe_description}")
+            return cached
+        
+        try:
+            with metrics.span('gemini.prepare_image'):
+                image_data = self.image_ingest.prepared_bytes(original_image_path, Config.VIZ_MAX_IMAGE_SIZE)
             
-            # Configure for image generation
-            generate_content_config = types.GenerateContentConfig(
-                response_modalities=["IMAGE", "TEXT"],
+            contents, generate_content_config = self._composite_request(image_data, shoe_description)
+            composite_path = await resilience.call_async(
+                'gemini_image', lambda: self._generate_image_in_slot_async(contents, generate_content_config)
             )
+            if not composite_path:
+                raise ValueError("no image was generated")
             
-            # Generate the image
-            file_index = 0
-            generated_image_path = None
-            
-            for chunk in self.genai_client.models.generate_content_stream(
-                model=Config.GEMINI_IMAGE_GENERATION_MODEL,
-                contents=contents,
-                config=generate_content_config,
-            ):
-                if (
-                    chunk.candidates is None
-                    or chunk.candidates[0].content is None
-                    or chunk.candidates[0].content.parts is None
-                ):
-                    continue
-                    
-                if (chunk.candidates[0].content.parts[0].inline_data and 
-                    chunk.candidates[0].content.parts[0].inline_data.data):
-                    
-                    # Generate filename
-                    filename = f"generated_{uuid.uuid4().hex}_{angle}.jpg"
-                    filepath = os.path.join(Config.GENERATED_FOLDER, filename)
-                    
-                    # Save the generated image
-                    inline_data = chunk.candidates[0].content.parts[0].inline_data
-                    data_buffer = inline_data.data
-                    file_extension = mimetypes.guess_extension(inline_data.mime_type) or ".jpg"
-                    
-                    with open(filepath, "wb") as f:
-                        f.write(data_buffer)
-                    
-                    generated_image_path = filepath
-                    file_index += 1
-                    print(f"Generated image saved to: {filepath}")
-                    print(f"Image data size: {len(data_buffer)} bytes")
-                    
-                elif chunk.candidates[0].content.parts[0].text:
-                    print(f"AI Response: {chunk.candidates[0].content.parts[0].text}")
-            
-            # Clean up temp file
-            clean_temp_file(temp_path)
-            
-            if generated_image_path:
-                return generated_image_path
-            else:
-                print("No image was generated, falling back to placeholder")
-                return self._create_visualization_image(shoe_description, angle, "AI image generation failed")
+            with open(composite_path, 'rb') as f:
+                composite_data = f.read()
+            with metrics.span('gemini.split_composite'):
+                tiles = await asyncio.to_thread(split_grid, composite_data)
             
+            return await asyncio.to_thread(self._store_composite_tiles, tiles, tile_keys, shoe_description)
         except Exception as e:
-            print(f"Error generating outfit image: {str(e)}")
-            # Clean up temp file
-            if 'temp_path' in locals():
-                clean_temp_file(temp_path)
-            return self._create_error_visualization()
+            return self._composite_failed(composite_key, e)
+    
+    def _composite_request(self, image_data: bytes, shoe_description: str):
+        """Build the contents and config of one image generation call covering all four angles"""
+        from google.genai import types
+        
+        prompt = f"""Generate a single realistic image laid out as a 2x2 grid of four equally sized panels, showing this person wearing {shoe_description}.
+            
+            Layout:
+            - Top-left panel: front view
+            - Top-right panel: back view
+            - Bottom-left panel: left side view
+            - Bottom-right panel: right side view
+            - Separate the panels with thin plain white lines; no borders, text, labels or numbers
+            
+            Requirements:
+            - Show the person wearing the exact shoes described: {shoe_description} in every panel
+            - Maintain the same outfit and background as the original image in every panel
+            - Ensure the shoes are clearly visible and match the description
+            - Keep the same lighting and overall aesthetic
+            - Each panel should look natural and realistic
+            
+            Make sure the shoes complement the outfit perfectly and the overall look is cohesive."""
+        
+        contents = [
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part.from_bytes(
+                        data=image_data,
+                        mime_type="image/jpeg"
+                    ),
+                    types.Part.from_text(text=prompt),
+                ],
+            ),
+        ]
+        
+        generate_content_config = types.GenerateContentConfig(
+            response_modalities=["IMAGE", "TEXT"],
+        )
+        
+        return contents, generate_content_config
+    
+    def _store_composite_tiles(self, tiles: List[bytes], tile_keys: Dict[str, str], shoe_description: str) -> Dict[str, str]:
+        """Save the split tiles and index them under their per-angle composite keys"""
+        tile_paths = {}
+        with metrics.span('gemini.save_image'):
+            for angle, tile in zip(COMPOSITE_ANGLES, tiles):
+                tile_paths[angle] = self.generated_store.path(self.generated_store.put(tile, '.jpg'))
+                self.tryon_cache.put(tile_keys[angle], tile_paths[angle], meta={
+                    "shoe": normalize_shoe_description(shoe_description),
+                    "angle": angle,
+                    "composite": True
+                })
+        composite_outcomes.inc('split')
+        print(f"Composite try-on split into {len(tile_paths)} angles: {shoe_description}")
+        return tile_paths
+    
+    def _composite_failed(self, composite_key: str, error: Exception) -> None:
+        """Remember a failed composite so its angles go straight to per-angle calls for a while"""
+        print(f"Composite try-on failed ({type(error).__name__}: {str(error)[:200]}), falling back to per-angle calls")
+        self.failed_composites.set(composite_key, True)
+        composite_outcomes.inc('fallback')
+        return None
+    
+    def _finish_tryon(self, cache_key: str, generated_image_path: Optional[str], shoe_description: str, angle: str) -> str:
+        """Cache a generated try-on image, or fall back to a placeholder when none was returned"""
+        if generated_image_path:
+            # Only real generations are cached, never placeholders or error images
+            self.tryon_cache.put(cache_key, generated_image_path, meta={
+                "shoe": normalize_shoe_description(shoe_description),
+                "angle": angle
+            })
+            return generated_image_path
+        
+        print("No image was generated, falling back to placeholder")
+        with metrics.span('gemini.placeholder'):
+            return self._create_visualization_image(shoe_description, angle, "AI image generation failed")
+    
+    def _generate_image_in_slot(self, contents, generate_content_config, angle: str) -> Optional[str]:
+        """One generation attempt, bounded by the process-wide limit; the slot is not held while a retry backs off"""
+        waiting_since = time.perf_counter()
+        with self.image_generation_slots:
+            metrics.observe('gemini.generation_slot_wait', time.perf_counter() - waiting_since)
+            with metrics.span('gemini.image_stream'):
+                return self._stream_generated_image(contents, generate_content_config, angle)
+    
+    async def _generate_image_in_slot_async(self, contents, generate_content_config) -> Optional[str]:
+        """Async variant of _generate_image_in_slot"""
+        waiting_since = time.perf_counter()
+        async with self.async_image_generation_slots:
+            metrics.observe('gemini.generation_slot_wait', time.perf_counter() - waiting_since)
+            with metrics.span('gemini.image_stream'):
+                return await self._stream_generated_image_async(contents, generate_content_config)
+    
+    def _stream_generated_image(self, contents, generate_content_config, angle: str) -> Optional[str]:
+        """Stream an image generation call and save the returned image; returns its path or None"""
+        generated_image_path = None
+        
+        for chunk in self.genai_client.models.generate_content_stream(
+            model=Config.GEMINI_IMAGE_GENERATION_MODEL,
+            contents=contents,
+            config=generate_content_config,
+        ):
+            generated_image_path = self._save_generated_chunk(chunk) or generated_image_path
+        
+        return generated_image_path
+    
+    async def _stream_generated_image_async(self, contents, generate_content_config) -> Optional[str]:
+        """Async variant of _stream_generated_image using the client's aio interface"""
+        generated_image_path = None
+        
+        stream = await self.genai_client.aio.models.generate_content_stream(
+            model=Config.GEMINI_IMAGE_GENERATION_MODEL,
+            contents=contents,
+            config=generate_content_config,
+        )
+        async for chunk in stream:
+            generated_image_path = self._save_generated_chunk(chunk) or generated_image_path
+        
+        return generated_image_path
+    
+    def _save_generated_chunk(self, chunk) -> Optional[str]:
+        """Store the image carried by a streamed chunk; returns its path, or None for text or empty chunks"""
+        if (
+            chunk.candidates is None
+            or chunk.candidates[0].content is None
+            or chunk.candidates[0].content.parts is None
+        ):
+            return None
+            
+        if (chunk.candidates[0].content.parts[0].inline_data and 
+            chunk.candidates[0].content.parts[0].inline_data.data):
+            
+            # Save the generated image
+            inline_data = chunk.candidates[0].content.parts[0].inline_data
+            data_buffer = inline_data.data
+            file_extension = mimetypes.guess_extension(inline_data.mime_type) or ".jpg"
+            
+            with metrics.span('gemini.save_image'):
+                image_key = self.generated_store.put(data_buffer, file_extension)
+            filepath = self.generated_store.path(image_key)
+            
+            print(f"Generated image saved to: {filepath}")
+            print(f"Image data size: {len(data_buffer)} bytes")
+            return filepath
+            
+        elif chunk.candidates[0].content.parts[0].text:
+            print(f"AI Response: {chunk.candidates[0].content.parts[0].text}")
+        return None
     
     def _create_visualization_image(self, shoe_description: str, angle: str, description: str = "") -> str:
         """Create visualization image with AI description"""
@@ -341,21 +943,18 @@ class GeminiService:
         draw.text((256, shoe_y + 20), "SHOE", fill=(255, 255, 255), font=font, anchor="mm")
         
         # Save the visualization
-        filename = f"generated_{uuid.uuid4().hex}_{angle}.jpg"
-        filepath = os.path.join(Config.GENERATED_FOLDER, filename)
-        img.save(filepath, quality=95)
-        
-        return filepath
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=95)
+        return self.generated_store.path(self.generated_store.put(buffer.getvalue(), '.jpg'))
     
     def _create_error_visualization(self) -> str:
         """Create error placeholder visualization"""
         img = Image.new('RGB', Config.VIZ_IMAGE_DIMENSIONS, color=(200, 200, 200))
         draw = ImageDraw.Draw(img)
         draw.text((256, 384), "Visualization Error", fill=(100, 100, 100), anchor="mm")
-        filename = f"error_{uuid.uuid4().hex}.jpg"
-        filepath = os.path.join(Config.GENERATED_FOLDER, filename)
-        img.save(filepath)
-        return filepath
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG')
+        return self.generated_store.path(self.generated_store.put(buffer.getvalue(), '.jpg'))
     
     def test_connection(self) -> Dict[str, Any]:
         """Test Gemini API connection"""
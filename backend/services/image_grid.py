@@ -0,0 +1,133 @@
+import io
+import statistics
+from typing import List, Tuple
+
+from PIL import Image, ImageChops, ImageStat
+
+from config import Config
+
+# Grid lines are searched for in the middle of the image only
+SPLIT_WINDOW = (0.35, 0.65)
+# A gutter is a line whose pixels barely vary (plain separator between panels)
+GUTTER_MAX_STDDEV = 6.0
+# A seam is a line where the picture jumps along its whole length, far more than between typical neighbouring lines
+SEAM_MIN_RATIO = 4.0
+SEAM_MIN_DIFFERENCE = 12.0
+# Panels must be about the same size and not blank
+TILE_SIZE_TOLERANCE = 0.2
+BLANK_TILE_MAX_STDDEV = 8.0
+# Grid detection runs on a downscaled grayscale copy
+ANALYSIS_SIZE = 256
+
+
+def _line(gray: Image.Image, vertical: bool, position: int) -> Image.Image:
+    if vertical:
+        return gray.crop((position, 0, position + 1, gray.height))
+    return gray.crop((0, position, gray.width, position + 1))
+
+
+def _find_split(gray: Image.Image, vertical: bool) -> Tuple[int, int]:
+    """
+    Find the boundary between two panels along one axis of the analysis image
+
+    Returns:
+        (first, last) line of the separator; equal when the panels meet at a seam without a gutter
+    """
+    length = gray.width if vertical else gray.height
+    low, high = int(length * SPLIT_WINDOW[0]), int(length * SPLIT_WINDOW[1])
+    center = length / 2
+
+    # Plain gutter: take the run of uniform lines closest to the center
+    runs = []
+    run_start = None
+    for position in range(low, high + 1):
+        uniform = position < high and ImageStat.Stat(_line(gray, vertical, position)).stddev[0] <= GUTTER_MAX_STDDEV
+        if uniform and run_start is None:
+            run_start = position
+        elif not uniform and run_start is not None:
+            runs.append((run_start, position - 1))
+            run_start = None
+    if runs:
+        return min(runs, key=lambda run: abs((run[0] + run[1]) / 2 - center))
+
+    # No gutter: look for a hard seam. The median change along the line is large only where the
+    # picture changes over most of its length, not at the edge of an object inside a panel
+    differences = [
+        ImageStat.Stat(ImageChops.difference(_line(gray, vertical, position), _line(gray, vertical, position - 1))).median[0]
+        for position in range(1, length)
+    ]
+    typical = statistics.median(differences) or 1.0
+    position, difference = max(
+        ((position, differences[position - 1]) for position in range(low, high)),
+        key=lambda candidate: candidate[1]
+    )
+    if difference >= SEAM_MIN_DIFFERENCE and difference >= SEAM_MIN_RATIO * typical:
+        return position, position - 1
+
+    direction = "vertical" if vertical else "horizontal"
+    raise ValueError(f"no {direction} grid line found")
+
+
+def _bounds(gray: Image.Image, vertical: bool, split: Tuple[int, int], scale: float) -> List[Tuple[int, int]]:
+    """Panel extents along one axis in full-size pixels"""
+    full_length = gray.width if vertical else gray.height
+    first, last = round(split[0] / scale), round((split[1] + 1) / scale) - 1
+
+    # Thin gutters blur away on the downscaled copy; snap to the uniform lines at full size nearby
+    margin = int(2 / scale) + 1
+    uniform = [
+        position for position in range(max(0, min(first, last) - margin), min(full_length, max(first, last) + margin + 1))
+        if ImageStat.Stat(_line(gray, vertical, position)).stddev[0] <= GUTTER_MAX_STDDEV
+    ]
+    if uniform:
+        first, last = min(uniform), max(uniform)
+
+    return [(0, first), (min(full_length, last + 1), full_length)]
+
+
+def split_grid(image_data: bytes) -> List[bytes]:
+    """
+    Split a 2x2 composite into its four panels
+
+    Args:
+        image_data: Encoded composite image
+
+    Returns:
+        JPEG bytes of the panels in reading order: top-left, top-right, bottom-left, bottom-right
+
+    Raises:
+        ValueError: The image is not a recognizable 2x2 grid (callers fall back to per-panel generation)
+    """
+    image = Image.open(io.BytesIO(image_data))
+    image = image.convert('RGB') if image.mode != 'RGB' else image
+
+    min_size = 2 * Config.COMPOSITE_MIN_TILE_SIZE
+    if image.width < min_size or image.height < min_size:
+        raise ValueError(f"composite is too small ({image.width}x{image.height})")
+
+    full_gray = image.convert('L')
+    scale = min(1.0, ANALYSIS_SIZE / max(image.width, image.height))
+    gray = full_gray
+    if scale < 1.0:
+        gray = gray.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.Resampling.BILINEAR)
+
+    columns = _bounds(full_gray, True, _find_split(gray, vertical=True), scale)
+    rows = _bounds(full_gray, False, _find_split(gray, vertical=False), scale)
+
+    widths = [right - left for left, right in columns]
+    heights = [bottom - top for top, bottom in rows]
+    if min(widths + heights) < Config.COMPOSITE_MIN_TILE_SIZE:
+        raise ValueError(f"panels are too small ({widths} x {heights})")
+    if max(widths) > min(widths) * (1 + TILE_SIZE_TOLERANCE) or max(heights) > min(heights) * (1 + TILE_SIZE_TOLERANCE):
+        raise ValueError(f"panels differ in size ({widths} x {heights})")
+
+    tiles = []
+    for top, bottom in rows:
+        for left, right in columns:
+            tile = image.crop((left, top, right, bottom))
+            if max(ImageStat.Stat(tile.convert('L')).stddev) <= BLANK_TILE_MAX_STDDEV:
+                raise ValueError("a panel is blank")
+            buffer = io.BytesIO()
+            tile.save(buffer, format='JPEG', quality=95)
+            tiles.append(buffer.getvalue())
+    return tiles
@@ -0,0 +1,142 @@
+import io
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config import Config
+from utils import normalize_image, encode_jpeg, hash_normalized_pixels, prepare_image_bytes, compute_image_hash, prepared_image_cache, MemoryCache
+from services.storage_service import ArtifactStore
+
+
+class ImageIngestService:
+    """Normalizes uploads once and stores a master image plus the pre-sized variants used downstream"""
+
+    def __init__(self, store: ArtifactStore):
+        """
+        Create the ingest pipeline
+
+        Args:
+            store: Upload store; the master's key is the upload's image_id
+        """
+        self.store = store
+        self.variant_sizes = sorted({Config.MAX_IMAGE_SIZE, Config.VIZ_MAX_IMAGE_SIZE}, reverse=True)
+        self._meta_cache = MemoryCache(max_entries=Config.INGEST_METADATA_CACHE_ENTRIES)
+
+        self._lock = threading.Lock()
+        self.variant_hits = 0
+        self.variant_misses = 0
+
+    def ingest(self, data: bytes) -> Dict[str, Any]:
+        """
+        Decode an upload once, normalize it and store the master and its variants
+
+        Args:
+            data: Raw uploaded file bytes
+
+        Returns:
+            Metadata record of the stored image (image_id, dimensions, hashes, variants)
+
+        Raises:
+            ValueError: If the bytes are not a supported image or exceed the pixel limit
+        """
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                original = {"format": img.format, "width": img.width, "height": img.height, "bytes": len(data)}
+
+                # Reject decompression bombs before decoding any pixels
+                if img.width * img.height > Config.INGEST_MAX_PIXELS:
+                    raise ValueError(
+                        f"Image is too large ({img.width}x{img.height}); "
+                        f"the limit is {Config.INGEST_MAX_PIXELS} pixels"
+                    )
+
+                # For JPEG, let the decoder downscale by 1/2, 1/4 or 1/8 while decoding
+                master_size = Config.INGEST_MASTER_MAX_SIZE
+                img.draft('RGB', (master_size, master_size))
+
+                master = normalize_image(ImageOps.exif_transpose(img), master_size)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            print(f"Rejected upload: {str(e)}")
+            raise ValueError("Invalid or unsupported image file")
+
+        buffer = io.BytesIO()
+        master.save(buffer, format='JPEG', quality=Config.INGEST_MASTER_QUALITY)
+        master_bytes = buffer.getvalue()
+        image_id = self.store.put(master_bytes, '.jpg')
+
+        # Derive variants from the decoded master so they match what prepare_image_bytes
+        # would produce from the stored master file
+        with Image.open(io.BytesIO(master_bytes)) as stored_master:
+            stored_master.load()
+            variants = {}
+            for size in self.variant_sizes:
+                variant = normalize_image(stored_master, size)
+                variants[str(size)] = {
+                    "key": self.store.put(encode_jpeg(variant), '.jpg'),
+                    "width": variant.width,
+                    "height": variant.height,
+                    "pixel_hash": hash_normalized_pixels(variant)
+                }
+
+        meta = {
+            "image_id": image_id,
+            "sha256": image_id.split('.')[0],
+            "width": master.width,
+            "height": master.height,
+            "original": original,
+            "variants": variants
+        }
+        self.store.put_meta(image_id, meta)
+        self._meta_cache.set(image_id, meta)
+        return meta
+
+    def metadata(self, image_id: str) -> Optional[Dict[str, Any]]:
+        """Return the ingest metadata of an uploaded image, or None"""
+        meta = self._meta_cache.get(image_id)
+        if meta is None:
+            meta = self.store.get_meta(image_id)
+            if meta is not None:
+                self._meta_cache.set(image_id, meta)
+        return meta
+
+    def _variant(self, image_path: str, max_size: int) -> Optional[Dict[str, Any]]:
+        meta = self.metadata(os.path.basename(image_path))
+        if meta is None:
+            return None
+        return meta["variants"].get(str(max_size))
+
+    def prepared_bytes(self, image_path: str, max_size: int) -> bytes:
+        """Return model-ready JPEG bytes of an upload, read from its stored variant when available"""
+        variant = self._variant(image_path, max_size)
+        data = None
+        if variant:
+            # Variant keys are content hashes, so the bytes never go stale in the shared memory cache
+            data = prepared_image_cache.get(variant["key"])
+            if data is None:
+                data = self.store.get(variant["key"])
+                if data is not None:
+                    prepared_image_cache.set(variant["key"], data)
+        if data is not None:
+            with self._lock:
+                self.variant_hits += 1
+            return data
+
+        with self._lock:
+            self.variant_misses += 1
+        return prepare_image_bytes(image_path, max_size)
+
+    def image_hash(self, image_path: str, max_size: int) -> str:
+        """Return the normalized pixel hash of an upload, recorded at ingest when available"""
+        variant = self._variant(image_path, max_size)
+        if variant:
+            return variant["pixel_hash"]
+        return compute_image_hash(image_path, max_size)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "variant_hits": self.variant_hits,
+                "variant_misses": self.variant_misses
+            }
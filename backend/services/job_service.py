@@ -0,0 +1,383 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+import concurrent.futures
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from models import VideoJob, VideoGeneration, ShoeVideoGeneration
+
+
+class BackgroundLoop:
+    """A single long-lived asyncio event loop running on a daemon thread"""
+
+    def __init__(self, name: str = "background-loop", loop: asyncio.AbstractEventLoop = None):
+        """Start a loop on its own thread, or wrap an already running one (e.g. the ASGI server's)"""
+        self._thread = None
+        if loop is not None:
+            self.loop = loop
+            return
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        return self.submit(coro).result(timeout)
+
+    def stop(self) -> None:
+        """Stop a loop this object started; wrapped loops belong to their owner"""
+        if self._thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def default_store_folder() -> str:
+    """Folder shared by all workers for job snapshots"""
+    return Config.VIDEO_JOB_STORE_FOLDER or os.path.join(Config.CACHE_FOLDER, 'jobs')
+
+
+def referenced_job_paths(store_folder: str = None, video_path_for: Callable[[str], Optional[str]] = None) -> List[str]:
+    """
+    Return files still needed by the jobs of every worker, read from their snapshots
+
+    Args:
+        store_folder: Snapshot folder (the configured one when None)
+        video_path_for: Maps a result's video URL to its file path (None if gone)
+
+    Returns:
+        Inputs of unfinished jobs and the videos of all retained jobs
+    """
+    folder = store_folder or default_store_folder()
+    if not os.path.isdir(folder):
+        return []
+
+    paths = []
+    for name in os.listdir(folder):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(folder, name), 'r') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue  # pruned since the listing
+        job = record["job"]
+        if job["status"] not in JobService.TERMINAL_STATUSES:
+            paths.extend(record.get("input_paths", []))
+        if video_path_for is None:
+            continue
+        for result in job["results"]:
+            for video in result["videos"]:
+                if video["video_url"]:
+                    paths.append(video_path_for(video["video_url"]))
+    return paths
+
+
+# Runner signature: (on_result) -> list of per-shoe results, where on_result(index, result)
+# is called as soon as each shoe finishes
+JobRunner = Callable[[Callable[[int, ShoeVideoGeneration], None]], Awaitable[List[ShoeVideoGeneration]]]
+
+
+class JobService:
+    """
+    Runs video generation jobs in the background and tracks their per-shoe progress
+
+    A job runs in the process that accepted it. Every change is also written to a JSON snapshot
+    under the job store folder, so workers of a multi-process server (and restarted ones) can
+    answer status and event requests for jobs they did not start; they notice changes by polling.
+    """
+
+    # 'partial': the job finished with videos for some shoes only
+    TERMINAL_STATUSES = ('completed', 'partial', 'failed')
+
+    def __init__(self, loop: BackgroundLoop = None, store_folder: str = None):
+        """
+        Initialize job service
+
+        Args:
+            loop: Loop the jobs run on (a private background loop when None)
+            store_folder: Folder shared by all workers for job snapshots (from Config when None)
+        """
+        self.background = loop or BackgroundLoop(name="video-jobs")
+        self.max_concurrent_jobs = Config.VIDEO_JOB_MAX_CONCURRENT
+        self.retention_seconds = Config.VIDEO_JOB_RETENTION_SECONDS
+        self.store_folder = store_folder or default_store_folder()
+        os.makedirs(self.store_folder, exist_ok=True)
+
+        self._jobs: Dict[str, VideoJob] = {}
+        self._versions: Dict[str, int] = {}
+        self._input_paths: Dict[str, List[str]] = {}  # job id -> files the runner reads
+        self._async_waiters: Dict[str, List[asyncio.Future]] = {}
+        self._condition = threading.Condition()
+        self._snapshot_lock = threading.Lock()  # orders snapshot writes without holding up readers
+        self._slots = None  # asyncio.Semaphore, created on the loop
+
+    def submit(self, shoes: List[Dict[str, str]], runner: JobRunner, input_paths: List[str] = None) -> str:
+        """Register a job for the given shoes and schedule its runner; returns the job id"""
+        self._prune_finished_jobs()
+
+        now = time.time()
+        job = VideoJob(
+            job_id=uuid.uuid4().hex,
+            status="queued",
+            results=[
+                ShoeVideoGeneration(
+                    shoe=shoe,
+                    videos=[VideoGeneration(angle="front", video_url="", status="processing")]
+                )
+                for shoe in shoes
+            ],
+            created_at=now,
+            updated_at=now
+        )
+
+        with self._condition:
+            self._jobs[job.job_id] = job
+            self._versions[job.job_id] = 0
+            self._input_paths[job.job_id] = list(input_paths or [])
+            snapshot = self._snapshot(job.job_id)
+        self._write_snapshot(job.job_id, snapshot)
+
+        self.background.submit(self._run_job(job.job_id, runner))
+        return job.job_id
+
+    def use_loop(self, loop: BackgroundLoop) -> None:
+        """Run jobs on another loop from now on, stopping the current one; call before any job is submitted"""
+        previous = self.background
+        self.background = loop
+        self._slots = None
+        if previous is not loop:
+            previous.stop()
+
+    def run_sync(self, coro: Awaitable) -> Any:
+        """Run a coroutine on the shared loop and wait for its result"""
+        return self.background.run(coro)
+
+    def _snapshot_path(self, job_id: str) -> Optional[str]:
+        # Job ids are uuid4 hex; anything else could escape the store folder
+        if len(job_id) != 32 or any(c not in '0123456789abcdef' for c in job_id):
+            return None
+        return os.path.join(self.store_folder, f"{job_id}.json")
+
+    def _snapshot(self, job_id: str) -> Dict[str, Any]:
+        """Capture a job's state for the shared store; call with the condition held"""
+        return {
+            "version": self._versions[job_id],
+            "job": asdict(self._jobs[job_id]),
+            # Read by the storage janitor, which may run in another worker
+            "input_paths": self._input_paths.get(job_id, [])
+        }
+
+    def _write_snapshot(self, job_id: str, snapshot: Dict[str, Any]) -> None:
+        """Publish a captured job state to the shared store; call without the condition held"""
+        with self._snapshot_lock:
+            with self._condition:
+                # Every change writes its own snapshot, so an older one must not overwrite a newer
+                if self._versions.get(job_id, snapshot["version"]) > snapshot["version"]:
+                    return
+            self._store_snapshot(job_id, snapshot)
+
+    def _store_snapshot(self, job_id: str, snapshot: Dict[str, Any]) -> None:
+        path = self._snapshot_path(job_id)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing job snapshot {job_id}: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _read_snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored {"version", "job", "input_paths"} record of a job started by any worker, or None"""
+        path = self._snapshot_path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _is_local(self, job_id: str) -> bool:
+        with self._condition:
+            return job_id in self._jobs
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a JSON-serializable snapshot of a job, or None if unknown"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job:
+                return asdict(job)
+        record = self._read_snapshot(job_id)
+        return record["job"] if record else None
+
+    def wait_for_update(self, job_id: str, version: int, timeout: float) -> int:
+        """Block until the job changes past the given version or timeout; returns the current version"""
+        if not self._is_local(job_id):
+            # Jobs of other workers are followed through their snapshots
+            deadline = time.time() + timeout
+            while self.version(job_id) == version and time.time() < deadline:
+                time.sleep(min(Config.VIDEO_JOB_POLL_INTERVAL_SECONDS, max(0.0, deadline - time.time())))
+            return self.version(job_id)
+
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._versions.get(job_id, version) != version,
+                timeout=timeout
+            )
+            return self._versions.get(job_id, version)
+
+    async def wait_for_update_async(self, job_id: str, version: int, timeout: float) -> int:
+        """Await a change past the given version or timeout without holding a thread; returns the current version"""
+        if not self._is_local(job_id):
+            deadline = time.time() + timeout
+            while self.version(job_id) == version and time.time() < deadline:
+                await asyncio.sleep(min(Config.VIDEO_JOB_POLL_INTERVAL_SECONDS, max(0.0, deadline - time.time())))
+            return self.version(job_id)
+
+        with self._condition:
+            current = self._versions.get(job_id, version)
+            if current != version:
+                return current
+            waiter = asyncio.get_running_loop().create_future()
+            self._async_waiters.setdefault(job_id, []).append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                waiters = self._async_waiters.get(job_id)
+                if waiters and waiter in waiters:
+                    waiters.remove(waiter)
+                if waiters == []:
+                    del self._async_waiters[job_id]
+
+        return self.version(job_id)
+
+    def version(self, job_id: str) -> int:
+        """Return the current version counter of a job"""
+        with self._condition:
+            if job_id in self._versions:
+                return self._versions[job_id]
+        record = self._read_snapshot(job_id)
+        return record["version"] if record else 0
+
+    async def _run_job(self, job_id: str, runner: JobRunner) -> None:
+        """Drive a job on the background loop, bounded by the concurrent job limit"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent_jobs)
+
+        async with self._slots:
+            self._update(job_id, status="processing")
+
+            def on_result(index: int, result: ShoeVideoGeneration) -> None:
+                with self._condition:
+                    job = self._jobs.get(job_id)
+                    if job and index < len(job.results):
+                        job.results[index] = result
+                self._update(job_id)
+
+            try:
+                results = list(await runner(on_result))
+                with self._condition:
+                    job = self._jobs.get(job_id)
+                    if job:
+                        job.results = results
+                status, error = self._outcome(results)
+                self._update(job_id, status=status, error=error)
+            except Exception as e:
+                print(f"Error in video job {job_id}: {str(e)}")
+                with self._condition:
+                    job = self._jobs.get(job_id)
+                    if job:
+                        for result in job.results:
+                            for video in result.videos:
+                                if video.status == "processing":
+                                    video.status = "failed"
+                self._update(job_id, status="failed", error=str(e))
+
+    @staticmethod
+    def _outcome(results: List[ShoeVideoGeneration]) -> Tuple[str, Optional[str]]:
+        """Terminal status and error of a job whose runner returned these per-shoe results"""
+        videos = [video for result in results for video in result.videos]
+        succeeded = sum(1 for video in videos if video.status == "completed")
+        if videos and succeeded == len(videos):
+            return "completed", None
+        if succeeded:
+            return "partial", f"{len(videos) - succeeded} of {len(videos)} videos failed"
+        return "failed", "No video was generated"
+
+    def _update(self, job_id: str, status: str = None, error: str = None) -> None:
+        """Apply a status change, bump the job version and wake any waiters"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if status:
+                job.status = status
+            if error is not None:
+                job.error = error
+            job.updated_at = time.time()
+            self._versions[job_id] += 1
+            snapshot = self._snapshot(job_id)
+            self._condition.notify_all()
+            waiters = self._async_waiters.pop(job_id, [])
+
+        self._write_snapshot(job_id, snapshot)
+
+        # Waiters may live on another loop than the one running the job
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def _prune_finished_jobs(self) -> None:
+        """Forget finished jobs older than the retention window, including other workers' snapshots"""
+        cutoff = time.time() - self.retention_seconds
+        with self._condition:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.status in self.TERMINAL_STATUSES and job.updated_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+                del self._versions[job_id]
+                self._input_paths.pop(job_id, None)
+                self._async_waiters.pop(job_id, None)
+            local = set(self._jobs)
+
+        # A snapshot untouched for the retention window belongs to a finished job (or a dead worker)
+        try:
+            names = os.listdir(self.store_folder)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.store_folder, name)
+            if os.path.splitext(name)[0] in local:
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,135 @@
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from config import Config
+
+
+class ServiceUnavailableError(RuntimeError):
+    """Raised when a service is not configured or failed to initialize"""
+
+    def __init__(self, service: str, reason: str):
+        super().__init__(f"{service} service is unavailable: {reason}")
+        self.service = service
+        self.reason = reason
+
+
+class LazyService:
+    """
+    Builds a service on first use and proxies attribute access to it
+
+    Importing the app stays cheap (heavy SDKs are imported by the service constructors), services
+    are built in the worker process that uses them, and a service that is not configured or fails
+    to build makes only its own endpoints unavailable.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], required_config: Iterable[str] = ()):
+        """
+        Create the proxy
+
+        Args:
+            name: Service name used in readiness reports and errors
+            factory: Builds the service instance
+            required_config: Config attributes that must be set; the service is disabled without them
+        """
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_required_config', tuple(required_config))
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_error', None)
+        object.__setattr__(self, '_failed_at', None)
+        object.__setattr__(self, '_init_seconds', None)
+        object.__setattr__(self, '_building', False)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _missing_config(self):
+        return [key for key in self._required_config if not getattr(Config, key, None)]
+
+    def get(self) -> Any:
+        """Return the service, building it on first use; raises ServiceUnavailableError if it cannot be built"""
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        missing = self._missing_config()
+        if missing:
+            raise ServiceUnavailableError(self._name, f"{', '.join(missing)} not configured")
+
+        with self._lock:
+            if self._instance is not None:
+                return self._instance
+
+            # Failed builds are retried only after a back-off, not on every request
+            if self._failed_at is not None and time.time() - self._failed_at < Config.SERVICE_INIT_RETRY_SECONDS:
+                raise ServiceUnavailableError(self._name, self._error)
+
+            object.__setattr__(self, '_building', True)
+            started = time.perf_counter()
+            try:
+                instance = self._factory()
+            except Exception as e:
+                print(f"Error initializing {self._name} service: {str(e)}")
+                object.__setattr__(self, '_error', str(e))
+                object.__setattr__(self, '_failed_at', time.time())
+                raise ServiceUnavailableError(self._name, str(e))
+            finally:
+                object.__setattr__(self, '_building', False)
+
+            object.__setattr__(self, '_init_seconds', round(time.perf_counter() - started, 3))
+            object.__setattr__(self, '_error', None)
+            object.__setattr__(self, '_failed_at', None)
+            object.__setattr__(self, '_instance', instance)
+            print(f"{self._name} service initialized in {self._init_seconds}s")
+            return instance
+
+    def peek(self) -> Optional[Any]:
+        """Return the service if it has been built, without building it"""
+        return self._instance
+
+    def warm(self) -> None:
+        """Build the service on a background thread unless it is built, building or disabled"""
+        if self._instance is not None or self._building or self._missing_config():
+            return
+
+        def build():
+            try:
+                self.get()
+            except ServiceUnavailableError:
+                pass
+
+        threading.Thread(target=build, name=f"warm-{self._name}", daemon=True).start()
+
+    def status(self) -> Dict[str, Any]:
+        """Return the service state: ready, starting, idle (not built yet), disabled or failed"""
+        missing = self._missing_config()
+        if self._instance is not None:
+            return {"state": "ready", "init_seconds": self._init_seconds}
+        if missing:
+            return {"state": "disabled", "reason": f"{', '.join(missing)} not configured"}
+        if self._building:
+            return {"state": "starting"}
+        if self._error is not None:
+            return {"state": "failed", "reason": self._error}
+        return {"state": "idle"}
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.get(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self.get(), attr, value)
+
+
+def readiness(services: Dict[str, LazyService]) -> Dict[str, Any]:
+    """
+    Start building every service and report whether all configured ones are ready
+
+    Disabled services (missing configuration) do not block readiness; their endpoints answer 503.
+    """
+    for service in services.values():
+        service.warm()
+
+    statuses = {name: service.status() for name, service in services.items()}
+    return {
+        "ready": all(status["state"] in ("ready", "disabled") for status in statuses.values()),
+        "services": statuses
+    }
@@ -0,0 +1,284 @@
+import time
+import bisect
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from config import Config
+
+# Seconds; generation calls routinely take tens of seconds, so the buckets reach two minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[Any, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    TYPE = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[Any, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.TYPE}"]
+
+
+class Counter(_Metric):
+    TYPE = 'counter'
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._series[labelvalues] = self._series.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = dict(self._series)
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(series.items())
+        ]
+
+
+class Gauge(_Metric):
+    TYPE = 'gauge'
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._series[labelvalues] = self._series.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues, value: float) -> None:
+        with self._lock:
+            self._series[labelvalues] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = dict(self._series)
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(series.items())
+        ]
+
+
+class Histogram(_Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Per-bucket counts (the last slot is +Inf), sum, count
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+
+        lines = self._header()
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class _NoopSpan:
+    """Returned by span() when metrics are disabled, so instrumented code pays one attribute check"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('registry', 'stage', 'started')
+
+    def __init__(self, registry: "MetricsRegistry", stage: str):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.registry.stage_in_flight.inc(self.stage)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        self.registry.stage_in_flight.dec(self.stage)
+        self.registry.stage_duration.observe(elapsed, self.stage)
+        if exc_type is not None:
+            self.registry.stage_errors.inc(self.stage, exc_type.__name__)
+        return False
+
+
+# A collector returns (name, help, type, [(labels dict, value), ...]) families at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+
+class MetricsRegistry:
+    """Process-wide stage timers, counters and gauges rendered in the Prometheus text format"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+        self.stage_duration = self.histogram(
+            'fitcheck_stage_duration_seconds', 'Time spent in an instrumented stage', ['stage']
+        )
+        self.stage_in_flight = self.gauge(
+            'fitcheck_stage_in_flight', 'Instrumented stages currently running', ['stage']
+        )
+        self.stage_errors = self.counter(
+            'fitcheck_stage_errors_total', 'Instrumented stages that raised', ['stage', 'exception']
+        )
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collector: Collector) -> None:
+        """Add a callback whose values are read at scrape time (e.g. cache counters)"""
+        self._collectors.append(collector)
+
+    def span(self, stage: str):
+        """
+        Time a stage: records its duration, in-flight count and errors
+
+        Usage:
+            with metrics.span('gemini.image_stream'):
+                ...
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record a duration measured elsewhere (e.g. time a task spent queued)"""
+        if self.enabled:
+            self.stage_duration.observe(seconds, stage)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, help_text, metric_type, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    label_text = _format_labels(tuple(labels), tuple(labels.values()))
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry(enabled=Config.METRICS_ENABLED)
+
+
+def cache_collector(sources: Dict[str, Callable[[], Dict[str, Any]]]) -> Collector:
+    """Build a collector exporting hits, misses and hit ratio for each named stats() source"""
+
+    def collect():
+        stats = {}
+        for name, source in sources.items():
+            try:
+                source_stats = source()
+            except Exception as e:
+                print(f"Error reading {name} stats: {str(e)}")
+                continue
+            # Sources return None while there is nothing to report (e.g. a service not built yet)
+            if source_stats is not None:
+                stats[name] = source_stats
+
+        yield ('fitcheck_cache_hits_total', 'Cache hits', 'counter',
+               [({'cache': name}, s['hits']) for name, s in stats.items() if 'hits' in s])
+        yield ('fitcheck_cache_misses_total', 'Cache misses', 'counter',
+               [({'cache': name}, s['misses']) for name, s in stats.items() if 'misses' in s])
+        yield ('fitcheck_cache_hit_ratio', 'Share of cache lookups answered from the cache', 'gauge',
+               [({'cache': name}, s['hit_ratio']) for name, s in stats.items() if 'hit_ratio' in s])
+
+    return collect
+
+
+def singleflight_collector(sources: Dict[str, Callable[[], Dict[str, Any]]]) -> Collector:
+    """Build a collector exporting calls, coalesced requests and waiters for each named SingleFlight stats() source"""
+
+    def collect():
+        stats = {}
+        for name, source in sources.items():
+            try:
+                source_stats = source()
+            except Exception as e:
+                print(f"Error reading {name} coalescing stats: {str(e)}")
+                continue
+            if source_stats is not None:
+                stats[name] = source_stats
+
+        yield ('fitcheck_singleflight_calls_total', 'Calls that ran because no identical call was in flight', 'counter',
+               [({'layer': name}, s['calls']) for name, s in stats.items()])
+        yield ('fitcheck_coalesced_total', 'Requests that shared an identical in-flight call', 'counter',
+               [({'layer': name}, s['coalesced']) for name, s in stats.items()])
+        yield ('fitcheck_singleflight_in_flight', 'Distinct calls currently in flight', 'gauge',
+               [({'layer': name}, s['in_flight']) for name, s in stats.items()])
+        yield ('fitcheck_singleflight_waiting', 'Requests currently waiting on an identical in-flight call', 'gauge',
+               [({'layer': name}, s['waiting']) for name, s in stats.items()])
+
+    return collect
@@ -0,0 +1,288 @@
+import re
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import Config
+from services.metrics import metrics
+
+# HTTP statuses worth retrying: timeouts, rate limits and server-side failures
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Transport failures across httpx, requests, grpc wrappers and the stdlib, matched by class name
+# so the SDKs do not have to be imported here
+TRANSIENT_ERROR_NAMES = {
+    'ConnectionError', 'TimeoutError', 'TransportError', 'TimeoutException', 'Timeout',
+    'ReadTimeout', 'ConnectTimeout', 'RemoteProtocolError', 'ServerDisconnectedError'
+}
+
+# exa_py reports HTTP failures only in the exception message
+_STATUS_IN_MESSAGE = re.compile(r'status code (\d{3})')
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    """Best-effort HTTP status of an SDK exception (google-genai, api_core, httpx, exa_py)"""
+    for code in (getattr(exc, 'status_code', None), getattr(exc, 'code', None),
+                 getattr(getattr(exc, 'response', None), 'status_code', None)):
+        if isinstance(code, int) and not isinstance(code, bool):
+            return code
+
+    match = _STATUS_IN_MESSAGE.search(str(exc))
+    return int(match.group(1)) if match else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether a failed call may succeed if repeated (and counts against the provider's breaker)"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    status = status_code_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(exc).__mro__)
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header on the exception's response, if present and numeric"""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed: calls pass; after failure_threshold consecutive transient failures it opens.
+    open: calls fail fast until recovery_seconds have passed, then it turns half-open.
+    half_open: up to half_open_max_calls trial calls pass; a success closes it, a failure reopens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_seconds: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_calls = 0
+        self._lock = threading.Lock()
+
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_error = None
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == 'open':
+                elapsed = time.time() - self.opened_at
+                if elapsed < self.recovery_seconds:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.recovery_seconds - elapsed)
+                self.state = 'half_open'
+                self.trial_calls = 0
+
+            if self.state == 'half_open':
+                if self.trial_calls >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0)
+                self.trial_calls += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.trial_calls = 0
+
+    def record_failure(self, exc: BaseException) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = f"{type(exc).__name__}: {str(exc)[:200]}"
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"Circuit breaker for {self.name} opened after {self.consecutive_failures} failures")
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.time()
+
+    def release_trial(self) -> None:
+        """Give back a half-open trial slot taken by a call that ended in a non-transient error"""
+        with self._lock:
+            if self.state == 'half_open' and self.trial_calls > 0:
+                self.trial_calls -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == 'open':
+                retry_in = round(max(0.0, self.recovery_seconds - (time.time() - self.opened_at)), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_in_seconds": retry_in,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "last_error": self.last_error
+            }
+
+
+class ProviderGuard:
+    """Retries transient failures of one provider with jittered exponential backoff behind its breaker"""
+
+    def __init__(self, name: str, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 failure_threshold: int = 5, recovery_seconds: float = 30.0):
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(name, failure_threshold, recovery_seconds)
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """Delay before the given retry: full jitter over an exponential cap, at least any Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        retry_after = retry_after_of(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _should_retry(self, attempt: int, exc: BaseException) -> bool:
+        """Record a failed attempt with the breaker; True if another attempt should follow"""
+        if not is_retryable(exc):
+            self.breaker.release_trial()
+            return False
+
+        self.breaker.record_failure(exc)
+        return attempt < self.max_attempts and self.breaker.state != 'open'
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call fn, retrying transient failures; raises CircuitOpenError while the breaker is open"""
+        self._count('calls')
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    self._count('failures')
+                    raise
+                delay = self.backoff(attempt, e)
+                print(f"{self.name} call failed ({type(e).__name__}: {str(e)[:120]}); retry {attempt} in {delay:.2f}s")
+                self._count('retries')
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of call; coro_factory creates a fresh coroutine per attempt"""
+        self._count('calls')
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            try:
+                result = await coro_factory()
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    self._count('failures')
+                    raise
+                delay = self.backoff(attempt, e)
+                print(f"{self.name} call failed ({type(e).__name__}: {str(e)[:120]}); retry {attempt} in {delay:.2f}s")
+                self._count('retries')
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {"calls": self.calls, "retries": self.retries, "failures": self.failures}
+        return {
+            "max_attempts": self.max_attempts,
+            **counters,
+            "breaker": self.breaker.snapshot()
+        }
+
+
+class Resilience:
+    """Process-wide registry of provider guards, configured from Config.RESILIENCE_POLICIES"""
+
+    def __init__(self, policies: Dict[str, Dict[str, Any]] = None):
+        self.policies = policies if policies is not None else Config.RESILIENCE_POLICIES
+        self._guards: Dict[str, ProviderGuard] = {}
+        self._lock = threading.Lock()
+
+    def guard(self, provider: str) -> ProviderGuard:
+        """Return the guard for a provider, creating it from its policy on first use"""
+        with self._lock:
+            guard = self._guards.get(provider)
+            if guard is None:
+                guard = self._guards[provider] = ProviderGuard(provider, **self.policies.get(provider, {}))
+            return guard
+
+    def call(self, provider: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call a provider with retries and its circuit breaker
+
+        Usage:
+            response = resilience.call('gemini', model.generate_content, contents)
+        """
+        return self.guard(provider).call(fn, *args, **kwargs)
+
+    async def call_async(self, provider: str, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await a provider with retries and its circuit breaker; pass a factory, not a coroutine"""
+        return await self.guard(provider).call_async(coro_factory)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return retry counters and breaker state of every provider"""
+        for provider in self.policies:
+            self.guard(provider)
+        with self._lock:
+            guards = dict(self._guards)
+        return {name: guard.snapshot() for name, guard in guards.items()}
+
+    def collect(self):
+        """Metrics collector: breaker state (0 closed, 1 half-open, 2 open) and retry counters"""
+        snapshot = self.snapshot()
+        states = {'closed': 0, 'half_open': 1, 'open': 2}
+        yield ('fitcheck_circuit_breaker_state', 'Circuit breaker state (0 closed, 1 half-open, 2 open)', 'gauge',
+               [({'provider': name}, states[s['breaker']['state']]) for name, s in snapshot.items()])
+        yield ('fitcheck_provider_retries_total', 'Provider calls retried after a transient failure', 'counter',
+               [({'provider': name}, s['retries']) for name, s in snapshot.items()])
+        yield ('fitcheck_provider_rejected_total', 'Provider calls rejected by an open circuit breaker', 'counter',
+               [({'provider': name}, s['breaker']['rejected']) for name, s in snapshot.items()])
+
+
+resilience = Resilience()
+metrics.register_collector(resilience.collect)
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight call shared by all callers"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn unless an identical call is already in flight, in which case wait for its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._waiters[key] += 1
+                self.coalesced += 1
+                is_leader = False
+            else:
+                call = concurrent.futures.Future()
+                self._calls[key] = call
+                self._waiters[key] = 0
+                self.calls += 1
+                is_leader = True
+
+        if not is_leader:
+            try:
+                return call.result()
+            finally:
+                with self._lock:
+                    if key in self._waiters and self._calls.get(key) is call:
+                        self._waiters[key] -= 1
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            call.set_exception(e)
+            raise
+
+        self._finish(key)
+        call.set_result(result)
+        return result
+
+    def _finish(self, key: str) -> None:
+        # Forget the call first so later callers start a fresh one
+        with self._lock:
+            self._calls.pop(key, None)
+            self._waiters.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return in-flight calls, current waiters and coalescing counters"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(self._waiters.values()),
+                "calls": self.calls,
+                "coalesced": self.coalesced
+            }
+
+
+class AsyncSingleFlight:
+    """asyncio variant of SingleFlight; must be used from a single event loop"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await the in-flight task for key, starting one from coro_factory if there is none"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._tasks[key] = task
+            self._waiters[key] = 0
+            self.calls += 1
+            task.add_done_callback(lambda _: self._finish(key, task))
+        else:
+            self._waiters[key] += 1
+            self.coalesced += 1
+
+        # Shield so one cancelled caller does not cancel the shared work
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+            self._waiters.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return in-flight calls, coalesced waiters and counters"""
+        return {
+            "in_flight": len(self._tasks),
+            "waiting": sum(self._waiters.values()),
+            "calls": self.calls,
+            "coalesced": self.coalesced
+        }
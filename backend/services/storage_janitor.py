@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import fnmatch
+import itertools
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from config import Config
+from services.storage_service import ArtifactStore, LocalArtifactStore
+
+try:
+    import fcntl
+except ImportError:  # Windows has no advisory file locks; every process sweeps there
+    fcntl = None
+
+
+class StorageJanitor:
+    """
+    Keeps upload and generated-asset folders within their quotas
+
+    Every worker of a multi-process server starts a janitor, but only the one holding the lock
+    file sweeps; when that worker exits, another one takes over at its next interval. References
+    are collected at sweep time from state all workers share (cache indexes, job snapshots).
+    """
+
+    def __init__(self, policies: Dict[str, Dict[str, Any]] = None,
+                 reference_providers: Iterable[Callable[[], Iterable[str]]] = (), lock_path: str = None):
+        """
+        Create a janitor
+
+        Args:
+            policies: Folder name -> policy dict with ``folder``, ``max_bytes``, ``max_files``,
+                ``max_age_seconds`` and optional ``transient_patterns``/``transient_max_age_seconds``
+            reference_providers: Callables returning paths that must not be deleted
+                (files used by running jobs or indexed by caches, in any worker)
+            lock_path: File whose holder is the one process that sweeps (from Config when None)
+        """
+        self.policies = policies or Config.STORAGE_POLICIES
+        self.reference_providers = list(reference_providers)
+        self.lock_path = lock_path or Config.STORAGE_JANITOR_LOCK_FILE
+        self._lock_file = None
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def start(self) -> None:
+        """Run the janitor periodically on a daemon thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="storage-janitor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(Config.STORAGE_JANITOR_INTERVAL_SECONDS):
+            try:
+                if self.acquire_leadership():
+                    self.run()
+            except Exception as e:
+                print(f"Error in storage janitor: {str(e)}")
+
+    def acquire_leadership(self) -> bool:
+        """Take the cross-process sweep lock if it is free; returns whether this process sweeps"""
+        if self._lock_file is not None or fcntl is None:
+            return True
+
+        lock_dir = os.path.dirname(self.lock_path)
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        # Held until the process exits, which releases it for another worker
+        self._lock_file = lock_file
+        print(f"Storage janitor sweeps in process {os.getpid()}")
+        return True
+
+    def _referenced_paths(self) -> Set[str]:
+        """
+        Collect absolute paths protected by the jobs and caches of every worker
+
+        Raises:
+            Exception: Whatever a provider raised; a sweep must not run on an incomplete set
+        """
+        referenced = set()
+        for provider in self.reference_providers:
+            referenced.update(os.path.abspath(path) for path in provider() if path)
+        return referenced
+
+    def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Sweep every folder once
+
+        Args:
+            dry_run: Only report what would be deleted
+
+        Returns:
+            Report with per-folder usage, deletions and freed bytes
+
+        Raises:
+            Exception: If the referenced files cannot be collected; nothing is deleted then
+        """
+        # One sweep at a time; a dry run must not interleave with a real one
+        with self._lock:
+            referenced = self._referenced_paths()
+            now = time.time()
+            report = {
+                "dry_run": dry_run,
+                "started_at": now,
+                "folders": {
+                    name: self._sweep_folder(policy, referenced, now, dry_run)
+                    for name, policy in self.policies.items()
+                }
+            }
+            report["freed_bytes"] = sum(folder["freed_bytes"] for folder in report["folders"].values())
+            report["duration_seconds"] = round(time.time() - now, 3)
+
+            if not dry_run:
+                self.last_report = report
+            return report
+
+    def _scan(self, folder: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        List regular files below folder with size and last access/modification time
+
+        Returns:
+            {"files": stored files, "incoming": scratch files of the store's .incoming folder}
+        """
+        scanned = {"files": [], "incoming": []}
+        for root, dirs, names in os.walk(folder):
+            incoming = LocalArtifactStore.INCOMING_FOLDER in os.path.relpath(root, folder).split(os.sep)
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                scanned["incoming" if incoming else "files"].append({
+                    "path": os.path.abspath(path),
+                    "name": name,
+                    "size": stat.st_size,
+                    "last_used": max(stat.st_atime, stat.st_mtime),
+                    "modified": stat.st_mtime
+                })
+        return scanned
+
+    def _group(self, files: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Group the files of one stored artifact so they are kept or deleted together
+
+        An artifact is its file, its metadata sidecar, temp files named after its key and the
+        variants listed in its metadata (an upload's pre-sized JPEGs). Other files stand alone.
+        """
+        meta_suffix = LocalArtifactStore.META_SUFFIX
+        group_ids = itertools.count()
+        group_of: Dict[str, int] = {}  # store key -> group id
+        members: Dict[int, List[Dict[str, Any]]] = {}
+
+        def group_for(key: str) -> int:
+            if key not in group_of:
+                group_of[key] = next(group_ids)
+                members[group_of[key]] = []
+            return group_of[key]
+
+        for f in files:
+            name = f["name"]
+            key = name[:-len(meta_suffix)] if name.endswith(meta_suffix) else name
+            if not ArtifactStore.is_valid_key(key):
+                # Temp files are named <key>.<random>.tmp
+                key = '.'.join(name.split('.')[:2])
+            if not ArtifactStore.is_valid_key(key):
+                members[next(group_ids)] = [f]
+                continue
+            group_id = group_for(key)
+            members[group_id].append(f)
+            if not name.endswith(meta_suffix):
+                continue
+
+            try:
+                with open(f["path"], 'r') as meta_file:
+                    variants = json.load(meta_file).get("variants") or {}
+                variant_keys = [variant["key"] for variant in variants.values()]
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                variant_keys = []
+            for variant_key in variant_keys:
+                other = group_for(variant_key)
+                if other == group_id:
+                    continue
+                # The variant was seen first (or belongs to another master too): merge the groups
+                members[group_id].extend(members.pop(other))
+                for grouped_key, grouped_id in group_of.items():
+                    if grouped_id == other:
+                        group_of[grouped_key] = group_id
+
+        return [group for group in members.values() if group]
+
+    def _sweep_folder(self, policy: Dict[str, Any], referenced: Set[str], now: float, dry_run: bool) -> Dict[str, Any]:
+        folder = policy["folder"]
+        scanned = self._scan(folder)
+        files = scanned["files"] + scanned["incoming"]
+        total_bytes = sum(f["size"] for f in files)
+        total_files = len(files)
+
+        # An artifact is protected, aged and evicted as a whole: a referenced or young member
+        # protects all of it, and its last use is that of its most recently used member
+        min_age = policy.get("min_age_seconds", Config.STORAGE_MIN_AGE_SECONDS)
+        groups = []
+        for group_files in self._group(scanned["files"]):
+            modified = max(f["modified"] for f in group_files)
+            groups.append({
+                "files": group_files,
+                "size": sum(f["size"] for f in group_files),
+                "last_used": max(f["last_used"] for f in group_files),
+                "modified": modified,
+                "protected": now - modified < min_age or any(f["path"] in referenced for f in group_files)
+            })
+        protected = [f for group in groups if group["protected"] for f in group["files"]]
+        candidates = [group for group in groups if not group["protected"]]
+
+        to_delete = []
+        reasons = {}
+
+        # Scratch files of the store's .incoming folder are half-written uploads and downloads;
+        # they are never referenced and only expire by age
+        incoming_max_age = policy.get("incoming_max_age_seconds", Config.STORAGE_INCOMING_MAX_AGE_SECONDS)
+        for f in scanned["incoming"]:
+            if now - f["modified"] > incoming_max_age:
+                group = {"files": [f], "size": f["size"]}
+                reasons[id(group)] = "incoming"
+                to_delete.append(group)
+
+        # Orphaned temp files and transient placeholders expire quickly
+        transient_patterns = policy.get("transient_patterns", [])
+        transient_max_age = policy.get("transient_max_age_seconds")
+        max_age = policy.get("max_age_seconds")
+        for group in candidates:
+            age = now - group["modified"]
+            if transient_max_age is not None and age > transient_max_age and all(
+                any(fnmatch.fnmatch(f["name"], pattern) for pattern in transient_patterns) for f in group["files"]
+            ):
+                reasons[id(group)] = "transient"
+            elif max_age is not None and age > max_age:
+                reasons[id(group)] = "age"
+
+        to_delete.extend(group for group in candidates if reasons.get(id(group)) in ("transient", "age"))
+        remaining_bytes = total_bytes - sum(group["size"] for group in to_delete)
+        remaining_files = total_files - sum(len(group["files"]) for group in to_delete)
+
+        # Then evict least recently used artifacts until within the byte and count quotas
+        max_bytes = policy.get("max_bytes")
+        max_files = policy.get("max_files")
+        for group in sorted((g for g in candidates if id(g) not in reasons), key=lambda g: g["last_used"]):
+            over_bytes = max_bytes is not None and remaining_bytes > max_bytes
+            over_files = max_files is not None and remaining_files > max_files
+            if not over_bytes and not over_files:
+                break
+            reasons[id(group)] = "quota"
+            to_delete.append(group)
+            remaining_bytes -= group["size"]
+            remaining_files -= len(group["files"])
+
+        freed_bytes = 0
+        deleted = []
+        for group in to_delete:
+            # The metadata sidecar goes last: after an interrupted sweep it still ties the
+            # leftover variants together for the next one
+            for f in sorted(group["files"], key=lambda f: f["name"].endswith(LocalArtifactStore.META_SUFFIX)):
+                if not dry_run:
+                    try:
+                        os.remove(f["path"])
+                    except OSError as e:
+                        print(f"Error deleting {f['path']}: {str(e)}")
+                        continue
+                freed_bytes += f["size"]
+                deleted.append({"name": f["name"], "size": f["size"], "reason": reasons[id(group)]})
+
+        if not dry_run and deleted:
+            print(f"Storage janitor freed {freed_bytes} bytes from {folder} ({len(deleted)} files)")
+
+        return {
+            "folder": folder,
+            "files": total_files,
+            "bytes": total_bytes,
+            "protected_files": len(protected),
+            "deleted": deleted,
+            "freed_bytes": freed_bytes,
+            "remaining_files": total_files - len(deleted),
+            "remaining_bytes": total_bytes - freed_bytes,
+            "over_quota": (max_bytes is not None and total_bytes - freed_bytes > max_bytes)
+            or (max_files is not None and total_files - len(deleted) > max_files)
+        }
@@ -0,0 +1,281 @@
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+
+class ArtifactStore:
+    """
+    Content-addressed storage for uploads and generated artifacts
+
+    Keys are the SHA-256 of the stored bytes plus a file extension, so storing
+    identical bytes twice returns the same key and costs no extra space.
+    """
+
+    KEY_PATTERN = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]{1,8})?$')
+
+    @staticmethod
+    def normalize_extension(extension: str) -> str:
+        """Return a lowercase extension with a leading dot ('' stays '')"""
+        extension = (extension or '').lower().lstrip('.')
+        if extension == 'jpeg':
+            extension = 'jpg'
+        return f".{extension}" if extension else ''
+
+    @classmethod
+    def make_key(cls, digest: str, extension: str = '') -> str:
+        return digest + cls.normalize_extension(extension)
+
+    @classmethod
+    def is_valid_key(cls, key: str) -> bool:
+        """Check that key has the shape of a store key (also rules out path traversal)"""
+        return bool(key) and cls.KEY_PATTERN.match(key) is not None
+
+    def put(self, data: bytes, extension: str = '') -> str:
+        """Store bytes and return their key; identical bytes are stored once"""
+        raise NotImplementedError
+
+    def put_file(self, source_path: str, extension: str = '') -> str:
+        """Move a finished file into the store and return its key"""
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        key = self.put(data, extension)
+        os.remove(source_path)
+        return key
+
+    def incoming_path(self, extension: str = '') -> str:
+        """Return a fresh scratch path for writing a file that will be passed to put_file"""
+        fd, path = tempfile.mkstemp(suffix=self.normalize_extension(extension))
+        os.close(fd)
+        return path
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored bytes for key, or None if missing"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def path(self, key: str) -> Optional[str]:
+        """Return a local file path for key, or None if missing or not kept on local disk"""
+        return None
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def put_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        """Attach a JSON-serializable metadata record to a stored artifact"""
+        raise NotImplementedError
+
+    def get_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the metadata record of an artifact, or None"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Artifact store on the local filesystem, sharded as root/ab/cd/<key>"""
+
+    SHARD_LEVELS = 2
+    SHARD_WIDTH = 2
+    INCOMING_FOLDER = '.incoming'
+    META_SUFFIX = '.meta.json'  # metadata sidecar next to the artifact
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(os.path.join(self.root, self.INCOMING_FOLDER), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.deduplicated = 0
+
+    def _path_for(self, key: str) -> str:
+        shards = [key[i * self.SHARD_WIDTH:(i + 1) * self.SHARD_WIDTH] for i in range(self.SHARD_LEVELS)]
+        return os.path.join(self.root, *shards, key)
+
+    def _touch(self, path: str) -> None:
+        """Refresh the access time only; the mtime keys derived caches and must not change"""
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def put(self, data: bytes, extension: str = '') -> str:
+        key = self.make_key(hashlib.sha256(data).hexdigest(), extension)
+        path = self._path_for(key)
+
+        if os.path.exists(path):
+            self._touch(path)
+            with self._lock:
+                self.deduplicated += 1
+            return key
+
+        # Write to a temp file in the same directory, then rename into place so readers
+        # never observe a partially written artifact
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            self._remove_file(temp_path)
+            raise
+
+        with self._lock:
+            self.writes += 1
+        return key
+
+    def put_file(self, source_path: str, extension: str = '') -> str:
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+
+        key = self.make_key(digest.hexdigest(), extension)
+        path = self._path_for(key)
+
+        if os.path.exists(path):
+            self._remove_file(source_path)
+            self._touch(path)
+            with self._lock:
+                self.deduplicated += 1
+            return key
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Scratch files live under the store root, so this is an atomic rename
+        os.replace(source_path, path)
+        with self._lock:
+            self.writes += 1
+        return key
+
+    def incoming_path(self, extension: str = '') -> str:
+        return os.path.join(
+            self.root, self.INCOMING_FOLDER, f"{uuid.uuid4().hex}{self.normalize_extension(extension)}"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return self.path(key) is not None
+
+    def path(self, key: str) -> Optional[str]:
+        if not self.is_valid_key(key):
+            return None
+        path = self._path_for(key)
+        return path if os.path.exists(path) else None
+
+    def delete(self, key: str) -> bool:
+        path = self.path(key)
+        if path is None:
+            return False
+        self._remove_file(f"{path}{self.META_SUFFIX}")
+        return self._remove_file(path)
+
+    def put_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        if not self.is_valid_key(key):
+            raise ValueError(f"Invalid artifact key: {key}")
+        meta_path = f"{self._path_for(key)}{self.META_SUFFIX}"
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+        temp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(meta, f)
+            os.replace(temp_path, meta_path)
+        except OSError:
+            self._remove_file(temp_path)
+            raise
+
+    def get_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.is_valid_key(key):
+            return None
+        try:
+            with open(f"{self._path_for(key)}{self.META_SUFFIX}", 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_file(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "local",
+                "root": self.root,
+                "writes": self.writes,
+                "deduplicated": self.deduplicated
+            }
+
+
+class MemoryArtifactStore(ArtifactStore):
+    """In-process artifact store for tests; artifacts have no local file path"""
+
+    def __init__(self):
+        self._artifacts: Dict[str, bytes] = {}
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.deduplicated = 0
+
+    def put(self, data: bytes, extension: str = '') -> str:
+        key = self.make_key(hashlib.sha256(data).hexdigest(), extension)
+        with self._lock:
+            if key in self._artifacts:
+                self.deduplicated += 1
+            else:
+                self._artifacts[key] = bytes(data)
+                self.writes += 1
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._artifacts.get(key)
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return key in self._artifacts
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            self._meta.pop(key, None)
+            return self._artifacts.pop(key, None) is not None
+
+    def put_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        with self._lock:
+            self._meta[key] = json.loads(json.dumps(meta))
+
+    def get_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            meta = self._meta.get(key)
+            return json.loads(json.dumps(meta)) if meta is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "artifacts": len(self._artifacts),
+                "bytes": sum(len(data) for data in self._artifacts.values()),
+                "writes": self.writes,
+                "deduplicated": self.deduplicated
+            }
@@ -2,30 +2,46 @@ import os
 import base64
 import mimetypes
 import asyncio
-import uuid
 import time
-from urllib.request import urlretrieve
-from typing import List, Dict, Any
-import fal_client
+import hashlib
+from typing import List, Dict, Any, Callable, Optional
 from config import Config
 from models import VideoGeneration, ShoeVideoGeneration
+from services.singleflight import AsyncSingleFlight
+from services.storage_service import ArtifactStore, LocalArtifactStore
+from services.metrics import metrics
+from services.resilience import resilience
 
 class VideoService:
     """Service class for video generation using FAL AI"""
     
-    def __init__(self):
-        """Initialize video service"""
-        if Config.FAL_KEY:
-            fal_client.api_key = Config.FAL_KEY
-        else:
-            raise ValueError("FAL_KEY not found in environment variables")
+    def __init__(self, video_store: ArtifactStore = None):
+        """Initialize video service; rendered videos are written to video_store"""
+        # Imported here rather than at module level to keep app start-up fast; without
+        # FAL_KEY individual renders fail instead of the constructor raising
+        import fal_client
+        self.fal = fal_client.AsyncClient(key=Config.FAL_KEY or None)
         
-        # Create video output directory
-        self.output_folder = "backend/generated_videos"
-        os.makedirs(self.output_folder, exist_ok=True)
+        self.store = video_store or LocalArtifactStore(Config.VIDEO_FOLDER)
+        
+        # Per-stage concurrency limits for the image -> render -> download pipeline
+        self.image_stage_slots = asyncio.Semaphore(Config.VIDEO_IMAGE_STAGE_CONCURRENCY)
+        self.render_stage_slots = asyncio.Semaphore(Config.VIDEO_RENDER_STAGE_CONCURRENCY)
+        self.download_stage_slots = asyncio.Semaphore(Config.VIDEO_DOWNLOAD_STAGE_CONCURRENCY)
+        
+        # Identical concurrent renders (same image bytes, shoe and angle) share one FAL call
+        self.inflight = AsyncSingleFlight("video")
+    
+    def video_url_for(self, video_path: str) -> str:
+        """Return the server-relative URL under which a generated video is served"""
+        return f"/videos/{os.path.basename(video_path)}"
     
-    async def generate_video_for_image(self, image_path: str, shoe_name: str, angle: str) -> str:
-        """Generate a video for a specific image and shoe"""
+    def path_for_url(self, video_url: str) -> Optional[str]:
+        """Map a video URL returned by video_url_for back to its file, if still stored"""
+        return self.store.path(os.path.basename(video_url))
+    
+    async def generate_video_for_image(self, image_path: str, shoe_name: str, angle: str, prompt: str = None) -> str:
+        """Generate a video for a specific image and shoe; prompt replaces the default fit-check prompt"""
         try:
             # Verify the image file exists and is readable
             if not os.path.exists(image_path):
@@ -40,105 +56,153 @@ class VideoService:
             
             # Read and encode the image
             mime = mimetypes.guess_type(image_path)[0] or "image/png"
-            with open(image_path, "rb") as f:
-                image_data = f.read()
-                b64 = base64.b64encode(image_data).decode("utf-8")
-            data_uri = f"data:{mime};base64,{b64}"
+            with metrics.span('video.encode_image'):
+                with open(image_path, "rb") as f:
+                    image_data = f.read()
+                    b64 = base64.b64encode(image_data).decode("utf-8")
+                data_uri = f"data:{mime};base64,{b64}"
             
             print(f"Image encoded successfully, data URI length: {len(data_uri)}")
-
-            # Create unique filename
-            timestamp = int(time.time())
-            unique_id = str(uuid.uuid4())[:8]
-            output_filename = f"fitcheck_{angle}_{unique_id}_{timestamp}.mp4"
-            output_path = os.path.join(self.output_folder, output_filename)
-
-            # Generate the video
-            print(f"Generating video for {angle} angle with {shoe_name}...")
             
-            # Run the FAL client call in a thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
-                lambda: fal_client.run(
-                    "fal-ai/veo3/fast/image-to-video",
-                    arguments={
-                        "prompt": f"A cinematic video of a person doing a casual fit check in front of a mirror. The camera smoothly rotates to capture front, back, left, and right views. The environment is bright, well-lit, and stylish. The focus is primarily on the sneakers: close-up shots, slow pans, zooms, and dramatic angles highlight how the sneakers pair with the outfit. Do not change anything about the shoe — its design, color, and details must remain exactly the same. They are wearing {shoe_name}. The rest of the clothing remains secondary, slightly blurred or framed to keep attention on the sneakers. Natural gestures, like adjusting pants or shifting weight, emphasize the sneakers as the centerpiece of the drip.",
-                        "image_url": data_uri,
-                        "duration": "8s",
-                        "generate_audio": False,
-                        "resolution": "720p",
-                    }
-                )
-            )
-
-            # Save the video
-            print(f"Saving video to: {output_path}")
-            await loop.run_in_executor(
-                None,
-                lambda: urlretrieve(result["video"]["url"], output_path)
+            render_key = hashlib.sha256(image_data + f":{shoe_name}:{angle}:{prompt or ''}".encode('utf-8')).hexdigest()
+            return await self.inflight.do(
+                render_key,
+                lambda: self._render_and_save(data_uri, shoe_name, angle, prompt)
             )
             
-            return output_path
-            
         except Exception as e:
             print(f"Error generating video for {angle}: {str(e)}")
             raise e
     
-    async def generate_videos_for_shoe(self, original_image_path: str, shoe: Dict[str, str], front_angle_image_path: str) -> ShoeVideoGeneration:
-        """Generate videos for a single shoe using the front angle image"""
+    async def _render_and_save(self, data_uri: str, shoe_name: str, angle: str, prompt: str = None) -> str:
+        """Render a video, download it and move it into the video store; returns its path"""
+        # Generate the video
+        print(f"Generating video for {angle} angle with {shoe_name}...")
+        video_url = await self._render_in_slot(data_uri, shoe_name, prompt)
+
+        # Download to a scratch file, then store it under its content hash
+        download_path = self.store.incoming_path('.mp4')
+        try:
+            await resilience.call_async('fal', lambda: self._download_in_slot(video_url, download_path))
+        except Exception:
+            if os.path.exists(download_path):
+                os.remove(download_path)
+            raise
+        
+        with metrics.span('video.store'):
+            video_key = self.store.put_file(download_path, '.mp4')
+        output_path = self.store.path(video_key)
+        print(f"Saved video to: {output_path}")
+        return output_path
+    
+    async def _render_in_slot(self, data_uri: str, shoe_name: str, prompt: str = None) -> str:
+        """Render within the render stage limit; the slot is held until FAL has finished the render"""
+        waiting_since = time.perf_counter()
+        async with self.render_stage_slots:
+            metrics.observe('video.render_slot_wait', time.perf_counter() - waiting_since)
+            with metrics.span('video.render'):
+                return await asyncio.wait_for(
+                    self._render_video(data_uri, shoe_name, prompt), Config.VIDEO_RENDER_TIMEOUT_SECONDS
+                )
+    
+    async def _download_in_slot(self, video_url: str, output_path: str) -> None:
+        """One download attempt within the download stage limit"""
+        async with self.download_stage_slots:
+            with metrics.span('video.download'):
+                await self._download_video(video_url, output_path)
+    
+    async def _render_video(self, data_uri: str, shoe_name: str, prompt: str = None) -> str:
+        """
+        Run the FAL image-to-video model and return the URL of the rendered video
+
+        The render is queued once and then polled. Retries only repeat the submission (which FAL
+        rejected) or the polling of the same request, so a render that is still running and billed
+        is never started a second time.
+        """
+        # Awaited on the event loop; a pending render holds no thread
+        handle = await resilience.call_async('fal', lambda: self._submit_render(data_uri, shoe_name, prompt))
+        return await resilience.call_async('fal', lambda: self._render_result(handle))
+    
+    async def _submit_render(self, data_uri: str, shoe_name: str, prompt: str = None):
+        """Queue a render with FAL; returns its request handle"""
+        return await self.fal.submit(
+            "fal-ai/veo3/fast/image-to-video",
+            arguments={
+                "prompt": prompt or f"A cinematic video of a person doing a casual fit check in front of a mirror. The camera smoothly rotates to capture front, back, left, and right views. The environment is bright, well-lit, and stylish. The focus is primarily on the sneakers: close-up shots, slow pans, zooms, and dramatic angles highlight how the sneakers pair with the outfit. Do not change anything about the shoe — its design, color, and details must remain exactly the same. They are wearing {shoe_name}. The rest of the clothing remains secondary, slightly blurred or framed to keep attention on the sneakers. Natural gestures, like adjusting pants or shifting weight, emphasize the sneakers as the centerpiece of the drip.",
+                "image_url": data_uri,
+                "duration": "8s",
+                "generate_audio": False,
+                "resolution": "720p",
+            }
+        )
+    
+    async def _render_result(self, handle) -> str:
+        """Wait for a queued render to finish and return its video URL"""
+        async for _ in handle.iter_events(interval=Config.VIDEO_RENDER_POLL_INTERVAL_SECONDS):
+            pass
+        result = await handle.get()
+        return result["video"]["url"]
+    
+    async def _download_video(self, video_url: str, output_path: str) -> None:
+        """Stream a rendered video to a local file"""
+        import httpx
+        
+        timeout = httpx.Timeout(Config.VIDEO_DOWNLOAD_TIMEOUT_SECONDS)
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+            async with client.stream("GET", video_url) as response:
+                response.raise_for_status()
+                with open(output_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(Config.VIDEO_DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+    
+    async def _run_shoe_pipeline(self, index: int, shoe: Dict[str, str], image_stage: Callable[[Dict[str, str]], str],
+                                 executor, on_result: Optional[Callable[[int, ShoeVideoGeneration], None]]) -> ShoeVideoGeneration:
+        """Run one shoe through the image, render and download stages"""
         shoe_name = f"{shoe.get('brand', '')} {shoe.get('name', '')} in {shoe.get('color', '')}"
-        videos = []
+        loop = asyncio.get_running_loop()
         
         try:
-            # Generate video for the front angle image
-            video_path = await self.generate_video_for_image(front_angle_image_path, shoe_name, "front")
-            
-            # Convert video to base64 for serving
-            with open(video_path, 'rb') as video_file:
-                video_base64 = base64.b64encode(video_file.read()).decode('utf-8')
-            
-            videos.append(VideoGeneration(
-                angle="front",
-                video_url=f"data:video/mp4;base64,{video_base64}",
-                status="completed"
-            ))
+            # Image stage: coroutine stages are awaited, blocking ones run on the given executor
+            async with self.image_stage_slots:
+                if asyncio.iscoroutinefunction(image_stage):
+                    front_angle_image_path = await image_stage(shoe)
+                else:
+                    front_angle_image_path = await loop.run_in_executor(executor, image_stage, shoe)
             
+            # Render and download stages start as soon as this shoe's image exists
+            video_path = await self.generate_video_for_image(front_angle_image_path, shoe_name, "front")
+            result = ShoeVideoGeneration(
+                shoe=shoe,
+                videos=[VideoGeneration(angle="front", video_url=self.video_url_for(video_path), status="completed")]
+            )
         except Exception as e:
             print(f"Error generating video for shoe {shoe_name}: {str(e)}")
-            videos.append(VideoGeneration(
-                angle="front",
-                video_url="",
-                status="failed"
-            ))
+            result = ShoeVideoGeneration(
+                shoe=shoe,
+                videos=[VideoGeneration(angle="front", video_url="", status="failed")]
+            )
         
-        return ShoeVideoGeneration(
-            shoe=shoe,
-            videos=videos
-        )
+        if on_result:
+            on_result(index, result)
+        return result
     
-    async def generate_videos_for_all_shoes(self, original_image_path: str, shoes: List[Dict[str, str]], front_angle_images: List[str]) -> List[ShoeVideoGeneration]:
-        """Generate videos for all shoes asynchronously"""
-        tasks = []
+    async def generate_videos_pipeline(self, shoes: List[Dict[str, str]], image_stage: Callable[[Dict[str, str]], str],
+                                       executor=None,
+                                       on_result: Optional[Callable[[int, ShoeVideoGeneration], None]] = None) -> List[ShoeVideoGeneration]:
+        """
+        Generate videos with an independent image -> render -> download pipeline per shoe
         
-        for i, shoe in enumerate(shoes):
-            if i < len(front_angle_images):
-                task = self.generate_videos_for_shoe(original_image_path, shoe, front_angle_images[i])
-                tasks.append(task)
-        
-        # Execute all video generation tasks concurrently
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Process results and handle exceptions
-        processed_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                print(f"Error processing shoe {i}: {str(result)}")
-                processed_results.append(ShoeVideoGeneration(
-                    shoe=shoes[i] if i < len(shoes) else {},
-                    videos=[VideoGeneration(angle="front", video_url="", status="failed")]
-                ))
-            else:
-                processed_results.append(result)
-        
-        return processed_results
+        Args:
+            shoes: Shoe recommendations to render
+            image_stage: Function (or coroutine function) returning the front angle image path for a shoe
+            executor: Executor for a blocking image stage (default executor when None)
+            on_result: Optional callback invoked with (index, result) as each shoe finishes
+            
+        Returns:
+            Per-shoe video results in the order of ``shoes``
+        """
+        tasks = [
+            self._run_shoe_pipeline(i, shoe, image_stage, executor, on_result)
+            for i, shoe in enumerate(shoes)
+        ]
+        return list(await asyncio.gather(*tasks))
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config import Config
+from services.admission import AdmissionController, AdmissionRejected
+
+
+def make_controller(capacity=4, **overrides):
+    classes = {
+        'interactive': dict(priority=0, max_concurrent=4, max_queue=8, queue_timeout_seconds=1.0, expected_seconds=1.0),
+        'heavy': dict(priority=1, max_concurrent=1, max_queue=1, queue_timeout_seconds=1.0, expected_seconds=10.0),
+    }
+    for name, settings in overrides.items():
+        classes[name].update(settings)
+    return AdmissionController(capacity=capacity, classes=classes,
+                               endpoints={'analyze': 'interactive', 'videos': 'heavy'}, enabled=True)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_class_for_maps_only_managed_endpoints():
+    controller = make_controller()
+    assert controller.class_for('videos') == 'heavy'
+    assert controller.class_for('static') is None
+    assert controller.class_for(None) is None
+
+    disabled = AdmissionController(capacity=1, classes={}, endpoints={'videos': 'heavy'}, enabled=False)
+    assert disabled.class_for('videos') is None
+
+
+def test_admits_immediately_while_under_budget():
+    controller = make_controller()
+    tickets = [controller.acquire('interactive') for _ in range(3)]
+    assert controller.stats()["in_flight"] == 3
+    for ticket in tickets:
+        controller.release(ticket)
+    assert controller.stats()["in_flight"] == 0
+    assert controller.stats()["classes"]["interactive"]["admitted"] == 3
+
+
+def test_queued_request_runs_when_a_slot_frees():
+    controller = make_controller()
+    first = controller.acquire('heavy')
+    result = {}
+
+    def waiter():
+        result["ticket"] = controller.acquire('heavy')
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    wait_until(lambda: controller.stats()["classes"]["heavy"]["waiting"] == 1)
+
+    controller.release(first)
+    thread.join(2)
+    assert result["ticket"].priority_class == 'heavy'
+    stats = controller.stats()["classes"]["heavy"]
+    assert (stats["in_flight"], stats["waiting"], stats["queued"]) == (1, 0, 1)
+
+
+def test_rejects_when_the_class_queue_is_full():
+    controller = make_controller(heavy=dict(queue_timeout_seconds=2.0))
+    held = controller.acquire('heavy')
+    queued = threading.Thread(target=lambda: controller.release(controller.acquire('heavy')))
+    queued.start()
+    wait_until(lambda: controller.stats()["classes"]["heavy"]["waiting"] == 1)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire('heavy')
+    assert excinfo.value.reason == "queue full"
+    assert excinfo.value.priority_class == 'heavy'
+    # One running plus one queued plus this request, at ten seconds each on a single slot
+    assert excinfo.value.retry_after == 30
+    assert controller.stats()["classes"]["heavy"]["rejected_queue_full"] == 1
+
+    controller.release(held)
+    queued.join(2)
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_rejects_when_the_queue_wait_times_out():
+    controller = make_controller(heavy=dict(queue_timeout_seconds=0.05))
+    held = controller.acquire('heavy')
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire('heavy')
+    assert excinfo.value.reason == "queue wait timed out"
+    assert excinfo.value.retry_after >= 1
+    stats = controller.stats()["classes"]["heavy"]
+    assert (stats["waiting"], stats["rejected_timeout"]) == (0, 1)
+    controller.release(held)
+
+
+def test_retry_after_is_clamped(monkeypatch):
+    monkeypatch.setattr(Config, 'ADMISSION_MAX_RETRY_AFTER_SECONDS', 15)
+    controller = make_controller(heavy=dict(max_queue=0, expected_seconds=600.0))
+    held = controller.acquire('heavy')
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire('heavy')
+    assert excinfo.value.retry_after == 15
+    controller.release(held)
+
+
+def test_heavy_budget_leaves_room_for_interactive_requests():
+    controller = make_controller(capacity=2, heavy=dict(max_queue=0))
+    heavy = controller.acquire('heavy')
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('heavy')
+    interactive = controller.acquire('interactive')
+    assert controller.stats()["in_flight"] == 2
+    controller.release(heavy)
+    controller.release(interactive)
+
+
+def test_waiters_are_served_highest_priority_first():
+    controller = make_controller(capacity=1, heavy=dict(max_queue=4, queue_timeout_seconds=2.0),
+                                 interactive=dict(queue_timeout_seconds=2.0))
+    held = controller.acquire('interactive')
+    order = []
+
+    def run(class_name):
+        ticket = controller.acquire(class_name)
+        order.append(class_name)
+        controller.release(ticket)
+
+    heavy = threading.Thread(target=run, args=('heavy',))
+    heavy.start()
+    wait_until(lambda: controller.stats()["classes"]["heavy"]["waiting"] == 1)
+    interactive = threading.Thread(target=run, args=('interactive',))
+    interactive.start()
+    wait_until(lambda: controller.stats()["classes"]["interactive"]["waiting"] == 1)
+
+    controller.release(held)
+    heavy.join(2)
+    interactive.join(2)
+    assert order == ['interactive', 'heavy']
+
+
+def test_async_acquire_queues_without_blocking_the_loop():
+    controller = make_controller()
+
+    async def scenario():
+        held = await controller.acquire_async('heavy')
+        pending = asyncio.ensure_future(controller.acquire_async('heavy'))
+        await asyncio.sleep(0.01)
+        assert not pending.done()
+
+        controller.release(held)
+        ticket = await asyncio.wait_for(pending, 1)
+        controller.release(ticket)
+
+    asyncio.run(scenario())
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    controller = make_controller()
+
+    async def scenario():
+        held = await controller.acquire_async('heavy')
+        pending = asyncio.ensure_future(controller.acquire_async('heavy'))
+        await asyncio.sleep(0.01)
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        controller.release(held)
+
+    asyncio.run(scenario())
+    stats = controller.stats()
+    assert (stats["in_flight"], stats["classes"]["heavy"]["waiting"]) == (0, 0)
@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from services import cache_service
+from services.cache_service import ArtifactCache, TieredCache
+from utils import MemoryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('utils.time.time', clock.time)
+    monkeypatch.setattr(cache_service.time, 'time', clock.time)
+    return clock
+
+
+def write_file(folder, name, size):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return path
+
+
+def test_memory_cache_expires_entries(clock):
+    cache = MemoryCache(ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=30)
+    clock.now += 11
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_cache_keeps_within_its_byte_budget():
+    cache = MemoryCache(max_entries=100, max_bytes=10, sizeof=len)
+    cache.set('a', b'1234')
+    cache.set('b', b'5678')
+    cache.set('c', b'90ab')
+    assert cache.get('a') is None
+    assert cache.stats()["bytes"] == 8
+
+    # A value larger than the whole budget is not stored and flushes nothing
+    cache.set('huge', b'x' * 11)
+    assert cache.get('huge') is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_memory_cache_counts_hits_and_misses():
+    cache = MemoryCache()
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('missing')
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+
+def test_tiered_cache_answers_from_disk_after_a_restart(tmp_path):
+    TieredCache(str(tmp_path), ttl=60).set('key', {'shoes': [1, 2]})
+    restarted = TieredCache(str(tmp_path), ttl=60)
+    assert restarted.get('key') == {'shoes': [1, 2]}
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_tiered_cache_expires_disk_entries(tmp_path, clock):
+    TieredCache(str(tmp_path), ttl=60).set('key', 'value')
+    clock.now += 61
+    assert TieredCache(str(tmp_path), ttl=60).get('key') is None
+    assert not os.path.exists(tmp_path / 'key.json')
+
+
+def test_tiered_cache_bounds_the_disk_tier(tmp_path):
+    cache = TieredCache(str(tmp_path), disk_entries=2)
+    for index, key in enumerate(('a', 'b', 'c')):
+        cache.set(key, key)
+        os.utime(tmp_path / f'{key}.json', (index, index))
+    cache.set('d', 'd')
+    assert sorted(os.listdir(tmp_path)) == ['c.json', 'd.json']
+
+
+def test_artifact_index_is_shared_between_instances(tmp_path):
+    path = write_file(tmp_path, 'image.jpg', 10)
+    first = ArtifactCache(str(tmp_path / 'index.sqlite3'))
+    second = ArtifactCache(str(tmp_path / 'index.sqlite3'))
+    first.put('key', path, meta={'angle': 'front'})
+    assert second.get('key') == path
+    assert second.paths() == {path}
+
+
+def test_artifact_eviction_drops_entries_but_keeps_files(tmp_path, clock):
+    cache = ArtifactCache(str(tmp_path / 'index.sqlite3'), max_entries=10, max_bytes=25)
+    paths = [write_file(tmp_path, f'{name}.jpg', 10) for name in 'abc']
+    for name, path in zip('abc', paths):
+        cache.put(name, path)
+        clock.now += 1
+
+    assert cache.get('a') is None
+    assert all(os.path.exists(path) for path in paths)
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+
+
+def test_artifact_hits_persist_recency(tmp_path, clock):
+    index = str(tmp_path / 'index.sqlite3')
+    cache = ArtifactCache(index, max_entries=2)
+    old, new = write_file(tmp_path, 'old.jpg', 1), write_file(tmp_path, 'new.jpg', 1)
+    cache.put('old', old)
+    clock.now += 1
+    cache.put('new', new)
+    clock.now += ArtifactCache.TOUCH_INTERVAL_SECONDS + 1
+    cache.get('old')
+
+    # Another process sees the hit, so 'new' is now the least recently used
+    ArtifactCache(index, max_entries=2).put('third', write_file(tmp_path, 'third.jpg', 1))
+    assert cache.get('old') == old
+    assert cache.get('new') is None
+
+
+def test_artifact_entry_for_a_deleted_file_is_dropped(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'index.sqlite3'))
+    path = write_file(tmp_path, 'gone.jpg', 1)
+    cache.put('key', path)
+    os.remove(path)
+    assert cache.get('key') is None
+    assert cache.paths() == set()
+
+
+def test_artifact_cache_imports_a_legacy_json_index(tmp_path):
+    path = write_file(tmp_path, 'image.jpg', 3)
+    legacy = {
+        'kept': {'path': path, 'size': 3, 'last_used': 1.0, 'meta': {}},
+        'missing': {'path': str(tmp_path / 'gone.jpg'), 'size': 3, 'last_used': 1.0, 'meta': {}}
+    }
+    (tmp_path / 'index.json').write_text(json.dumps(legacy))
+
+    cache = ArtifactCache(str(tmp_path / 'index.sqlite3'))
+    assert cache.paths() == {path}
+    assert not (tmp_path / 'index.json').exists()
+    with sqlite3.connect(str(tmp_path / 'index.sqlite3')) as db:
+        assert db.execute('SELECT COUNT(*) FROM artifacts').fetchone() == (1,)
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from config import Config
+from services.catalog_service import ProductCatalog
+
+
+def write_catalog(path, products):
+    path.write_text(json.dumps(products))
+    return ProductCatalog(str(path))
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return write_catalog(tmp_path / "catalog.json", [
+        {"id": "af1-white", "brand": "Nike", "name": "Air Force 1 '07", "color": "White", "style": "sneakers",
+         "url": "https://example.com/af1-white", "title": "Nike Air Force 1 '07 - White"},
+        {"id": "aj1", "brand": "Nike", "name": "Air Jordan 1", "color": "Black/Red", "style": "sneakers",
+         "url": "https://example.com/aj1", "title": "Air Jordan 1 Retro High OG"},
+        {"id": "chuck-white", "brand": "Converse", "name": "Chuck Taylor All Star", "color": "White",
+         "style": "sneakers", "url": "https://example.com/chuck-white"},
+        {"id": "chuck-red", "brand": "Converse", "name": "Chuck Taylor All Star", "color": "Red",
+         "style": "sneakers", "url": "https://example.com/chuck-red"},
+    ])
+
+
+def shoe(brand, name, color, style="sneakers"):
+    return {"brand": brand, "name": name, "color": color, "style": style}
+
+
+def test_exact_product_is_confident(catalog):
+    matches = catalog.confident_matches(shoe("Nike", "Air Force 1", "White"))
+    assert [product["id"] for product in matches] == ["af1-white"]
+    assert catalog.stats()["hits"] == 1
+
+
+def test_wrong_color_falls_through(catalog):
+    assert catalog.confident_matches(shoe("Nike", "Air Force 1", "Black")) == []
+    assert catalog.stats()["misses"] == 1
+
+
+def test_same_brand_other_model_is_not_confident(catalog):
+    matches = catalog.confident_matches(shoe("Nike", "Air Force 1", "Black/Red"))
+    assert matches == []
+
+
+def test_confidence_is_checked_before_the_limit(catalog):
+    # The white Chuck Taylor ranks as high as the red one; the red one must still be found with limit=1
+    matches = catalog.confident_matches(shoe("Converse", "Chuck Taylor All Star", "Red"), limit=1)
+    assert [product["id"] for product in matches] == ["chuck-red"]
+
+
+def test_missing_field_is_not_confident(catalog):
+    assert catalog.confident_matches({"brand": "Nike", "name": "Air Force 1"}) == []
+
+
+def test_field_confidence_scores_each_field(catalog):
+    product = {"brand": "Nike", "name": "Air Jordan 1", "title": "Air Jordan 1 Retro High OG", "color": "Black/Red"}
+    confidence = catalog.field_confidence(shoe("Nike", "Air Force 1", "Black"), product)
+    assert confidence["brand"] == 1.0
+    assert confidence["color"] == 1.0
+    assert confidence["name"] == pytest.approx(2 / 3)
+
+
+def test_shipped_catalog_rejects_reported_mismatches():
+    catalog = ProductCatalog(Config.PRODUCT_CATALOG_PATH)
+    assert catalog.confident_matches(shoe("Nike", "Air Force 1", "Black")) == []
+    assert catalog.confident_matches(shoe("Converse", "Chuck Taylor All Star", "Red")) == []
+    assert catalog.confident_matches(shoe("Nike", "Air Force 1", "White"))
+
+
+def test_search_ranks_all_matches_without_limit(catalog):
+    ranked = catalog.search("Converse Chuck Taylor", limit=None)
+    assert {product["id"] for _, _, product in ranked} >= {"chuck-white", "chuck-red"}
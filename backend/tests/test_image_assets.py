@@ -0,0 +1,91 @@
+import importlib
+import io
+
+import pytest
+from PIL import Image
+
+from config import Config
+from services.asset_service import ImageAssetService
+from services.storage_service import LocalArtifactStore
+
+
+def jpeg(size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'CACHE_FOLDER', str(tmp_path / 'cache'))
+    return ImageAssetService(LocalArtifactStore(str(tmp_path / 'generated')))
+
+
+@pytest.fixture
+def client(assets, monkeypatch):
+    monkeypatch.setattr(Config, 'STORAGE_JANITOR_ENABLED', False)
+    app_module = importlib.import_module('app')
+    monkeypatch.setattr(app_module, 'image_assets', assets)
+    return app_module.app.test_client()
+
+
+def webp_supported(assets):
+    return any(entry[0] == 'image/webp' for entry in assets.supported_formats)
+
+
+def test_negotiation_only_picks_formats_listed_explicitly(assets):
+    assert assets.negotiate_format('') is None
+    assert assets.negotiate_format('*/*') is None
+    assert assets.negotiate_format('image/*') is None
+    assert assets.negotiate_format('image/jpeg,image/png') is None
+    if webp_supported(assets):
+        assert assets.negotiate_format('image/webp,*/*;q=0.8')[0] == 'image/webp'
+        assert assets.negotiate_format('image/webp;q=0') is None
+        assert assets.negotiate_format('IMAGE/WEBP ; q=0.5')[0] == 'image/webp'
+
+
+def test_renditions_are_rendered_once_and_indexed(assets):
+    key = assets.store.put(jpeg(), '.jpg')
+    first = assets.rendition(key, 'thumb')
+    second = assets.rendition(key, 'thumb')
+
+    assert first == second and first["mimetype"] == 'image/jpeg'
+    with Image.open(first["path"]) as thumb:
+        assert max(thumb.size) == Config.IMAGE_ASSET_SIZES['thumb']
+    assert assets.stats()["hits"] == 1 and assets.stats()["misses"] == 1
+
+
+def test_full_size_without_a_preferred_format_serves_the_source(assets):
+    key = assets.store.put(jpeg(), '.jpg')
+    assert assets.rendition(key)["path"] == assets.store.path(key)
+    assert assets.rendition('0' * 64 + '.jpg') is None
+    with pytest.raises(ValueError, match="Unknown size"):
+        assets.rendition(key, 'huge')
+
+
+def test_route_negotiates_and_varies_on_accept(client, assets):
+    key = assets.store.put(jpeg(), '.jpg')
+    response = client.get(f'/images/{key}?size=medium', headers={'Accept': 'image/webp,image/*'})
+    assert response.status_code == 200
+    assert 'Accept' in response.headers['Vary']
+    expected = 'image/webp' if webp_supported(assets) else 'image/jpeg'
+    assert response.mimetype == expected
+
+
+def test_route_answers_304_for_a_matching_etag(client, assets):
+    key = assets.store.put(jpeg(), '.jpg')
+    response = client.get(f'/images/{key}')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and etag
+    assert response.cache_control.max_age <= Config.STORAGE_POLICIES['generated']['max_age_seconds']
+
+    revalidated = client.get(f'/images/{key}', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+
+def test_route_rejects_unknown_keys_and_sizes(client, assets):
+    key = assets.store.put(jpeg(), '.jpg')
+    assert client.get('/images/' + '0' * 64 + '.jpg').status_code == 404
+    assert client.get('/images/not-a-key').status_code == 404
+    assert client.get(f'/images/{key}?size=huge').status_code == 400
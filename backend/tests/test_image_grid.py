@@ -0,0 +1,80 @@
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from config import Config
+from services.image_grid import split_grid
+
+PANEL_SIZE = (300, 400)
+
+
+def panel(seed, size=PANEL_SIZE):
+    """A smooth, photo-like panel: a tinted gradient with a blurred figure"""
+    rng = random.Random(seed)
+    width, height = size
+    top, bottom = [tuple(rng.randint(40, 220) for _ in range(3)) for _ in range(2)]
+    image = Image.new('RGB', size)
+    draw = ImageDraw.Draw(image)
+    for y in range(height):
+        mix = y / max(1, height - 1)
+        draw.line([(0, y), (width, y)], fill=tuple(round(a + (b - a) * mix) for a, b in zip(top, bottom)))
+    for _ in range(6):
+        x, y = rng.randint(0, width), rng.randint(0, height)
+        radius = rng.randint(20, width // 3)
+        draw.ellipse([x - radius, y - radius, x + radius, y + radius],
+                     fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    return image.filter(ImageFilter.GaussianBlur(2))
+
+
+def encode(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def grid(gutter, panels=None, size=PANEL_SIZE):
+    width, height = size
+    panels = panels or [panel(seed, size) for seed in (1, 2, 3, 4)]
+    image = Image.new('RGB', (2 * width + gutter, 2 * height + gutter), (255, 255, 255))
+    for index, tile in enumerate(panels):
+        image.paste(tile, ((index % 2) * (width + gutter), (index // 2) * (height + gutter)))
+    return encode(image)
+
+
+@pytest.mark.parametrize('gutter', [0, 6, 20])
+def test_splits_a_two_by_two_grid(gutter):
+    tiles = split_grid(grid(gutter))
+    assert len(tiles) == 4
+    for tile in tiles:
+        width, height = Image.open(io.BytesIO(tile)).size
+        assert abs(width - PANEL_SIZE[0]) <= 2 and abs(height - PANEL_SIZE[1]) <= 2
+
+
+def test_panels_come_back_in_reading_order():
+    panels = [Image.new('RGB', PANEL_SIZE, color) for color in ((200, 40, 40), (40, 200, 40), (40, 40, 200), (200, 200, 40))]
+    for tile in panels:
+        ImageDraw.Draw(tile).ellipse([60, 80, 240, 320], fill=(250, 250, 250))
+    tiles = split_grid(grid(8, panels))
+
+    for tile, expected in zip(tiles, panels):
+        corner = Image.open(io.BytesIO(tile)).convert('RGB').getpixel((10, 10))
+        assert all(abs(a - b) < 24 for a, b in zip(corner, expected.getpixel((10, 10))))
+
+
+def test_rejects_a_single_image():
+    with pytest.raises(ValueError, match="grid line"):
+        split_grid(encode(panel(9, (600, 800))))
+
+
+def test_rejects_a_composite_that_is_too_small():
+    size = Config.COMPOSITE_MIN_TILE_SIZE - 20
+    with pytest.raises(ValueError, match="too small"):
+        split_grid(grid(4, size=(size, size)))
+
+
+def test_rejects_a_blank_panel():
+    panels = [panel(seed) for seed in (1, 2, 3)] + [Image.new('RGB', PANEL_SIZE, (128, 128, 128))]
+    with pytest.raises(ValueError, match="blank"):
+        split_grid(grid(8, panels))
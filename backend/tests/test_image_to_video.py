@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import ImageToVideo
+from ImageToVideo import Checkpoint, folder_manifest, item_key, main, render_all
+
+
+class FakeVideoService:
+    """Writes a placeholder video per pair; pairs whose image name contains 'bad' fail"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.calls = []
+
+    async def generate_video_for_image(self, image, shoe, angle, prompt=None):
+        self.calls.append(os.path.basename(image))
+        if 'bad' in os.path.basename(image):
+            raise RuntimeError("render failed")
+        path = os.path.join(self.folder, os.path.basename(image) + '.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'video')
+        return path
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    for name in ('a.jpg', 'b.jpg', 'bad.jpg'):
+        (tmp_path / name).write_bytes(name.encode('utf-8'))
+    path = tmp_path / 'manifest.jsonl'
+    path.write_text(''.join(json.dumps({'image': name, 'shoe': 'Red Chuck'}) + '\n'
+                            for name in ('a.jpg', 'b.jpg', 'bad.jpg')))
+    return path
+
+
+def pending_items(manifest_path, checkpoint):
+    items = ImageToVideo.load_manifest(str(manifest_path))
+    for item in items:
+        item['key'] = item_key(item['image'], item['shoe'])
+    return [item for item in items if not checkpoint.completed(item['key'])]
+
+
+def run(service, items, checkpoint):
+    return asyncio.run(render_all(service, items, checkpoint, concurrency=2))
+
+
+def test_rerun_only_renders_what_is_missing(tmp_path, manifest):
+    checkpoint_path = str(tmp_path / 'run.checkpoint.jsonl')
+    service = FakeVideoService(str(tmp_path))
+
+    outcome = run(service, pending_items(manifest, Checkpoint(checkpoint_path)), Checkpoint(checkpoint_path))
+    assert len(outcome['durations']) == 2
+    assert outcome['failures'] == {'RuntimeError': 1}
+
+    # A fresh process reads the checkpoint back and retries only the failed pair
+    service.calls.clear()
+    checkpoint = Checkpoint(checkpoint_path)
+    run(service, pending_items(manifest, checkpoint), checkpoint)
+    assert service.calls == ['bad.jpg']
+
+
+def test_deleted_video_is_rendered_again(tmp_path, manifest):
+    checkpoint_path = str(tmp_path / 'run.checkpoint.jsonl')
+    service = FakeVideoService(str(tmp_path))
+    run(service, pending_items(manifest, Checkpoint(checkpoint_path)), Checkpoint(checkpoint_path))
+
+    os.remove(tmp_path / 'a.jpg.mp4')
+    pending = pending_items(manifest, Checkpoint(checkpoint_path))
+    assert sorted(os.path.basename(item['image']) for item in pending) == ['a.jpg', 'bad.jpg']
+
+
+def test_checkpoint_survives_a_torn_last_line(tmp_path):
+    video = tmp_path / 'done.mp4'
+    video.write_bytes(b'video')
+    path = tmp_path / 'run.checkpoint.jsonl'
+    path.write_text(json.dumps({'key': 'k1', 'status': 'completed', 'video': str(video)}) + '\n'
+                    + json.dumps({'key': 'k2', 'status': 'failed'}) + '\n'
+                    + '{"key": "k3", "status": "comp')
+
+    checkpoint = Checkpoint(str(path))
+    assert checkpoint.completed('k1')['video'] == str(video)
+    assert checkpoint.completed('k2') is None
+    assert checkpoint.completed('k3') is None
+
+
+def test_last_record_of_a_key_wins(tmp_path):
+    video = tmp_path / 'done.mp4'
+    video.write_bytes(b'video')
+    checkpoint = Checkpoint(str(tmp_path / 'run.checkpoint.jsonl'))
+    checkpoint.append({'key': 'k', 'status': 'failed'})
+    checkpoint.append({'key': 'k', 'status': 'completed', 'video': str(video)})
+    assert Checkpoint(checkpoint.path).completed('k') is not None
+
+
+def test_key_follows_content_not_path(tmp_path):
+    (tmp_path / 'one.jpg').write_bytes(b'same')
+    (tmp_path / 'two.jpg').write_bytes(b'same')
+    assert item_key(str(tmp_path / 'one.jpg'), 'shoe') == item_key(str(tmp_path / 'two.jpg'), 'shoe')
+    assert item_key(str(tmp_path / 'one.jpg'), 'shoe') != item_key(str(tmp_path / 'one.jpg'), 'other shoe')
+
+
+def test_dry_run_counts_rendered_and_duplicate_pairs(tmp_path, manifest, capsys):
+    checkpoint_path = str(tmp_path / 'run.checkpoint.jsonl')
+    run(FakeVideoService(str(tmp_path)), pending_items(manifest, Checkpoint(checkpoint_path)), Checkpoint(checkpoint_path))
+    with open(manifest, 'a') as f:
+        f.write(json.dumps({'image': 'bad.jpg', 'shoe': 'Red Chuck'}) + '\n')
+        f.write(json.dumps({'image': 'gone.jpg', 'shoe': 'Red Chuck'}) + '\n')
+
+    assert main([str(manifest), '--checkpoint', checkpoint_path, '--output-dir', str(tmp_path / 'videos'), '--dry-run']) == 0
+    assert "5 pairs: 3 already rendered, 1 missing images, 1 to render" in capsys.readouterr().out
+
+
+def test_folder_manifest_keeps_only_store_masters(tmp_path):
+    shard = tmp_path / 'ab'
+    shard.mkdir()
+    (shard / 'abc.jpg').write_bytes(b'master')
+    (shard / 'abc.jpg.meta.json').write_text('{}')
+    (shard / 'abc.jpg.512.jpg').write_bytes(b'variant')
+    incoming = tmp_path / '.incoming'
+    incoming.mkdir()
+    (incoming / 'partial.jpg').write_bytes(b'partial')
+
+    items = folder_manifest(str(tmp_path), 'Red Chuck')
+    assert [(item['id'], os.path.basename(item['image'])) for item in items] == [('abc.jpg', 'abc.jpg')]
+
+
+def test_folder_manifest_without_sidecars_takes_every_image(tmp_path):
+    (tmp_path / 'one.jpg').write_bytes(b'1')
+    (tmp_path / 'two.png').write_bytes(b'2')
+    (tmp_path / 'notes.txt').write_text('x')
+    assert [os.path.basename(item['image']) for item in folder_manifest(str(tmp_path), 'shoe')] == ['one.jpg', 'two.png']
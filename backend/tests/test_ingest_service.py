@@ -0,0 +1,89 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from config import Config
+from services.ingest_service import ImageIngestService
+from services.storage_service import LocalArtifactStore
+from utils import compute_image_hash, prepare_image_bytes, prepared_image_cache
+
+
+def encoded(size=(1600, 1200), format='JPEG'):
+    image = Image.new('RGB', size)
+    for x in range(0, size[0], 50):
+        for y in range(0, size[1], 50):
+            image.putpixel((x, y), ((x * 7) % 256, (y * 3) % 256, 128))
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def ingest(tmp_path):
+    prepared_image_cache.clear()
+    return ImageIngestService(LocalArtifactStore(str(tmp_path)))
+
+
+def test_rejects_images_over_the_pixel_limit(ingest, monkeypatch):
+    monkeypatch.setattr(Config, 'INGEST_MAX_PIXELS', 1000 * 1000)
+    with pytest.raises(ValueError, match="too large"):
+        ingest.ingest(encoded((1200, 1000)))
+    assert ingest.store.stats()["writes"] == 0
+
+
+def test_rejects_bytes_that_are_not_an_image(ingest):
+    with pytest.raises(ValueError, match="Invalid or unsupported image"):
+        ingest.ingest(b'not an image at all')
+
+
+def test_stores_a_master_and_one_variant_per_model_size(ingest):
+    meta = ingest.ingest(encoded((3000, 1500), 'PNG'))
+    assert max(meta["width"], meta["height"]) == Config.INGEST_MASTER_MAX_SIZE
+    assert meta["original"]["format"] == 'PNG'
+    assert sorted(meta["variants"]) == sorted(str(size) for size in ingest.variant_sizes)
+
+    for size, variant in meta["variants"].items():
+        assert max(variant["width"], variant["height"]) == int(size)
+    assert ingest.store.get_meta(meta["image_id"]) == meta
+
+
+def test_variants_match_what_preparing_the_master_would_produce(ingest):
+    meta = ingest.ingest(encoded())
+    master_path = ingest.store.path(meta["image_id"])
+    for size in ingest.variant_sizes:
+        assert ingest.image_hash(master_path, size) == compute_image_hash(master_path, size)
+        assert ingest.prepared_bytes(master_path, size) == prepare_image_bytes(master_path, size)
+
+
+def test_variant_bytes_are_read_from_disk_once(ingest, monkeypatch):
+    meta = ingest.ingest(encoded())
+    master_path = ingest.store.path(meta["image_id"])
+    reads = []
+    original_get = ingest.store.get
+    monkeypatch.setattr(ingest.store, 'get', lambda key: reads.append(key) or original_get(key))
+
+    for _ in range(4):
+        ingest.prepared_bytes(master_path, Config.VIZ_MAX_IMAGE_SIZE)
+    assert len(reads) == 1
+    assert ingest.stats() == {"variant_hits": 4, "variant_misses": 0}
+
+
+def test_missing_variants_fall_back_to_preparing_the_file(ingest, tmp_path):
+    meta = ingest.ingest(encoded())
+    master_path = ingest.store.path(meta["image_id"])
+
+    # A size without a stored variant
+    assert ingest.prepared_bytes(master_path, 300) == prepare_image_bytes(master_path, 300)
+
+    # A variant deleted from the store
+    variant_key = meta["variants"][str(Config.MAX_IMAGE_SIZE)]["key"]
+    os.remove(ingest.store.path(variant_key))
+    assert ingest.prepared_bytes(master_path, Config.MAX_IMAGE_SIZE) == prepare_image_bytes(master_path, Config.MAX_IMAGE_SIZE)
+
+    # A file that was never ingested
+    legacy = tmp_path / 'legacy.jpg'
+    legacy.write_bytes(encoded((400, 300)))
+    assert ingest.prepared_bytes(str(legacy), Config.MAX_IMAGE_SIZE) == prepare_image_bytes(str(legacy), Config.MAX_IMAGE_SIZE)
+    assert ingest.stats()["variant_misses"] == 3
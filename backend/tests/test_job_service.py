@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config import Config
+from models import ShoeVideoGeneration, VideoGeneration
+from services.job_service import JobService, referenced_job_paths
+
+SHOES = [{'brand': 'Nike', 'name': 'Air Force 1', 'color': 'White'}, {'brand': 'Vans', 'name': 'Old Skool', 'color': 'Black'}]
+
+
+def result(shoe, succeeded):
+    return ShoeVideoGeneration(shoe=shoe, videos=[VideoGeneration(
+        angle='front', video_url=f"/videos/{shoe['name']}.mp4" if succeeded else '',
+        status='completed' if succeeded else 'failed'
+    )])
+
+
+def runner_for(outcomes, release=None):
+    async def runner(on_result):
+        if release is not None:
+            while not release.is_set():
+                await asyncio.sleep(0.005)
+        results = [result(shoe, ok) for shoe, ok in zip(SHOES, outcomes)]
+        for index, shoe_result in enumerate(results):
+            on_result(index, shoe_result)
+        return results
+    return runner
+
+
+def wait_for_status(service, job_id, statuses=JobService.TERMINAL_STATUSES, timeout=2.0):
+    deadline = time.time() + timeout
+    while True:
+        job = service.get_job(job_id)
+        if job and job["status"] in statuses:
+            return job
+        assert time.time() < deadline, f"job stayed {job and job['status']}"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    """Two job services sharing one snapshot folder, like two server processes"""
+    monkeypatch.setattr(Config, 'VIDEO_JOB_POLL_INTERVAL_SECONDS', 0.01)
+    services = [JobService(store_folder=str(tmp_path)) for _ in range(2)]
+    yield services
+    for service in services:
+        service.background.stop()
+
+
+@pytest.mark.parametrize('outcomes, status', [
+    ([True, True], 'completed'),
+    ([True, False], 'partial'),
+    ([False, False], 'failed'),
+])
+def test_final_status_follows_the_videos(workers, outcomes, status):
+    accepting, _ = workers
+    job = wait_for_status(accepting, accepting.submit(SHOES, runner_for(outcomes)))
+    assert job["status"] == status
+    assert bool(job["error"]) == (status != 'completed')
+
+
+def test_another_worker_follows_a_job_through_snapshots(workers):
+    accepting, other = workers
+    release = threading.Event()
+    job_id = accepting.submit(SHOES, runner_for([True, True], release), input_paths=['/uploads/photo.jpg'])
+
+    assert wait_for_status(other, job_id, ('queued', 'processing'))["job_id"] == job_id
+    version = other.version(job_id)
+    release.set()
+    assert other.wait_for_update(job_id, version, timeout=2) > version
+
+    job = wait_for_status(other, job_id)
+    assert job["status"] == 'completed'
+    assert other.version(job_id) == accepting.version(job_id)
+    assert [r["videos"][0]["video_url"] for r in job["results"]] == ['/videos/Air Force 1.mp4', '/videos/Old Skool.mp4']
+
+
+def test_async_wait_on_another_workers_job(workers):
+    accepting, other = workers
+    release = threading.Event()
+    job_id = accepting.submit(SHOES, runner_for([True, True], release))
+
+    async def follow():
+        version = other.version(job_id)
+        release.set()
+        return version, await other.wait_for_update_async(job_id, version, timeout=2)
+
+    before, after = asyncio.run(follow())
+    assert after > before
+
+
+def test_snapshots_protect_inputs_until_the_job_finishes(workers, tmp_path):
+    accepting, _ = workers
+    release = threading.Event()
+    job_id = accepting.submit(SHOES, runner_for([True, False], release), input_paths=['/uploads/photo.jpg'])
+    wait_for_status(accepting, job_id, ('processing',))
+
+    video_path_for = lambda url: '/store' + url
+    assert referenced_job_paths(str(tmp_path), video_path_for) == ['/uploads/photo.jpg']
+
+    release.set()
+    wait_for_status(accepting, job_id)
+    assert referenced_job_paths(str(tmp_path), video_path_for) == ['/store/videos/Air Force 1.mp4']
+
+
+def test_unknown_or_malformed_job_ids(workers):
+    accepting, _ = workers
+    assert accepting.get_job('0' * 32) is None
+    assert accepting.get_job('../../etc/passwd') is None
+    assert accepting.version('../x') == 0
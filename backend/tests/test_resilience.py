@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from services import resilience as resilience_module
+from services.resilience import CircuitBreaker, CircuitOpenError, ProviderGuard, is_retryable, status_code_of
+
+
+class ProviderError(RuntimeError):
+    def __init__(self, status_code):
+        super().__init__(f"status code {status_code}")
+        self.status_code = status_code
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience_module.time, 'time', clock.time)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('p', failure_threshold=3, recovery_seconds=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure(ProviderError(503))
+    assert breaker.state == 'closed'
+
+    breaker.before_call()
+    breaker.record_failure(ProviderError(503))
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker('p', failure_threshold=2)
+    breaker.record_failure(ProviderError(503))
+    breaker.record_success()
+    breaker.record_failure(ProviderError(503))
+    assert breaker.state == 'closed'
+
+
+def test_half_open_trial_closes_on_success(clock):
+    breaker = CircuitBreaker('p', failure_threshold=1, recovery_seconds=30)
+    breaker.record_failure(ProviderError(503))
+    clock.now += 31
+
+    breaker.before_call()
+    assert breaker.state == 'half_open'
+    # Only one trial call passes while half-open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+
+def test_half_open_trial_failure_reopens(clock):
+    breaker = CircuitBreaker('p', failure_threshold=1, recovery_seconds=30)
+    breaker.record_failure(ProviderError(503))
+    clock.now += 31
+
+    breaker.before_call()
+    breaker.record_failure(ProviderError(503))
+    assert breaker.state == 'open'
+    assert breaker.snapshot()["times_opened"] == 2
+
+
+def test_non_transient_error_releases_the_trial(clock):
+    guard = ProviderGuard('p', max_attempts=1, failure_threshold=1, recovery_seconds=30)
+    guard.breaker.record_failure(ProviderError(503))
+    clock.now += 31
+
+    def bad_request():
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        guard.call(bad_request)
+    assert guard.breaker.state == 'half_open'
+    assert guard.call(lambda: 'ok') == 'ok'
+    assert guard.breaker.state == 'closed'
+
+
+def test_retryable_classification():
+    assert is_retryable(ProviderError(503))
+    assert is_retryable(ProviderError(429))
+    assert not is_retryable(ProviderError(400))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(ValueError("bad input"))
+    assert not is_retryable(CircuitOpenError('p', 1))
+    assert status_code_of(RuntimeError("request failed with status code 502")) == 502
+
+
+def test_guard_retries_transient_failures(monkeypatch):
+    monkeypatch.setattr(resilience_module.time, 'sleep', lambda seconds: None)
+    guard = ProviderGuard('p', max_attempts=3, failure_threshold=10)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ProviderError(503)
+        return 'ok'
+
+    assert guard.call(flaky) == 'ok'
+    assert guard.snapshot()["retries"] == 2
+    assert guard.breaker.state == 'closed'
+
+
+def test_guard_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(resilience_module.time, 'sleep', lambda seconds: None)
+    guard = ProviderGuard('p', max_attempts=2, failure_threshold=10)
+
+    def down():
+        raise ProviderError(503)
+
+    with pytest.raises(ProviderError):
+        guard.call(down)
+    snapshot = guard.snapshot()
+    assert (snapshot["calls"], snapshot["retries"], snapshot["failures"]) == (1, 1, 1)
+
+
+def test_guard_stops_retrying_once_the_breaker_opens(monkeypatch):
+    monkeypatch.setattr(resilience_module.time, 'sleep', lambda seconds: None)
+    guard = ProviderGuard('p', max_attempts=5, failure_threshold=2)
+    attempts = []
+
+    def down():
+        attempts.append(1)
+        raise ProviderError(503)
+
+    with pytest.raises(ProviderError):
+        guard.call(down)
+    assert len(attempts) == 2
+    with pytest.raises(CircuitOpenError):
+        guard.call(down)
+
+
+def test_async_guard_creates_a_fresh_coroutine_per_attempt(monkeypatch):
+    async def no_sleep(seconds):
+        return None
+
+    monkeypatch.setattr(resilience_module.asyncio, 'sleep', no_sleep)
+    guard = ProviderGuard('p', max_attempts=3, failure_threshold=10)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ProviderError(502)
+        return 'ok'
+
+    assert asyncio.run(guard.call_async(flaky)) == 'ok'
+    assert len(attempts) == 2
+
+
+def test_backoff_honours_retry_after():
+    guard = ProviderGuard('p', base_delay=0.1, max_delay=8.0)
+
+    class Response:
+        headers = {'retry-after': '3'}
+
+    error = ProviderError(429)
+    error.response = Response()
+    assert guard.backoff(1, error) >= 3.0
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def run_concurrently(flight, fn, callers):
+    """Start several threads calling flight.do with fn; returns (threads, results, errors)"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do('key', fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight('test')
+    release = threading.Event()
+    executions = []
+
+    def fn():
+        executions.append(1)
+        release.wait(2)
+        return 'result'
+
+    threads, results, errors = run_concurrently(flight, fn, 5)
+    wait_until(lambda: flight.stats()["waiting"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert results == ['result'] * 5 and not errors
+    assert len(executions) == 1
+    assert flight.stats() == {"in_flight": 0, "waiting": 0, "calls": 1, "coalesced": 4}
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight('test')
+    release = threading.Event()
+
+    def fails():
+        release.wait(2)
+        raise RuntimeError("provider down")
+
+    threads, results, errors = run_concurrently(flight, fails, 3)
+    wait_until(lambda: flight.stats()["waiting"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert not results
+    assert [str(e) for e in errors] == ["provider down"] * 3
+    # The failed call is forgotten, so the next caller runs again
+    assert flight.do('key', lambda: 'recovered') == 'recovered'
+    assert flight.stats()["calls"] == 2
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight('test')
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_async_calls_share_one_task():
+    flight = AsyncSingleFlight('test')
+    executions = []
+
+    async def work():
+        executions.append(1)
+        await asyncio.sleep(0.01)
+        return 'result'
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do('key', work) for _ in range(4)))
+
+    assert asyncio.run(scenario()) == ['result'] * 4
+    assert len(executions) == 1
+    assert flight.stats() == {"in_flight": 0, "waiting": 0, "calls": 1, "coalesced": 3}
+
+
+def test_async_error_propagates_to_all_callers():
+    flight = AsyncSingleFlight('test')
+
+    async def fails():
+        await asyncio.sleep(0.01)
+        raise ValueError("bad response")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do('key', fails) for _ in range(3)), return_exceptions=True)
+
+    outcomes = asyncio.run(scenario())
+    assert [type(outcome) for outcome in outcomes] == [ValueError] * 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_task():
+    flight = AsyncSingleFlight('test')
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do('key', work))
+        second = asyncio.ensure_future(flight.do('key', work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == 'done'
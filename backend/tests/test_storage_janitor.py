@@ -0,0 +1,172 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from services.ingest_service import ImageIngestService
+from services import storage_janitor
+from services.storage_janitor import StorageJanitor
+from services.storage_service import LocalArtifactStore
+
+DAY = 24 * 60 * 60
+
+
+def set_times(path, modified, accessed=None):
+    os.utime(path, (accessed if accessed is not None else modified, modified))
+
+
+def all_files(folder):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(folder) for name in names)
+
+
+def age_folder(folder, seconds):
+    when = time.time() - seconds
+    for path in all_files(folder):
+        set_times(path, when)
+
+
+def jpeg(seed):
+    buffer = io.BytesIO()
+    Image.linear_gradient('L').rotate(seed * 30).resize((1200, 1200)).convert('RGB').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalArtifactStore(str(tmp_path / "uploads"))
+
+
+def upload_files(store, image_id):
+    """Master, sidecar and variant paths of an ingested upload"""
+    meta = store.get_meta(image_id)
+    master = store.path(image_id)
+    return [master, master + LocalArtifactStore.META_SUFFIX] + [
+        store.path(variant["key"]) for variant in meta["variants"].values()
+    ]
+
+
+def test_upload_files_are_grouped(store):
+    image_id = ImageIngestService(store).ingest(jpeg(0))["image_id"]
+    janitor = StorageJanitor(policies={"uploads": {"folder": store.root}})
+
+    groups = janitor._group(janitor._scan(store.root)["files"])
+    assert len(groups) == 1
+    assert sorted(f["path"] for f in groups[0]) == sorted(upload_files(store, image_id))
+
+
+def test_quota_evicts_whole_uploads(store):
+    ingest = ImageIngestService(store)
+    image_ids = [ingest.ingest(jpeg(seed))["image_id"] for seed in range(3)]
+    kept_files = upload_files(store, image_ids[2])
+    age_folder(store.root, 4 * DAY)
+    # The last upload was used recently, so the others are evicted first
+    set_times(store.path(image_ids[2]), time.time() - 4 * DAY, accessed=time.time() - 3600)
+
+    janitor = StorageJanitor(policies={"uploads": {"folder": store.root, "max_files": len(kept_files)}})
+    report = janitor.run()["folders"]["uploads"]
+
+    assert {entry["reason"] for entry in report["deleted"]} == {"quota"}
+    assert all(store.path(image_id) is None for image_id in image_ids[:2])
+    assert all_files(store.root) == sorted(kept_files)
+
+
+def test_referenced_file_protects_its_upload(store):
+    image_id = ImageIngestService(store).ingest(jpeg(0))["image_id"]
+    age_folder(store.root, 4 * DAY)
+
+    janitor = StorageJanitor(
+        policies={"uploads": {"folder": store.root, "max_age_seconds": DAY}},
+        reference_providers=[lambda: [store.path(image_id)]]
+    )
+    report = janitor.run()["folders"]["uploads"]
+
+    assert report["deleted"] == []
+    assert report["protected_files"] == len(upload_files(store, image_id))
+
+
+def test_failing_reference_provider_stops_the_sweep(store):
+    ImageIngestService(store).ingest(jpeg(0))
+    age_folder(store.root, 4 * DAY)
+    before = all_files(store.root)
+
+    def unreadable_index():
+        raise OSError("index is locked")
+
+    janitor = StorageJanitor(
+        policies={"uploads": {"folder": store.root, "max_age_seconds": DAY}},
+        reference_providers=[unreadable_index]
+    )
+    with pytest.raises(OSError):
+        janitor.run()
+    assert all_files(store.root) == before
+
+
+@pytest.mark.skipif(storage_janitor.fcntl is None, reason="no advisory file locks on this platform")
+def test_only_the_lock_holder_sweeps(tmp_path):
+    lock_path = str(tmp_path / 'janitor.lock')
+    leader = StorageJanitor(policies={}, lock_path=lock_path)
+    follower = StorageJanitor(policies={}, lock_path=lock_path)
+
+    assert leader.acquire_leadership()
+    assert not follower.acquire_leadership()
+    assert leader.acquire_leadership()
+
+    # The lock is released when the leader's process exits
+    leader._lock_file.close()
+    assert follower.acquire_leadership()
+
+
+def test_recent_files_are_protected(store):
+    ImageIngestService(store).ingest(jpeg(0))
+    janitor = StorageJanitor(policies={"uploads": {"folder": store.root, "max_files": 0}})
+
+    assert janitor.run()["folders"]["uploads"]["deleted"] == []
+
+
+def test_dry_run_reports_without_deleting(store):
+    image_id = ImageIngestService(store).ingest(jpeg(0))["image_id"]
+    age_folder(store.root, 4 * DAY)
+    before = all_files(store.root)
+
+    janitor = StorageJanitor(policies={"uploads": {"folder": store.root, "max_age_seconds": DAY}})
+    report = janitor.run(dry_run=True)
+
+    assert report["dry_run"] is True
+    assert len(report["folders"]["uploads"]["deleted"]) == len(upload_files(store, image_id))
+    assert all_files(store.root) == before
+    assert janitor.last_report is None
+
+
+def test_incoming_scratch_files_expire_by_age_only(store):
+    stale = store.incoming_path('.jpg')
+    fresh = store.incoming_path('.jpg')
+    for path in (stale, fresh):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+    set_times(stale, time.time() - 2 * 60 * 60)
+
+    janitor = StorageJanitor(policies={"uploads": {
+        "folder": store.root, "incoming_max_age_seconds": 60 * 60, "min_age_seconds": 0
+    }})
+    report = janitor.run()["folders"]["uploads"]
+
+    assert [entry["reason"] for entry in report["deleted"]] == ["incoming"]
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
+
+
+def test_transient_files_expire_quickly(store):
+    temp_path = os.path.join(store.root, "temp_1234.jpg")
+    with open(temp_path, 'wb') as f:
+        f.write(b'x')
+    set_times(temp_path, time.time() - 2 * 60 * 60)
+
+    janitor = StorageJanitor(policies={"uploads": {
+        "folder": store.root, "min_age_seconds": 0,
+        "transient_patterns": ["temp_*"], "transient_max_age_seconds": 60 * 60
+    }})
+    report = janitor.run()["folders"]["uploads"]
+
+    assert [entry["reason"] for entry in report["deleted"]] == ["transient"]
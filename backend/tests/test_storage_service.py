@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+from services.storage_service import ArtifactStore, LocalArtifactStore, MemoryArtifactStore
+
+
+def test_identical_bytes_are_stored_once(tmp_path):
+    store = LocalArtifactStore(str(tmp_path))
+    first = store.put(b'same bytes', '.JPEG')
+    second = store.put(b'same bytes', 'jpg')
+
+    assert first == second == hashlib.sha256(b'same bytes').hexdigest() + '.jpg'
+    assert store.stats()["writes"] == 1 and store.stats()["deduplicated"] == 1
+    assert store.get(first) == b'same bytes'
+
+
+def test_files_are_sharded_by_key_prefix(tmp_path):
+    store = LocalArtifactStore(str(tmp_path))
+    key = store.put(b'payload', '.png')
+    assert store.path(key) == os.path.join(str(tmp_path), key[:2], key[2:4], key)
+
+
+def test_put_file_moves_scratch_files_and_deduplicates(tmp_path):
+    store = LocalArtifactStore(str(tmp_path))
+    scratch = store.incoming_path('.mp4')
+    assert os.path.dirname(scratch) == os.path.join(str(tmp_path), LocalArtifactStore.INCOMING_FOLDER)
+    with open(scratch, 'wb') as f:
+        f.write(b'video')
+    key = store.put_file(scratch, '.mp4')
+    assert not os.path.exists(scratch)
+
+    duplicate = store.incoming_path('.mp4')
+    with open(duplicate, 'wb') as f:
+        f.write(b'video')
+    assert store.put_file(duplicate, '.mp4') == key
+    assert not os.path.exists(duplicate)
+    assert store.stats()["deduplicated"] == 1
+
+
+def test_invalid_keys_never_reach_the_filesystem(tmp_path):
+    store = LocalArtifactStore(str(tmp_path / 'store'))
+    (tmp_path / 'secret.txt').write_text('secret')
+    for key in ('../secret.txt', 'abc.jpg', '', 'A' * 64):
+        assert not ArtifactStore.is_valid_key(key)
+        assert store.path(key) is None
+        assert store.get(key) is None
+
+
+def test_metadata_sidecar_round_trips_and_is_deleted_with_the_artifact(tmp_path):
+    store = LocalArtifactStore(str(tmp_path))
+    key = store.put(b'image', '.jpg')
+    store.put_meta(key, {'width': 10})
+    assert store.get_meta(key) == {'width': 10}
+    assert os.path.exists(store.path(key) + LocalArtifactStore.META_SUFFIX)
+
+    assert store.delete(key)
+    assert store.get(key) is None and store.get_meta(key) is None
+
+
+def test_memory_store_deduplicates_the_same_way():
+    store = MemoryArtifactStore()
+    assert store.put(b'x', 'png') == store.put(b'x', '.png')
+    assert store.stats()["artifacts"] == 1 and store.stats()["deduplicated"] == 1
+    assert store.path(store.put(b'x', 'png')) is None
@@ -1,64 +1,195 @@
+import io
 import os
-import uuid
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from PIL import Image
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
 from config import Config
 
+class MemoryCache:
+    """Thread-safe in-memory LRU cache with TTL and size bounds"""
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        """
+        Create a memory cache
+
+        Args:
+            max_entries: Maximum number of entries kept before LRU eviction
+            ttl: Seconds an entry stays valid (None means no expiry)
+            max_bytes: Optional memory budget, measured with ``sizeof``
+            sizeof: Function returning the size in bytes of a cached value
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting least recently used entries when over budget"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        size = self.sizeof(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            # Values larger than the whole budget would only flush the cache
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, expires_at, size)
+            self._total_bytes += size
+
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._total_bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Remove a key if present"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        """Drop an entry; caller must hold the lock"""
+        _, _, size = self._entries.pop(key)
+        self._total_bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
 def allowed_file(filename: str) -> bool:
     """Check if the uploaded file has an allowed extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-def prepare_image_for_processing(image_path: str, max_size: int = None) -> str:
-    """Prepare image for AI processing by resizing and converting to RGB"""
+# Prepared JPEG bytes keyed by (path, mtime, size, max_size), or by variant key for ingested
+# uploads, bounded by a memory budget
+prepared_image_cache = MemoryCache(
+    max_entries=Config.PREPARED_IMAGE_CACHE_MAX_ENTRIES,
+    max_bytes=Config.PREPARED_IMAGE_CACHE_MAX_BYTES,
+    sizeof=len
+)
+
+def _image_cache_key(image_path: str, max_size: int) -> str:
+    """Identify an image version by path, modification time and size"""
+    stat = os.stat(image_path)
+    return f"{os.path.abspath(image_path)}:{stat.st_mtime_ns}:{stat.st_size}:{max_size}"
+
+def normalize_image(img: Image.Image, max_size: int) -> Image.Image:
+    """Convert to RGB and shrink to fit within max_size; returns a new image"""
+    # Ensure image is in RGB mode
+    img = img.convert('RGB') if img.mode != 'RGB' else img.copy()
+    
+    # Resize if too large
+    if img.width > max_size or img.height > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return img
+
+def encode_jpeg(img: Image.Image) -> bytes:
+    """Encode a normalized image the way every prepared image is sent to the models"""
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+def hash_normalized_pixels(img: Image.Image) -> str:
+    """Hash the size and pixels of a normalized image"""
+    digest = hashlib.sha256()
+    digest.update(f"{img.width}x{img.height}:".encode('utf-8'))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+def prepare_image_bytes(image_path: str, max_size: int = None) -> bytes:
+    """Return the image resized and converted to RGB as JPEG bytes, decoding each version only once"""
     if max_size is None:
         max_size = Config.MAX_IMAGE_SIZE
     
-    with Image.open(image_path) as img:
-        # Ensure image is in RGB mode
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize if too large
-        if img.width > max_size or img.height > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-        
-        # Save to temporary file
-        temp_path = os.path.join(Config.UPLOAD_FOLDER, f"temp_{uuid.uuid4().hex}.jpg")
-        img.save(temp_path)
-        
-        return temp_path
-
-def create_placeholder_image(text: str, dimensions: tuple = None) -> str:
-    """Create a placeholder image with text"""
-    if dimensions is None:
-        dimensions = Config.VIZ_IMAGE_DIMENSIONS
-    
-    img = Image.new('RGB', dimensions, color=(245, 245, 247))
+    cache_key = _image_cache_key(image_path, max_size)
+    image_data = prepared_image_cache.get(cache_key)
+    if image_data is not None:
+        return image_data
     
-    from PIL import ImageDraw, ImageFont
-    draw = ImageDraw.Draw(img)
-    
-    # Try to use a default font
-    try:
-        font_paths = [
-            "/System/Library/Fonts/Helvetica.ttc",  # macOS
-            "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",  # Linux
-            "C:\\Windows\\Fonts\\Arial.ttf"  # Windows
-        ]
-        font = None
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                font = ImageFont.truetype(font_path, 24)
-                break
-        if not font:
-            font = ImageFont.load_default()
-    except:
-        font = ImageFont.load_default()
+    with Image.open(image_path) as img:
+        image_data = encode_jpeg(normalize_image(img, max_size))
     
-    # Draw text
-    draw.text((dimensions[0]//2, dimensions[1]//2), text, fill=(50, 50, 50), font=font, anchor="mm")
+    prepared_image_cache.set(cache_key, image_data)
+    return image_data
+
+# Image hashes keyed by (path, mtime, size, max_size) so repeated lookups skip decoding
+_image_hash_cache = MemoryCache(max_entries=1024)
+
+def compute_image_hash(image_path: str, max_size: int = None) -> str:
+    """Hash the decoded, normalized pixels of this file; metadata-only changes keep the key, re-encoded copies do not"""
+    if max_size is None:
+        max_size = Config.MAX_IMAGE_SIZE
     
-    return img
+    memo_key = _image_cache_key(image_path, max_size)
+    image_hash = _image_hash_cache.get(memo_key)
+    if image_hash is None:
+        image_hash = _hash_normalized_image(image_path, max_size)
+        _image_hash_cache.set(memo_key, image_hash)
+    return image_hash
+
+def _hash_normalized_image(image_path: str, max_size: int) -> str:
+    """Decode, normalize and hash an image"""
+    with Image.open(image_path) as img:
+        # Normalize the same way prepare_image_bytes does
+        return hash_normalized_pixels(normalize_image(img, max_size))
+
+def normalize_shoe_description(shoe_description: str) -> str:
+    """Normalize a shoe description so trivially different spellings share a cache key"""
+    return " ".join(shoe_description.lower().split())
 
 def ensure_shoe_count(shoes: List[Dict[str, str]], target_count: int = 4) -> List[Dict[str, str]]:
     """Ensure we have exactly the target number of shoe recommendations"""
@@ -70,8 +201,3 @@ def ensure_shoe_count(shoes: List[Dict[str, str]], target_count: int = 4) -> Lis
         while len(shoes) < target_count:
             shoes.append(default_shoes[len(shoes) % len(default_shoes)])
     return shoes
-
-def clean_temp_file(file_path: str) -> None:
-    """Clean up temporary files"""
-    if os.path.exists(file_path):
-        os.remove(file_path)